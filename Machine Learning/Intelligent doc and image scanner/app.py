@@ -1,14 +1,20 @@
 import streamlit as st
-import easyocr
 import cv2
 import numpy as np
 import pandas as pd
+import io
 import os
+import time
 import shutil
 from PIL import Image, ImageDraw, ImageFont
 from modules.text_cleaning import clean_text, extract_fields
 from modules.nlp_postprocess import validate_fields
 from modules.image_preprocess import preprocess_image
+from modules.doc_classifier import DOC_TYPE_LABELS, classify
+from modules.ocr_cache import hash_bytes
+from modules.ocr_service import ModelPool
+from modules.text_extraction import STRATEGY_CASCADE
+from modules.upload_jobs import UploadJob
 
 # Configure Tesseract path (optional - keep if installed)
 pytesseract_path = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
@@ -41,6 +47,9 @@ st.set_page_config(page_title="IDIS - Intelligent Document & Image Scanner", lay
 st.markdown("# 🧠 Intelligent Document & Image Scanner")
 st.markdown("A professional OCR front-end with engine selection, preprocessing controls and interactive review.")
 
+# Entries kept per cached stage (decoded and preprocessed images are the large ones)
+CACHE_ENTRIES = 32
+
 def _resize_for_display(pil_img: Image.Image, max_width: int = 900) -> Image.Image:
     w, h = pil_img.size
     if w <= max_width:
@@ -57,10 +66,19 @@ def _resize_for_display(pil_img: Image.Image, max_width: int = 900) -> Image.Ima
 
 
 @st.cache_resource
-def get_easyocr_reader(lang_list=("en",)):
+def get_easyocr_reader(lang_list=("en",), slot=0):
+    """Warm EasyOCR reader; each slot is a separate reader so background jobs never share one."""
+    import easyocr
     return easyocr.Reader(list(lang_list), gpu=False)
 
 
+@st.cache_resource
+def get_reader_pool(size: int) -> ModelPool:
+    """Readers for background batch jobs (slots 1..size; slot 0 stays with the single-image view)."""
+    slots = iter(range(1, size + 1))
+    return ModelPool(size, reader_factory=lambda: get_easyocr_reader(slot=next(slots)))
+
+
 def draw_boxes(pil_img: Image.Image, ocr_results):
     """Draw bounding boxes and labels on a PIL image using EasyOCR result format."""
     draw = ImageDraw.Draw(pil_img)
@@ -80,6 +98,105 @@ def draw_boxes(pil_img: Image.Image, ocr_results):
     return pil_img
 
 
+# Cached pipeline stages. Streamlit reruns the whole script on every widget change, so each
+# stage is keyed on the upload's hash plus only the parameters it depends on: display-only
+# changes reuse everything, and OCR is keyed on the preprocessed image itself, so preprocessing
+# changes that leave it unchanged do not rerun OCR. Arguments starting with "_" are not hashed.
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_image(file_hash: str, _data: bytes, max_side: int):
+    """Decode an upload (BGR), downscaled so its long side is at most max_side."""
+    image = Image.open(io.BytesIO(_data)).convert("RGB")
+    img_array = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    # Downscale very large images to keep processing memory/time reasonable
+    h0, w0 = img_array.shape[:2]
+    if max(h0, w0) > max_side:
+        scale_down = max_side / float(max(h0, w0))
+        img_array = cv2.resize(img_array, (int(w0 * scale_down), int(h0 * scale_down)), interpolation=cv2.INTER_AREA)
+    return img_array
+
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def preprocess_cached(file_hash: str, _img_array, max_side: int, clahe_clip: float, upsample_min: int):
+    """preprocess_image on the decoded upload; returns (preprocessed image, its hash)."""
+    preprocessed = preprocess_image(_img_array, clahe_clip=clahe_clip, target_min_dim=upsample_min)
+    return preprocessed, hash_bytes(preprocessed.tobytes() + str(preprocessed.shape).encode())
+
+
+class OCRRunError(Exception):
+    """An engine failed; args are the partial (text, EasyOCR results, error messages)."""
+
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def run_ocr(image_key: str, _img_array, _preprocessed, use_trocr: bool, use_tesseract: bool,
+            inverted_recheck: bool):
+    """Run the selected engines; returns (text, EasyOCR results).
+
+    image_key identifies the inputs actually read: the decoded upload for TrOCR and
+    the preprocessed image for EasyOCR/Tesseract. Raises OCRRunError when an engine
+    failed, so failed runs are not cached and are retried on the next rerun.
+    """
+    final_text = ""
+    ocr_results = []
+    errors = []
+    if use_trocr:
+        try:
+            final_text = trocr_handwriting_ocr(_img_array)
+        except Exception as e:
+            errors.append(f"TrOCR failed: {e}")
+
+    # Fallback / printed text path
+    if not final_text:
+        reader = get_easyocr_reader()
+        try:
+            ocr_results = reader.readtext(_preprocessed)
+            # concatenate texts
+            texts = []
+            for res in ocr_results:
+                if isinstance(res, (list, tuple)) and len(res) > 1:
+                    texts.append(res[1])
+                elif isinstance(res, dict):
+                    texts.append(res.get("text", ""))
+                else:
+                    texts.append(str(res))
+            final_text = " ".join(filter(None, texts))
+        except Exception as e:
+            errors.append(f"EasyOCR failed: {e}")
+
+        # Tesseract complement
+        if use_tesseract:
+            try:
+                tess_text = pytesseract.image_to_string(_preprocessed)
+                if tess_text and tess_text.strip():
+                    final_text = f"{final_text} {tess_text}" if final_text else tess_text
+            except Exception:
+                pass
+
+    # Inverted recheck if enabled and low confidence
+    if inverted_recheck and not final_text:
+        try:
+            gray = cv2.cvtColor(_preprocessed, cv2.COLOR_BGR2GRAY) if _preprocessed.ndim == 3 else _preprocessed
+            inv = cv2.bitwise_not(gray)
+            inv_res = get_easyocr_reader().readtext(inv)
+            inv_texts = [r[1] for r in inv_res if isinstance(r, (list, tuple)) and len(r) > 1]
+            if inv_texts:
+                final_text = " ".join(inv_texts)
+                ocr_results = inv_res
+        except Exception:
+            pass
+    if errors:
+        raise OCRRunError(final_text, ocr_results, errors)
+    return final_text, ocr_results
+
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def analyze_text(final_text: str, doc_type):
+    """Clean, extract and validate; returns (cleaned text, validated fields, confidence scores)."""
+    cleaned = clean_text(final_text)
+    fields = extract_fields(cleaned, doc_type=doc_type)
+    validated_fields, confidence_scores = validate_fields(fields)
+    return cleaned, validated_fields, confidence_scores
+
+
 # Sidebar - enterprise controls
 with st.sidebar.expander("Engine & Processing Settings", expanded=True):
     ocr_mode = st.selectbox("OCR Mode", options=["Auto", "EasyOCR+Tesseract", "TrOCR (handwriting)"])
@@ -87,153 +204,212 @@ with st.sidebar.expander("Engine & Processing Settings", expanded=True):
     max_display_width = st.slider("Max display width (px)", min_value=400, max_value=1200, value=900)
     max_processing_dim = st.slider("Max processing dimension (px)", min_value=800, max_value=3000, value=1600)
     enable_inverted_recheck = st.checkbox("Enable inverted-contrast recheck", value=True)
+    classify_docs = st.checkbox("Route by document type (experimental)", value=False,
+                                help="Use the document-type classifier to pick the engine and extra fields. "
+                                     "It is trained on very few images; see data/models/doc_classifier_eval.json")
     st.markdown("---")
     st.markdown("Preprocessing tweaks")
     clahe_clip = st.slider("CLAHE clip limit", min_value=1.0, max_value=6.0, value=3.0)
     upsample_min = st.slider("Upscale min dimension (px)", min_value=400, max_value=1600, value=800)
+    st.markdown("---")
+    st.markdown("Batch upload")
+    batch_workers = st.slider("Background OCR workers", min_value=1, max_value=max(1, min(8, os.cpu_count() or 1)),
+                              value=min(2, os.cpu_count() or 1))
 
 # Input area
 col1, col2 = st.columns([1, 1])
 with col1:
     st.subheader("Input")
-    input_mode = st.radio("Choose input mode:", ("Upload Image", "Webcam Capture"))
+    input_mode = st.radio("Choose input mode:", ("Upload Image", "Batch Upload", "Webcam Capture"))
     uploaded_file = None
+    uploaded_files = []
     if input_mode == "Upload Image":
         uploaded_file = st.file_uploader("Upload an image (jpg, jpeg, png):", type=["jpg", "jpeg", "png", "tif", "tiff"])
+    elif input_mode == "Batch Upload":
+        uploaded_files = st.file_uploader("Upload images (select a whole folder's files):", accept_multiple_files=True,
+                                          type=["jpg", "jpeg", "png", "tif", "tiff", "pdf"])
     else:
         uploaded_camera = st.camera_input("Capture image from webcam:")
         uploaded_file = uploaded_camera
 
 with col2:
     st.subheader("Preview & Actions")
-    run_button = st.button("🔍 Run OCR & Analyze")
+    run_button = False
+    start_job = False
+    if input_mode == "Batch Upload":
+        start_job = st.button(f"🚀 Start batch job ({len(uploaded_files)} files)", disabled=not uploaded_files)
+    else:
+        run_button = st.button("🔍 Run OCR & Analyze")
     st.write("\n")
     download_name = st.text_input("Download filename", value="ocr_results.csv")
 
 # Processing and result area
+# Results stay on screen across reruns for the upload they were computed for, using the processing
+# settings captured when "Run OCR" was pressed; display settings apply live.
+file_bytes = uploaded_file.getvalue() if uploaded_file is not None else None
+file_hash = hash_bytes(file_bytes) if file_bytes is not None else None
 if run_button:
     if uploaded_file is None:
         st.warning("Please upload or capture an image first!")
     else:
-        # Read uploaded file into PIL and numpy BGR
-        image = Image.open(uploaded_file).convert("RGB")
-        display_image = _resize_for_display(image, max_width=max_display_width)
-        st.image(display_image, caption="Original Image", use_container_width=False)
-
-        img_array = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-
-        # Preprocess with user-controlled params
-        with st.spinner("Preprocessing image..."):
-            # Temporarily adjust preprocess settings via environment or pass params if implemented
-            # Downscale very large images to keep processing memory/time reasonable
-            h0, w0 = img_array.shape[:2]
-            if max(h0, w0) > int(max_processing_dim):
-                scale_down = int(max_processing_dim) / float(max(h0, w0))
-                img_array = cv2.resize(img_array, (int(w0 * scale_down), int(h0 * scale_down)), interpolation=cv2.INTER_AREA)
-
-            preprocessed = preprocess_image(img_array, clahe_clip=clahe_clip, target_min_dim=upsample_min)
-            preprocessed_pil = Image.fromarray(cv2.cvtColor(preprocessed, cv2.COLOR_BGR2RGB)) if preprocessed.ndim == 3 else Image.fromarray(preprocessed)
-            preprocessed_display = _resize_for_display(preprocessed_pil, max_width=max_display_width)
-            st.image(preprocessed_display, caption="Preprocessed Image", use_container_width=False)
-
-        reader = get_easyocr_reader()
-
-        # Decide engine
-        use_trocr = False
-        if ocr_mode == "TrOCR (handwriting)" and AI_OCR_AVAILABLE:
-            use_trocr = True
-        elif ocr_mode == "Auto" and AI_OCR_AVAILABLE:
-            try:
-                if is_handwritten(img_array):
-                    use_trocr = True
-            except Exception:
-                use_trocr = False
-
-        final_text = ""
-        ocr_results = []
-        if use_trocr and AI_OCR_AVAILABLE:
-            st.info("✍️ Detected/forced handwritten mode — running TrOCR (may take a while on first run)")
-            with st.spinner("Running TrOCR (handwriting model)..."):
-                try:
-                    final_text = trocr_handwriting_ocr(img_array)
-                except Exception as e:
-                    st.error(f"TrOCR failed: {e}")
-
-        # Fallback / printed text path
-        if not final_text:
-            with st.spinner("Running EasyOCR..."):
-                try:
-                    ocr_results = reader.readtext(preprocessed)
-                    # concatenate texts
-                    texts = []
-                    for res in ocr_results:
-                        if isinstance(res, (list, tuple)) and len(res) > 1:
-                            texts.append(res[1])
-                        elif isinstance(res, dict):
-                            texts.append(res.get("text", ""))
-                        else:
-                            texts.append(str(res))
-                    final_text = " ".join(filter(None, texts))
-                except Exception as e:
-                    st.error(f"EasyOCR failed: {e}")
-
-            # Tesseract complement
-            if has_tesseract:
-                with st.spinner("Running Tesseract (optional)..."):
-                    try:
-                        tess_text = pytesseract.image_to_string(preprocessed)
-                        if tess_text and tess_text.strip():
-                            final_text = f"{final_text} {tess_text}" if final_text else tess_text
-                    except Exception:
-                        pass
-
-        # Inverted recheck if enabled and low confidence
-        if enable_inverted_recheck and not final_text:
-            with st.spinner("Trying inverted-contrast recheck..."):
-                try:
-                    gray = cv2.cvtColor(preprocessed, cv2.COLOR_BGR2GRAY) if preprocessed.ndim == 3 else preprocessed
-                    inv = cv2.bitwise_not(gray)
-                    inv_res = reader.readtext(inv)
-                    inv_texts = [r[1] for r in inv_res if isinstance(r, (list, tuple)) and len(r) > 1]
-                    if inv_texts:
-                        final_text = " ".join(inv_texts)
-                        ocr_results = inv_res
-                except Exception:
-                    pass
-
-        # Clean, extract and validate
-        cleaned = clean_text(final_text)
-        fields = extract_fields(cleaned)
-        validated_fields, confidence_scores = validate_fields(fields)
-
-        # Results layout
-        st.subheader("🧾 OCR Output")
-        st.text_area("Extracted Text", value=final_text, height=200)
-
-        st.subheader("📋 Extracted Fields (editable)")
-        edited = st.text_area("Edit fields as JSON-like key:value lines", value="\n".join([f"{k}: {v}" for k, v in validated_fields.items()]) if validated_fields else "")
-
-        st.subheader("📊 Confidence Scores")
-        st.json(confidence_scores)
-
-        # Show bounding boxes overlay if requested
-        if show_boxes and ocr_results:
-            pil_box = image.copy()
-            pil_box = draw_boxes(pil_box, ocr_results)
-            st.image(_resize_for_display(pil_box, max_width=max_display_width), caption="Detected text boxes", use_container_width=False)
-
-        # Prepare dataframe and download
-        df = pd.DataFrame([{
-            "filename": getattr(uploaded_file, 'name', 'uploaded_image'),
-            "extracted_text": cleaned,
-            **{k: v for k, v in validated_fields.items()},
-            **{f"{k}_conf": v for k, v in confidence_scores.items()}
-        }])
-
-        csv_bytes = df.to_csv(index=False).encode('utf-8')
-        st.download_button("⬇️ Download results (CSV)", data=csv_bytes, file_name=download_name, mime='text/csv')
-
-        # Save to project results
+        st.session_state["analysis"] = {
+            "file_hash": file_hash,
+            "max_side": int(max_processing_dim),
+            "clahe_clip": float(clahe_clip),
+            "upsample_min": int(upsample_min),
+            "ocr_mode": ocr_mode,
+            "inverted_recheck": bool(enable_inverted_recheck),
+            "classify": bool(classify_docs),
+        }
+
+settings = st.session_state.get("analysis")
+if settings and file_hash and settings["file_hash"] == file_hash:
+    try:
+        img_array = load_image(file_hash, file_bytes, settings["max_side"])
+    except (OSError, ValueError) as e:
+        st.error(f"Could not read image: {e}")
+        st.stop()
+    image = Image.fromarray(cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB))
+    display_image = _resize_for_display(image, max_width=max_display_width)
+    st.image(display_image, caption="Original Image", use_container_width=False)
+
+    # Preprocess with user-controlled params
+    with st.spinner("Preprocessing image..."):
+        preprocessed, preprocessed_hash = preprocess_cached(file_hash, img_array, settings["max_side"],
+                                                            settings["clahe_clip"], settings["upsample_min"])
+        preprocessed_pil = Image.fromarray(cv2.cvtColor(preprocessed, cv2.COLOR_BGR2RGB)) if preprocessed.ndim == 3 else Image.fromarray(preprocessed)
+        preprocessed_display = _resize_for_display(preprocessed_pil, max_width=max_display_width)
+        st.image(preprocessed_display, caption="Preprocessed Image", use_container_width=False)
+
+    # Opt-in: the classifier (a few ms) picks engine and extra fields
+    prediction = classify(img_array) if settings["classify"] else None
+    doc_type = prediction.doc_type if prediction else None
+    if prediction:
+        st.caption(f"🗂️ Document type: {DOC_TYPE_LABELS[doc_type]} ({prediction.confidence:.0%})")
+
+    # Decide engine
+    use_trocr = False
+    if settings["ocr_mode"] == "TrOCR (handwriting)" and AI_OCR_AVAILABLE:
+        use_trocr = True
+    elif settings["ocr_mode"] == "Auto" and AI_OCR_AVAILABLE:
+        try:
+            if doc_type:
+                use_trocr = doc_type == "handwritten"
+            elif is_handwritten(img_array):
+                use_trocr = True
+        except Exception:
+            use_trocr = False
+
+    if use_trocr:
+        st.info("✍️ Detected/forced handwritten mode — running TrOCR (may take a while on first run)")
+    # Tesseract complement (not needed for clean screenshots)
+    use_tesseract = has_tesseract and doc_type != "screenshot"
+    image_key = f"{file_hash}:{settings['max_side']}:{preprocessed_hash}"
+    with st.spinner("Running OCR..."):
+        try:
+            final_text, ocr_results = run_ocr(image_key, img_array, preprocessed, use_trocr, use_tesseract,
+                                              settings["inverted_recheck"])
+            errors = []
+        except OCRRunError as e:
+            final_text, ocr_results, errors = e.args
+    for error in errors:
+        st.error(error)
+
+    # Clean, extract and validate
+    cleaned, validated_fields, confidence_scores = analyze_text(final_text, doc_type)
+
+    # Results layout
+    st.subheader("🧾 OCR Output")
+    st.text_area("Extracted Text", value=final_text, height=200)
+
+    st.subheader("📋 Extracted Fields (editable)")
+    edited = st.text_area("Edit fields as JSON-like key:value lines", value="\n".join([f"{k}: {v}" for k, v in validated_fields.items()]) if validated_fields else "")
+
+    st.subheader("📊 Confidence Scores")
+    st.json(confidence_scores)
+
+    # Show bounding boxes overlay if requested
+    if show_boxes and ocr_results:
+        pil_box = image.copy()
+        pil_box = draw_boxes(pil_box, ocr_results)
+        st.image(_resize_for_display(pil_box, max_width=max_display_width), caption="Detected text boxes", use_container_width=False)
+
+    # Prepare dataframe and download
+    df = pd.DataFrame([{
+        "filename": getattr(uploaded_file, 'name', 'uploaded_image'),
+        "extracted_text": cleaned,
+        **{k: v for k, v in validated_fields.items()},
+        **{f"{k}_conf": v for k, v in confidence_scores.items()}
+    }])
+
+    csv_bytes = df.to_csv(index=False).encode('utf-8')
+    st.download_button("⬇️ Download results (CSV)", data=csv_bytes, file_name=download_name, mime='text/csv')
+
+    # Save to project results (once per run, not on every display rerun)
+    if run_button:
         os.makedirs("results", exist_ok=True)
         df.to_csv(os.path.join("results", download_name), index=False)
         st.success("✅ Results saved and downloadable")
+
+
+# Batch upload: documents are OCR'd by a background UploadJob on warm readers; this script only
+# polls its progress, so the page stays responsive and the job survives reruns.
+def render_upload_job(job: UploadJob) -> None:
+    progress = job.progress()
+    processed = progress.done + progress.failed + progress.cancelled
+    st.progress(processed / max(1, progress.total),
+                text=f"{processed}/{progress.total} files · {progress.failed} failed · {progress.elapsed:.0f}s")
+    if not progress.finished:
+        if st.button("🛑 Cancel job", disabled=job.cancelled):
+            job.cancel()
+    st.dataframe(pd.DataFrame([f._asdict() for f in progress.files]), use_container_width=True, hide_index=True)
+    if progress.finished:
+        if progress.cancelled:
+            st.warning(f"Job cancelled; {progress.done} finished files were exported")
+        else:
+            st.success(f"✅ Batch finished: {progress.done} exported, {progress.failed} failed")
+        base = os.path.splitext(download_name)[0] or "ocr_results"
+        if os.path.exists(job.csv_path):
+            with open(job.csv_path, "rb") as f:
+                st.download_button("⬇️ Download combined CSV", data=f.read(), file_name=f"{base}.csv", mime="text/csv")
+        if os.path.exists(job.db_path):
+            with open(job.db_path, "rb") as f:
+                st.download_button("⬇️ Download combined SQLite", data=f.read(), file_name=f"{base}.db",
+                                   mime="application/x-sqlite3")
+
+
+if input_mode == "Batch Upload":
+    if start_job and uploaded_files:
+        previous = st.session_state.get("upload_job")
+        if previous is not None and not previous.finished:
+            previous.cancel()
+        options = {"ingest": {"max_side": int(max_processing_dim)},
+                   "preprocess": {"clahe_clip": float(clahe_clip), "target_min_dim": int(upsample_min)},
+                   "ocr": {"strategy": STRATEGY_CASCADE}}
+        if classify_docs:
+            options["classify"] = {}
+        with st.spinner("Loading OCR readers..."):
+            pool = get_reader_pool(int(batch_workers))
+        st.session_state["upload_job"] = UploadJob([(f.name, f.getvalue()) for f in uploaded_files], pool,
+                                                   options=options).start()
+
+    job = st.session_state.get("upload_job")
+    if job is not None:
+        st.subheader(f"📦 Batch job {job.job_id}")
+        fragment = getattr(st, "fragment", None)
+        if fragment is None:
+            # Streamlit < 1.37: redraw by rerunning the script while the job runs
+            render_upload_job(job)
+            if not job.finished:
+                time.sleep(1.0)
+                st.rerun()
+        elif job.finished:
+            render_upload_job(job)
+        else:
+            @fragment(run_every=1.0)
+            def live_progress():
+                render_upload_job(job)
+                if job.finished:
+                    # One full rerun swaps the polling panel for the static one with downloads
+                    st.rerun()
+            live_progress()
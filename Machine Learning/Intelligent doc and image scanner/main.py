@@ -1,54 +1,58 @@
 import os
 import sys
+import argparse
 from datetime import datetime
-import cv2
-import pytesseract
-import easyocr
-import pandas as pd
-from modules.image_preprocess import preprocess_image
-from modules.text_extraction import extract_text
-from modules.text_cleaning import clean_text, extract_fields
-from modules.nlp_postprocess import validate_fields
-from modules.data_export import export_to_csv, export_to_sqlite
-from modules.realtime_ocr import start_realtime_ocr
+import shutil
+from modules.batch_engine import DEFAULT_WORKERS, discover_images, run_batch
+from modules.ocr_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_MB
+from modules.text_extraction import (STRATEGIES, STRATEGY_CASCADE, EARLY_EXIT_CONF, INVERT_CONF, TESSERACT_CONF,
+                                     TROCR_CONF)
+from modules.ai_ocr import TROCR_BATCH_SIZE, TROCR_NUM_BEAMS
+from modules.image_preprocess import PROFILES
+from modules.resolution import TARGET_TEXT_HEIGHT
+from modules.doc_classifier import MIN_CONFIDENCE
+from modules.data_export import StreamingExporter, DEFAULT_DB_PATH, DEFAULT_BATCH_SIZE
+from modules.job_manifest import JobManifest, DEFAULT_MANIFEST_PATH, DEFAULT_MAX_ATTEMPTS
 from modules.logger_config import setup_logger
-from modules.evaluation import evaluate_ocr
-
-# Optional AI handwriting OCR (TrOCR)
-try:
-    from modules.ai_ocr import is_handwritten, trocr_handwriting_ocr
-    _AI_OCR_AVAILABLE = True
-except Exception:
-    _AI_OCR_AVAILABLE = False
-
+from modules.profiling import get_profiler, stage
 
 # Initialize logger
 logger = setup_logger()
 
-# Detect tesseract availability and configure pytesseract accordingly
-import shutil
-tess_env = os.environ.get('TESSERACT_CMD') or os.environ.get('TESSERACT_PATH')
-has_tesseract = False
-if tess_env:
+
+def configure_tesseract():
+    """Point pytesseract at TESSERACT_CMD/TESSERACT_PATH or the tesseract on PATH.
+
+    Returns:
+        True if the Tesseract binary could be run
+    """
     try:
-        pytesseract.pytesseract.tesseract_cmd = tess_env
-        pytesseract.get_tesseract_version()
-        has_tesseract = True
-        logger.info(f"Using TESSERACT_CMD from environment: {tess_env}")
-    except Exception as e:
-        logger.warning(f"Environment TESSERACT_CMD provided but failed to run: {e}")
-else:
+        import pytesseract
+    except ImportError:
+        logger.warning("pytesseract is not installed; falling back to EasyOCR-only where needed.")
+        return False
+    tess_env = os.environ.get('TESSERACT_CMD') or os.environ.get('TESSERACT_PATH')
+    if tess_env:
+        try:
+            pytesseract.pytesseract.tesseract_cmd = tess_env
+            pytesseract.get_tesseract_version()
+            logger.info(f"Using TESSERACT_CMD from environment: {tess_env}")
+            return True
+        except Exception as e:
+            logger.warning(f"Environment TESSERACT_CMD provided but failed to run: {e}")
+            return False
     tpath = shutil.which("tesseract")
     if tpath:
         try:
             pytesseract.pytesseract.tesseract_cmd = tpath
             pytesseract.get_tesseract_version()
-            has_tesseract = True
             logger.info(f"Found tesseract executable at: {tpath}")
+            return True
         except Exception as e:
             logger.warning(f"Tesseract found at {tpath} but calling it failed: {e}")
-    else:
-        logger.warning("Tesseract not found on PATH; pytesseract will be unavailable. Falling back to EasyOCR-only where needed.")
+            return False
+    logger.warning("Tesseract not found on PATH; pytesseract will be unavailable. Falling back to EasyOCR-only where needed.")
+    return False
 
 
 # Global constants
@@ -56,116 +60,173 @@ input_dir = "data/input_images"
 output_dir = "results/csv"
 error_log_dir = "results/logs"
 
-def process_batch_images():
-    """Process all images in the input directory and save results."""
+def process_batch_images(workers=None, max_pending=None, cache_path=DEFAULT_CACHE_PATH, cache_max_mb=DEFAULT_MAX_MB,
+                         options=None, timings_path=None, trace_path=None, db_path=DEFAULT_DB_PATH,
+                         export_batch_size=DEFAULT_BATCH_SIZE, parquet_dir=None,
+                         manifest_path=DEFAULT_MANIFEST_PATH, resume=False, retry_failed=False,
+                         max_attempts=DEFAULT_MAX_ATTEMPTS, retries=1, retry_backoff=1.0):
+    """Process all images in the input directory and save results.
+
+    Records are streamed to CSV/SQLite (and optionally Parquet) in batches as
+    they complete, so an interrupted run keeps everything flushed so far.
+    Progress is checkpointed in a job manifest; with resume=True only files
+    not yet completed are processed.
+
+    Args:
+        workers: number of OCR worker processes (None -> DEFAULT_WORKERS (1), 0 -> CPU count, 1 -> serial)
+        max_pending: maximum documents in flight at once (default 2x workers)
+        cache_path: OCR result cache database (None disables caching)
+        cache_max_mb: OCR cache size budget before LRU eviction
+        options: per-stage keyword arguments ({"preprocess": {...}, "ocr": {...}, "trocr": {...}})
+        timings_path: where to write the per-stage p50/p95/p99 summary (JSON)
+        trace_path: optional Chrome-trace timeline output (JSON)
+        db_path: SQLite results database; rows are upserted by file hash
+        export_batch_size: records per export transaction
+        parquet_dir: optional directory for Parquet chunk files
+        manifest_path: SQLite job manifest recording per-file status, attempts, duration and error
+        resume: continue the previous run, skipping files already done
+        retry_failed: also reprocess files that failed in earlier runs (implies resume)
+        max_attempts: with retry_failed, give up on files that already failed this many attempts
+        retries: in-run retries for a failing file
+        retry_backoff: seconds before the first in-run retry, doubled for each further one
+    """
+    configure_tesseract()
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(error_log_dir, exist_ok=True)
-    data_records = []
+    profiler = get_profiler()
+    profiler.reset()
+    profiler.keep_events = bool(trace_path)
+    resume = resume or retry_failed
+    manifest = JobManifest(manifest_path)
+    csv_path = os.path.join(output_dir, "ocr_results.csv")
+    # Files are only marked done once their rows have been flushed to disk
+    exporter = StreamingExporter(db_path=db_path, csv_path=csv_path, parquet_dir=parquet_dir,
+                                 batch_size=export_batch_size, append_csv=resume,
+                                 on_flush=lambda rows: manifest.flush())
     
     try:
-        # Initialize EasyOCR
-        reader = easyocr.Reader(['en'])
-        logger.info("Initialized EasyOCR reader")
-        
-        # Walk input_dir recursively so we process images in all subfolders
-        for root, _, files in os.walk(input_dir):
-            for filename in files:
-                if not filename.lower().endswith((".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".gif")):
-                    continue
-
-                filepath = os.path.join(root, filename)
-                # Category is the first-level subfolder under input_dir (e.g. receipts_invoices)
-                rel = os.path.relpath(root, input_dir)
-                category = rel.split(os.sep)[0] if rel not in (".", ".\\") else ""
-
-                try:
-                    logger.info(f"🔍 Processing: {filename} (category: {category})")
-
-                    # Read raw image and preprocess
-                    raw_img = cv2.imread(filepath)
-                    if raw_img is None:
-                        raise ValueError(f"Could not read image: {filepath}")
-                    img = preprocess_image(raw_img)
-
-                    # Decide OCR engine: TrOCR for handwriting if available, otherwise EasyOCR+Tesseract
-                    text = ""
-                    used_trocr = False
-                    try:
-                        if _AI_OCR_AVAILABLE and is_handwritten(raw_img):
-                            logger.info("✍️ Detected Handwritten Text → Using TrOCR")
-                            text = trocr_handwriting_ocr(raw_img)
-                            if text:
-                                used_trocr = True
-                            else:
-                                logger.warning("TrOCR returned no text; falling back to EasyOCR+Tesseract")
-                        if not text:
-                            logger.info("🖨️ Using EasyOCR + Tesseract")
-                            text = extract_text(img, reader)
-                    except Exception as e:
-                        logger.error(f"Error during AI OCR decision/TrOCR run: {e}")
-                        # Fallback to default
-                        text = extract_text(img, reader)
-
-                    # Step 1: Clean & Extract
-                    cleaned = clean_text(text)
-                    fields = extract_fields(cleaned)
-                    logger.info(f"📄 Extracted Fields for {filename}: {fields}")
-
-                    # Step 2: Validate with NLP
-                    validated_fields, confidence_scores = validate_fields(fields)
-                    logger.info(f"✅ Validated Fields: {validated_fields}")
-                    logger.info(f"📊 Confidence Scores: {confidence_scores}")
-
-                    # Step 3: Determine document type automatically (or from OCR choice)
-                    if used_trocr:
-                        doc_type = "Handwritten"
-                    elif "receipt" in filename.lower():
-                        doc_type = "Receipt"
-                    elif "id" in filename.lower():
-                        doc_type = "ID Card"
-                    else:
-                        doc_type = "Document"
-                    logger.info(f"📑 Document Type: {doc_type}")
-
-                    # Step 4: Save structured data to records with consistent column naming
-                    data_records.append({
-                        "filename": filename,
-                        "doc_type": doc_type,
-                        "category": category,
-                        "path": filepath,
-                        "extracted_text": cleaned,
-                        **{k.lower(): v for k, v in validated_fields.items()},
-                        **{f"{k.lower()}_conf": v for k, v in confidence_scores.items()}
-                    })
-                    logger.info(f"✅ Extraction successful for {filename} (category: {category})")
-
-                except Exception as e:
-                    logger.error(f"❌ Error processing {filename} (category: {category}): {e}")
-                    with open(os.path.join(error_log_dir, "error_summary.log"), "a", encoding="utf-8") as f:
-                        f.write(f"{datetime.now()} | {filepath} | {str(e)}\n")
-
-        # Export results if we have any data
-        if data_records:
-            try:
-                # Export to CSV
-                csv_path = os.path.join(output_dir, "ocr_results.csv")
-                export_to_csv(data_records, csv_path)
-                logger.info(f"✅ Extraction completed! Results saved to {csv_path}")
-
-                # Push to SQLite DB
-                export_to_sqlite(data_records)
-                logger.info("✅ Data successfully exported to SQLite DB")
-            except Exception as e:
-                logger.error(f"Error during data export: {str(e)}")
-                raise
-        else:
-            logger.warning("No data was processed successfully.")
+        discovered = discover_images(input_dir)
+        logger.info(f"Discovered {len(discovered)} images under {input_dir}")
+        if not resume:
+            manifest.reset()
+        added = manifest.add(discovered)
+        items = manifest.todo(retry_failed=retry_failed, max_attempts=max_attempts)
+        if resume:
+            logger.info(f"Resuming: {len(items)} of {len(discovered)} images left to process ({added} new)")
+
+        # Records arrive in input order regardless of worker count
+        for result in run_batch(items, workers=workers, max_pending=max_pending, cache_path=cache_path,
+                                cache_max_mb=cache_max_mb, options=options, retries=retries,
+                                retry_backoff=retry_backoff):
+            if result.record is not None:
+                manifest.mark_done(result.filepath, result.attempts, result.duration)
+                with stage("export"):
+                    exporter.write(result.record)
+            else:
+                manifest.mark_failed(result.filepath, result.error, result.attempts, result.duration)
+                with open(os.path.join(error_log_dir, "error_summary.log"), "a", encoding="utf-8") as f:
+                    f.write(f"{datetime.now()} | {result.filepath} | {result.error}\n")
 
     except Exception as e:
         logger.critical(f"Critical error in batch processing: {str(e)}")
         raise
+    finally:
+        try:
+            with stage("export"):
+                exporter.close()
+        except Exception as e:
+            logger.error(f"Error during data export: {str(e)}")
+        if exporter.written:
+            logger.info(f"✅ Extraction completed! {exporter.written} records saved to {csv_path}")
+            logger.info(f"✅ Data successfully upserted into SQLite DB ({db_path})")
+        else:
+            logger.warning("No data was processed successfully.")
+        manifest.log_counts()
+        manifest.close()
+        profiler.log_summary()
+        if timings_path:
+            profiler.write_summary(timings_path)
+        if trace_path:
+            profiler.write_chrome_trace(trace_path)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IDIS OCR System")
+    parser.add_argument("--batch", "-b", action="store_true", help="Run batch OCR on data/input_images without prompting")
+    parser.add_argument("--workers", "-w", type=int, default=DEFAULT_WORKERS,
+                        help="Number of OCR worker processes (default: %(default)s = serial; 0 = one per CPU core). "
+                             "Each worker loads its own models: budget about 2.5 GB of RAM per worker")
+    parser.add_argument("--queue-size", type=int, default=None, help="Maximum documents in flight at once (default: 2x workers)")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help="OCR result cache database (default: %(default)s)")
+    parser.add_argument("--cache-size-mb", type=float, default=DEFAULT_MAX_MB, help="OCR cache size budget in MB (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the OCR result cache and re-OCR every file")
+    parser.add_argument("--timings", default=os.path.join(error_log_dir, "stage_timings.json"),
+                        help="Per-stage latency summary output (default: %(default)s)")
+    parser.add_argument("--trace", default=None, help="Also write a Chrome-trace/Perfetto timeline JSON to this path")
+    parser.add_argument("--target-text-height", type=float, default=TARGET_TEXT_HEIGHT,
+                        help="Decode pages so glyphs are about this many pixels tall; 0 disables the text-height policy (default: %(default)s)")
+    parser.add_argument("--preprocess-profile", choices=sorted(PROFILES), default="default",
+                        help="default: full-resolution preprocessing; fast: cheaper denoise/deskew with buffer reuse")
+    parser.add_argument("--ocr-strategy", choices=STRATEGIES, default=STRATEGY_CASCADE,
+                        help="cascade: cheapest engine first, escalate only on low confidence; "
+                             "multiscale: full EasyOCR pass per scale; single_pass: detect once, refine low-confidence regions")
+    parser.add_argument("--early-exit-conf", type=float, default=EARLY_EXIT_CONF,
+                        help="cascade/single_pass: skip higher scales when page confidence reaches this (default: %(default)s)")
+    parser.add_argument("--invert-conf", type=float, default=INVERT_CONF,
+                        help="cascade: retry on the inverted image below this confidence (default: %(default)s)")
+    parser.add_argument("--tesseract-conf", type=float, default=TESSERACT_CONF,
+                        help="cascade: run Tesseract below this confidence (default: %(default)s)")
+    parser.add_argument("--trocr-conf", type=float, default=TROCR_CONF,
+                        help="cascade: fall back to TrOCR below this confidence (default: %(default)s)")
+    parser.add_argument("--no-text-regions", action="store_true",
+                        help="OCR the whole page instead of only the detected text blocks")
+    parser.add_argument("--classify-docs", action="store_true",
+                        help="Experimental: route pages by the document-type classifier (engine, preprocessing, "
+                             "extra fields, doc_type column); see data/models/doc_classifier_eval.json")
+    parser.add_argument("--classify-min-conf", type=float, default=MIN_CONFIDENCE,
+                        help="--classify-docs: ignore predictions below this confidence (default: %(default)s)")
+    parser.add_argument("--trocr-batch-size", type=int, default=TROCR_BATCH_SIZE, help="Handwriting line crops per TrOCR batch (default: %(default)s)")
+    parser.add_argument("--trocr-beams", type=int, default=TROCR_NUM_BEAMS, help="TrOCR beam width, 1 = greedy (default: %(default)s)")
+    parser.add_argument("--trocr-quantize", action="store_true", help="Use int8 dynamic quantization for TrOCR on CPU")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH, help="SQLite results database, upserted by file hash (default: %(default)s)")
+    parser.add_argument("--export-batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Records written per export transaction (default: %(default)s)")
+    parser.add_argument("--resume", action="store_true", help="Continue the previous batch run, skipping files already done")
+    parser.add_argument("--retry-failed", action="store_true", help="Resume and also reprocess files that failed earlier")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="--retry-failed skips files that already failed this many attempts (default: %(default)s)")
+    parser.add_argument("--retries", type=int, default=1, help="Retries for a failing file within a run (default: %(default)s)")
+    parser.add_argument("--retry-backoff", type=float, default=1.0,
+                        help="Seconds before the first retry, doubled for each further retry (default: %(default)s)")
+    parser.add_argument("--manifest-path", default=DEFAULT_MANIFEST_PATH, help="Job manifest database (default: %(default)s)")
+    parser.add_argument("--parquet-dir", default=None, help="Also write Parquet chunk files to this directory (requires pyarrow)")
+    args = parser.parse_args()
+    batch_kwargs = dict(
+        workers=args.workers,
+        max_pending=args.queue_size,
+        cache_path=None if args.no_cache else args.cache_path,
+        cache_max_mb=args.cache_size_mb,
+        timings_path=args.timings,
+        trace_path=args.trace,
+        db_path=args.db_path,
+        export_batch_size=args.export_batch_size,
+        parquet_dir=args.parquet_dir,
+        manifest_path=args.manifest_path,
+        resume=args.resume,
+        retry_failed=args.retry_failed,
+        max_attempts=args.max_attempts,
+        retries=args.retries,
+        retry_backoff=args.retry_backoff,
+        options={
+            "ingest": {"target_text_height": args.target_text_height},
+            "preprocess": {"profile": args.preprocess_profile},
+            "ocr": {"strategy": args.ocr_strategy, "early_exit_conf": args.early_exit_conf,
+                    "invert_conf": args.invert_conf, "tesseract_conf": args.tesseract_conf,
+                    "trocr_conf": args.trocr_conf, "text_regions": not args.no_text_regions},
+            "trocr": {"batch_size": args.trocr_batch_size, "num_beams": args.trocr_beams, "quantize": args.trocr_quantize},
+            **({"classify": {"min_confidence": args.classify_min_conf}} if args.classify_docs else {}),
+        },
+    )
+
     try:
         logger.info("IDIS OCR System Starting...")
         logger.info("Choose Mode:")
@@ -173,18 +234,19 @@ if __name__ == "__main__":
         logger.info("2️⃣ - Real-Time OCR via Webcam")
 
         # Support a non-interactive batch run via CLI flag: `python main.py --batch`
-        if len(sys.argv) > 1 and sys.argv[1] in ("--batch", "-b"):
+        if args.batch:
             logger.info("Running in batch mode (CLI flag detected)")
-            process_batch_images()
+            process_batch_images(**batch_kwargs)
             sys.exit(0)
 
         choice = input("Enter your choice: ").strip()
 
         if choice == "1":
             logger.info("Starting batch OCR processing...")
-            process_batch_images()
+            process_batch_images(**batch_kwargs)
         elif choice == "2":
             logger.info("Starting real-time OCR via webcam...")
+            from modules.realtime_ocr import start_realtime_ocr
             start_realtime_ocr(save_csv=True)
         else:
             logger.error("Invalid choice selected!")
@@ -5,19 +5,78 @@ __all__ = [
     'compute_confidence',
     'clean_text',
     'extract_fields',
+    'extract_fields_batch',
+    'get_nlp',
+    'FieldExtractor',
+    'FieldSpec',
+    'FuzzyIndex',
     'extract_text',
+    'propose_text_regions',
+    'iter_pages',
+    'classify',
     'preprocess_image',
+    'PreprocessPipeline',
     'export_to_csv',
     'export_to_sqlite',
+    'StreamingExporter',
     'start_realtime_ocr',
-    'setup_logger'
+    'setup_logger',
+    'discover_images',
+    'process_document',
+    'run_batch',
+    'OCRService',
+    'OCRCache',
+    'JobManifest',
+    'get_profiler',
+    'get_reader',
+    'warmup'
 ]
 
-# Import functions after __all__ to avoid circular imports
-from .nlp_postprocess import validate_fields, correct_spelling, compute_confidence
-from .text_cleaning import clean_text, extract_fields
-from .text_extraction import extract_text
-from .image_preprocess import preprocess_image
-from .data_export import export_to_csv, export_to_sqlite
-from .realtime_ocr import start_realtime_ocr
-from .logger_config import setup_logger
\ No newline at end of file
+# Submodules are imported on first attribute access so `import modules` stays cheap
+# (spaCy, EasyOCR/torch and pandas load only when something actually uses them)
+_LAZY = {
+    'validate_fields': 'nlp_postprocess',
+    'correct_spelling': 'nlp_postprocess',
+    'compute_confidence': 'nlp_postprocess',
+    'clean_text': 'text_cleaning',
+    'extract_fields': 'text_cleaning',
+    'extract_fields_batch': 'text_cleaning',
+    'get_nlp': 'text_cleaning',
+    'FieldExtractor': 'field_extractor',
+    'FieldSpec': 'field_extractor',
+    'FuzzyIndex': 'fuzzy_index',
+    'extract_text': 'text_extraction',
+    'propose_text_regions': 'text_regions',
+    'iter_pages': 'ingest',
+    'classify': 'doc_classifier',
+    'preprocess_image': 'image_preprocess',
+    'PreprocessPipeline': 'image_preprocess',
+    'export_to_csv': 'data_export',
+    'export_to_sqlite': 'data_export',
+    'StreamingExporter': 'data_export',
+    'start_realtime_ocr': 'realtime_ocr',
+    'setup_logger': 'logger_config',
+    'discover_images': 'batch_engine',
+    'process_document': 'batch_engine',
+    'run_batch': 'batch_engine',
+    'OCRService': 'ocr_service',
+    'OCRCache': 'ocr_cache',
+    'JobManifest': 'job_manifest',
+    'get_profiler': 'profiling',
+    'get_reader': 'models',
+    'warmup': 'models',
+}
+
+
+def __getattr__(name):
+    submodule = _LAZY.get(name)
+    if submodule is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(f".{submodule}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -2,24 +2,44 @@ import cv2
 import numpy as np
 from PIL import Image
 import logging
-from typing import Union, Any
+from collections import namedtuple
+from contextlib import nullcontext
+from typing import Union, Any, Optional, List, Tuple
+
+from .ocr_cache import OCRCache, hash_array, hash_file, make_key
 
 logger = logging.getLogger("IDIS")
 
+TROCR_MODEL_NAME = "microsoft/trocr-base-handwritten"
+
+# Handwriting inference defaults (TrOCR is a line-level model)
+TROCR_BATCH_SIZE = 8
+TROCR_NUM_BEAMS = 1
+TROCR_MAX_NEW_TOKENS = 64
+
 # Lazy-loaded TrOCR model and processor (typed as Any to avoid static-checker complaints)
 _TROCR: Any = None
+_TROCR_QUANTIZED: Any = None
 _PROCESSOR: Any = None
+_DEVICE = "cpu"
+
+# TrOCR output; confidence is the mean per-token probability weighted by line length
+# (None when unknown, e.g. for cache entries written without one)
+TrOCRResult = namedtuple("TrOCRResult", ["text", "confidence"])
 
 
 def _ensure_trocr_loaded():
-    global _TROCR, _PROCESSOR
+    global _TROCR, _PROCESSOR, _DEVICE
     if _TROCR is not None and _PROCESSOR is not None:
         return True
     try:
+        import torch
         from transformers import TrOCRProcessor, VisionEncoderDecoderModel
-        _PROCESSOR = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
-        _TROCR = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-handwritten")
-        logger.info("Loaded TrOCR handwriting model")
+        _PROCESSOR = TrOCRProcessor.from_pretrained(TROCR_MODEL_NAME)
+        _TROCR = VisionEncoderDecoderModel.from_pretrained(TROCR_MODEL_NAME)
+        _DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+        _TROCR.to(_DEVICE).eval()
+        logger.info(f"Loaded TrOCR handwriting model on {_DEVICE}")
         return True
     except Exception as e:
         logger.warning(f"TrOCR model not available: {e}")
@@ -28,6 +48,61 @@ def _ensure_trocr_loaded():
         return False
 
 
+def _get_trocr_model(quantize: bool = False):
+    """Return the loaded model, optionally as an int8 dynamically-quantized CPU copy."""
+    global _TROCR_QUANTIZED
+    if not quantize or _DEVICE != "cpu":
+        return _TROCR
+    if _TROCR_QUANTIZED is None:
+        try:
+            import torch
+            _TROCR_QUANTIZED = torch.quantization.quantize_dynamic(_TROCR, {torch.nn.Linear}, dtype=torch.qint8)
+            logger.info("Quantized TrOCR linear layers to int8 for CPU inference")
+        except Exception as e:
+            logger.warning(f"TrOCR quantization failed, using fp32 model: {e}")
+            return _TROCR
+    return _TROCR_QUANTIZED
+
+
+def segment_lines(image: np.ndarray, *, min_line_height: int = 8, max_gap: int = 3,
+                  pad: int = 4) -> List[Tuple[int, int, int, int]]:
+    """Split a page into text-line boxes (x0, y0, x1, y1), top to bottom.
+
+    Uses a horizontal projection profile of the Otsu-binarized page after
+    smearing characters horizontally so each line forms a solid band.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    h, w = gray.shape[:2]
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(15, w // 40), 1))
+    smeared = cv2.dilate(binary, kernel)
+
+    profile = np.count_nonzero(smeared, axis=1)
+    active = (profile > max(1, int(0.01 * w))).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], active, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # Merge bands separated by tiny gaps (descenders, dots on i/j)
+    runs: List[List[int]] = []
+    for y0, y1 in zip(starts, ends):
+        if runs and y0 - runs[-1][1] <= max_gap:
+            runs[-1][1] = int(y1)
+        else:
+            runs.append([int(y0), int(y1)])
+
+    boxes = []
+    for y0, y1 in runs:
+        if y1 - y0 < min_line_height:
+            continue
+        cols = np.flatnonzero(binary[y0:y1].any(axis=0))
+        if cols.size == 0:
+            continue
+        boxes.append((max(0, int(cols[0]) - pad), max(0, y0 - pad),
+                      min(w, int(cols[-1]) + 1 + pad), min(h, y1 + pad)))
+    return boxes
+
+
 def is_handwritten(image: Union[str, np.ndarray]) -> bool:
     """Return True if image likely contains handwritten text.
 
@@ -59,32 +134,122 @@ def is_handwritten(image: Union[str, np.ndarray]) -> bool:
         return False
 
 
-def trocr_handwriting_ocr(image: Union[str, np.ndarray]) -> str:
-    """Perform OCR using Microsoft TrOCR handwriting model.
+def trocr_params(segment: bool = True, batch_size: int = TROCR_BATCH_SIZE, num_beams: int = TROCR_NUM_BEAMS,
+                 max_new_tokens: int = TROCR_MAX_NEW_TOKENS, inference_mode: bool = True,
+                 quantize: bool = False) -> dict:
+    """Parameters that affect trocr_handwriting_ocr output, for building cache keys.
+
+    Accepts the same options as trocr_handwriting_ocr; batch_size and
+    inference_mode do not change the decoded text and are left out.
+    """
+    return {"engine": "trocr", "model": TROCR_MODEL_NAME, "segment": segment, "num_beams": num_beams,
+            "max_new_tokens": max_new_tokens, "quantize": quantize}
+
+
+def trocr_handwriting_ocr(image: Union[str, np.ndarray], *, segment: bool = True,
+                          batch_size: int = TROCR_BATCH_SIZE, num_beams: int = TROCR_NUM_BEAMS,
+                          max_new_tokens: int = TROCR_MAX_NEW_TOKENS, inference_mode: bool = True,
+                          quantize: bool = False, cache: Optional[OCRCache] = None,
+                          cache_key: Optional[str] = None) -> str:
+    """Perform OCR using Microsoft TrOCR handwriting model (text of trocr_ocr_result).
 
     Accepts a file path or a BGR numpy array. Returns decoded text or empty string on failure.
     """
+    return trocr_ocr_result(image, segment=segment, batch_size=batch_size, num_beams=num_beams,
+                            max_new_tokens=max_new_tokens, inference_mode=inference_mode, quantize=quantize,
+                            cache=cache, cache_key=cache_key).text
+
+
+def trocr_ocr_result(image: Union[str, np.ndarray], *, segment: bool = True,
+                     batch_size: int = TROCR_BATCH_SIZE, num_beams: int = TROCR_NUM_BEAMS,
+                     max_new_tokens: int = TROCR_MAX_NEW_TOKENS, inference_mode: bool = True,
+                     quantize: bool = False, cache: Optional[OCRCache] = None,
+                     cache_key: Optional[str] = None) -> TrOCRResult:
+    """Perform OCR using Microsoft TrOCR handwriting model, with a confidence comparable to EasyOCR's.
+
+    Accepts a file path or a BGR numpy array. Returns TrOCRResult(text, confidence);
+    text is empty (and confidence None) on failure.
+
+    Args:
+        segment: split the page into text lines and recognize each line (TrOCR is line-level);
+            if False, or no lines are found, the whole page is fed as one image
+        batch_size: number of line crops per generate() call
+        num_beams: beam width for decoding (1 = greedy)
+        max_new_tokens: maximum tokens generated per line
+        inference_mode: run generation under torch.inference_mode()
+        quantize: use an int8 dynamically-quantized copy of the model on CPU
+        cache, cache_key: optional OCRCache lookup; a hit returns without loading the model
+    """
+    if cache is not None:
+        if cache_key is None:
+            content = hash_file(image) if isinstance(image, str) else hash_array(image)
+            cache_key = make_key(content, **trocr_params(segment, num_beams=num_beams, max_new_tokens=max_new_tokens,
+                                                         quantize=quantize))
+        hit = cache.get(cache_key)
+        if hit is not None:
+            logger.info("OCR cache hit; skipping TrOCR")
+            return TrOCRResult(hit[0], hit[1])
+
+    result = _trocr_uncached(image, segment, batch_size, num_beams, max_new_tokens, inference_mode, quantize)
+    if cache is not None and result.text:
+        cache.put(cache_key, result.text, result.confidence, engine="trocr")
+    return result
+
+
+def _line_confidences(model, output, num_beams: int) -> List[float]:
+    """Mean token probability of each generated sequence (padding after EOS excluded)."""
+    import torch
+    scores = model.compute_transition_scores(output.sequences, output.scores,
+                                             getattr(output, "beam_indices", None),
+                                             normalize_logits=num_beams == 1)
+    tokens = output.sequences[:, -scores.shape[1]:]
+    pad_id = model.generation_config.pad_token_id
+    mask = (tokens != pad_id) if pad_id is not None else torch.ones_like(tokens, dtype=torch.bool)
+    logprobs = (scores * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+    return [float(p) for p in torch.exp(logprobs)]
+
+
+def _trocr_uncached(image: Union[str, np.ndarray], segment: bool, batch_size: int, num_beams: int,
+                    max_new_tokens: int, inference_mode: bool, quantize: bool) -> TrOCRResult:
     if not _ensure_trocr_loaded():
-        return ""
+        return TrOCRResult("", None)
 
     try:
         if isinstance(image, str):
-            pil_img = Image.open(image).convert("RGB")
+            image = cv2.imread(image)
+            if image is None:
+                return TrOCRResult("", None)
+        rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB) if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+        # Line crops in reading order; fall back to the whole page
+        boxes = segment_lines(image) if segment else []
+        if boxes:
+            crops = [Image.fromarray(rgb[y0:y1, x0:x1]) for x0, y0, x1, y1 in boxes]
         else:
-            # Convert BGR numpy array to PIL Image
-            if image.ndim == 2:
-                pil_img = Image.fromarray(image)
-            else:
-                pil_img = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            crops = [Image.fromarray(rgb)]
 
         # _PROCESSOR and _TROCR are typed as Any
         assert _PROCESSOR is not None and _TROCR is not None
-        # Prepare inputs (use batch of one)
-        inputs = _PROCESSOR(images=pil_img, return_tensors="pt")  # type: ignore[arg-type]
-        pixel_values = inputs.pixel_values  # type: ignore[attr-defined]
-        generated_ids = _TROCR.generate(pixel_values)  # type: ignore[call-arg]
-        text = _PROCESSOR.batch_decode(generated_ids, skip_special_tokens=True)[0]  # type: ignore[attr-defined]
-        return text.strip()
+        import torch
+        model = _get_trocr_model(quantize)
+        device = "cpu" if model is not _TROCR else _DEVICE
+        lines: List[str] = []
+        confidences: List[float] = []
+        batch_size = max(1, int(batch_size))
+        with torch.inference_mode() if inference_mode else nullcontext():
+            for i in range(0, len(crops), batch_size):
+                # The processor resizes every crop to the encoder input size, so batches stack directly
+                inputs = _PROCESSOR(images=crops[i:i + batch_size], return_tensors="pt")  # type: ignore[arg-type]
+                pixel_values = inputs.pixel_values.to(device)  # type: ignore[attr-defined]
+                output = model.generate(pixel_values, num_beams=num_beams, max_new_tokens=max_new_tokens,
+                                        output_scores=True, return_dict_in_generate=True)  # type: ignore[call-arg]
+                lines.extend(_PROCESSOR.batch_decode(output.sequences, skip_special_tokens=True))  # type: ignore[attr-defined]
+                confidences.extend(_line_confidences(model, output, num_beams))
+        logger.info(f"TrOCR recognized {len(crops)} line crop(s) in batches of {batch_size}")
+        kept = [(line.strip(), conf) for line, conf in zip(lines, confidences) if line.strip()]
+        chars = sum(len(line) for line, _ in kept)
+        confidence = round(sum(conf * len(line) for line, conf in kept) / chars, 3) if chars else 0.0
+        return TrOCRResult("\n".join(line for line, _ in kept), confidence)
     except Exception as e:
         logger.error(f"TrOCR handwriting OCR failed: {e}")
-        return ""
+        return TrOCRResult("", None)
@@ -0,0 +1,526 @@
+"""Multi-process batch engine for the IDIS OCR pipeline.
+
+Each worker process loads its own EasyOCR reader (and spaCy model, via
+``text_cleaning``) once in the pool initializer, then runs documents end to
+end: decode, (optionally) classify, preprocess, OCR, field extraction and
+validation. Results are yielded back in input order so CSV/SQLite exports match a serial run.
+"""
+import os
+import time
+import logging
+import logging.handlers
+import multiprocessing as mp
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .doc_classifier import DOC_TYPE_LABELS, classify, model_version
+from .image_preprocess import preprocess_image
+from .ingest import Buffer, ingest_params, iter_pages, read_buffer
+from .text_extraction import extract_text_result, engine_params
+from .ocr_cache import OCRCache, DEFAULT_MAX_MB, hash_bytes, make_key
+from .profiling import document, get_profiler, stage
+from .text_cleaning import clean_text, extract_fields
+from .nlp_postprocess import validate_fields
+from .models import get_reader
+
+logger = logging.getLogger("IDIS")
+
+# Optional AI handwriting OCR (TrOCR)
+try:
+    from .ai_ocr import is_handwritten, trocr_handwriting_ocr, trocr_ocr_result, trocr_params
+    _AI_OCR_AVAILABLE = True
+except Exception:
+    _AI_OCR_AVAILABLE = False
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tiff", ".tif", ".bmp", ".gif", ".pdf")
+
+# Default preprocess_image parameters for batch runs (part of the OCR cache key)
+PREPROCESS_PARAMS = {"clahe_clip": 3.0, "target_min_dim": 800, "profile": "default"}
+
+# Per document type (doc_classifier.DOC_TYPES) defaults for the cheapest suitable pipeline, applied only
+# when classification is enabled (options["classify"]); explicit options still win. Screenshots are clean, axis-aligned renders: no denoise/deskew and no Tesseract merge.
+# Handwritten pages go to TrOCR.
+DOC_TYPE_ROUTES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "screenshot": {"preprocess": {"skip": ("denoise", "deskew")}, "ocr": {"combine_engines": False}},
+}
+
+# Worker processes for batch runs. Every worker loads its own EasyOCR reader (~1 GB
+# resident, plus ~1.5 GB more once TrOCR is used), so memory, not CPU, is usually the
+# limit: budget about 2.5 GB of RAM per worker before raising this.
+DEFAULT_WORKERS = 1
+
+# TrOCR's score is a mean token probability and is not comparable with EasyOCR's
+# box confidence, so an escalated TrOCR read replaces the printed text only above this
+TROCR_ACCEPT_CONF = 0.70
+
+# Per-process EasyOCR reader, OCR cache, pipeline options and retry policy, set once by the pool initializer
+_READER: Any = None
+_CACHE: Optional[OCRCache] = None
+_OPTIONS: Optional[Dict[str, Dict[str, Any]]] = None
+_RETRY: Tuple[int, float] = (0, 0.0)
+
+# One processed item; exactly one of record/error is None
+BatchResult = namedtuple("BatchResult", ["filepath", "category", "record", "error", "attempts", "duration"])
+
+# OCR output for one document; doc_type is the classifier's type for its first page (None without a model)
+OCRDocument = namedtuple("OCRDocument", ["text", "used_trocr", "content_hash", "doc_type"])
+
+
+def discover_images(input_dir: str) -> List[Tuple[str, str]]:
+    """Walk input_dir recursively and return (filepath, category) pairs.
+
+    Category is the first-level subfolder under input_dir (e.g. receipts_invoices).
+    """
+    items: List[Tuple[str, str]] = []
+    for root, _, files in os.walk(input_dir):
+        rel = os.path.relpath(root, input_dir)
+        category = rel.split(os.sep)[0] if rel not in (".", ".\\") else ""
+        for filename in files:
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                items.append((os.path.join(root, filename), category))
+    return items
+
+
+def document_cache_key(content_hash: str, options: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """Cache key for a whole-document OCR result under the current batch configuration."""
+    options = options or {}
+    return make_key(
+        content_hash,
+        stage="document",
+        ingest=ingest_params(**options.get("ingest", {})),
+        preprocess={**PREPROCESS_PARAMS, **options.get("preprocess", {})},
+        printed=engine_params(**options.get("ocr", {})),
+        handwriting=trocr_params(**options.get("trocr", {})) if _AI_OCR_AVAILABLE else None,
+        classifier=_classifier_params(options),
+    )
+
+
+def _classifier_params(options: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Classifier settings that affect OCR output (None when document-type routing is off)."""
+    classify_options = options.get("classify")
+    if classify_options is None:
+        return None
+    return {"model": model_version(), "routes": DOC_TYPE_ROUTES, **classify_options}
+
+
+def doc_type_cache_key(content_hash: str, options: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """Cache key for the classified document type, stored next to the document text."""
+    options = options or {}
+    return make_key(content_hash, stage="doc_type", ingest=ingest_params(**options.get("ingest", {})),
+                    classifier=_classifier_params(options))
+
+
+def process_document(filepath: str, category: str, reader, cache: Optional[OCRCache] = None,
+                     options: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Run the full OCR pipeline on one image and return its export record.
+
+    options holds per-stage keyword arguments: options["ingest"] for
+    iter_pages (e.g. max_pixels=0 to decode at full resolution),
+    options["preprocess"] for preprocess_image (e.g. profile="fast"),
+    options["ocr"] for extract_text (e.g. strategy="single_pass"),
+    options["trocr"] for trocr_handwriting_ocr and options["classify"] for
+    doc_classifier.classify (e.g. min_confidence=0.9). Document-type routing is
+    opt-in: without a "classify" entry pages are not classified, is_handwritten
+    picks TrOCR and the doc_type column comes from the filename heuristics.
+
+    With a cache, documents whose bytes and pipeline parameters are unchanged
+    skip decode, preprocessing and OCR entirely.
+    Raises on unreadable images; OCR engine failures fall back to EasyOCR+Tesseract.
+    """
+    filename = os.path.basename(filepath)
+    logger.info(f"🔍 Processing: {filename} (category: {category})")
+
+    with stage("read") as st:
+        data = read_buffer(filepath)
+        st.size = data.size
+
+    ocr = ocr_document(data, filename, reader, cache, options)
+
+    # Step 1: Clean & Extract
+    with stage("clean_text") as st:
+        cleaned = clean_text(ocr.text)
+        st.size = len(cleaned)
+    with stage("extract_fields") as st:
+        fields = extract_fields(cleaned, doc_type=ocr.doc_type)
+        st.size = len(fields)
+    return build_record(filepath, category, ocr.content_hash, cleaned, fields, ocr.used_trocr, ocr.doc_type)
+
+
+def ocr_document(data: Buffer, filename: str, reader, cache: Optional[OCRCache] = None,
+                 options: Optional[Dict[str, Dict[str, Any]]] = None) -> OCRDocument:
+    """Decode, classify, preprocess and OCR one encoded image, multi-page TIFF or PDF (see process_document for options).
+
+    Pages are decoded to grayscale one at a time, classified when options["classify"]
+    is set (see DOC_TYPE_ROUTES) and their texts joined with blank lines.
+
+    Returns:
+        OCRDocument(raw OCR text, whether TrOCR produced it, content hash of data, document type)
+    """
+    options = options or {}
+    ingest_options = options.get("ingest", {})
+    classify_options = options.get("classify")
+
+    doc_key = None
+    hit = None
+    content_hash = hash_bytes(data)
+    if cache is not None:
+        with stage("cache_lookup"):
+            doc_key = document_cache_key(content_hash, options)
+            hit = cache.get(doc_key)
+
+    if hit is not None:
+        text, _, engine = hit
+        used_trocr = engine == "trocr"
+        # Read alongside the document entry, so not counted as a second hit or miss
+        type_hit = cache.peek(doc_type_cache_key(content_hash, options)) if classify_options is not None else None
+        logger.info(f"♻️ OCR cache hit for {filename} (engine: {engine})")
+        return OCRDocument(text, used_trocr, content_hash, type_hit[0] if type_hit else None)
+
+    texts: List[str] = []
+    used_trocr = False
+    doc_type = None
+    pages = iter_pages(data, **ingest_options)
+    while True:
+        with stage("decode") as st:
+            try:
+                page = next(pages)
+            except StopIteration:
+                # Exhausting the iterator is not a page decode
+                st.discard()
+                break
+            except ValueError as e:
+                raise ValueError(f"Could not read image: {filename} ({e})") from e
+            st.size = page.image.nbytes
+        if page.count > 1:
+            logger.info(f"📄 {filename}: page {page.index + 1}/{page.count}")
+        page_type = None
+        if classify_options is not None:
+            with stage("classify"):
+                prediction = classify(page.image, **classify_options)
+            page_type = prediction.doc_type if prediction else None
+        if page.index == 0:
+            doc_type = page_type
+        page_text, page_trocr = _ocr_page(page.image, filename, reader, options, page_type)
+        if page_text:
+            texts.append(page_text)
+        used_trocr = used_trocr or page_trocr
+    text = "\n\n".join(texts)
+
+    if cache is not None and text:
+        with stage("cache_store"):
+            cache.put(doc_key, text, None, engine="trocr" if used_trocr else "easyocr")
+            if doc_type:
+                cache.put(doc_type_cache_key(content_hash, options), doc_type, None, engine="doc_classifier")
+    return OCRDocument(text, used_trocr, content_hash, doc_type)
+
+
+def _ocr_page(raw_img: np.ndarray, filename: str, reader, options: Dict[str, Dict[str, Any]],
+              doc_type: Optional[str] = None) -> Tuple[str, bool]:
+    """Preprocess and OCR one decoded page; return (text, whether TrOCR produced it).
+
+    doc_type (from the classifier) picks the DOC_TYPE_ROUTES defaults and sends
+    handwritten pages to TrOCR; without it, is_handwritten decides.
+    """
+    route = DOC_TYPE_ROUTES.get(doc_type, {})
+    preprocess_options = {**PREPROCESS_PARAMS, **route.get("preprocess", {}), **options.get("preprocess", {})}
+    ocr_options = {**route.get("ocr", {}), **options.get("ocr", {})}
+    trocr_options = options.get("trocr", {})
+
+    text = ""
+    used_trocr = False
+    with stage("preprocess") as st:
+        img = preprocess_image(raw_img, **preprocess_options)
+        st.size = img.nbytes
+
+    # Decide OCR engine: TrOCR for handwriting if available, otherwise EasyOCR+Tesseract
+    try:
+        if not _AI_OCR_AVAILABLE:
+            handwritten = False
+        elif doc_type:
+            handwritten = doc_type == "handwritten"
+        else:
+            with stage("is_handwritten"):
+                handwritten = is_handwritten(raw_img)
+        if handwritten:
+            logger.info("✍️ Detected Handwritten Text → Using TrOCR")
+            with stage("trocr") as st:
+                text = trocr_handwriting_ocr(raw_img, **trocr_options)
+                st.size = len(text)
+            if text:
+                used_trocr = True
+            else:
+                logger.warning("TrOCR returned no text; falling back to EasyOCR+Tesseract")
+        if not text:
+            logger.info("🖨️ Using EasyOCR + Tesseract")
+            with stage("extract_text") as st:
+                result = extract_text_result(img, reader, **ocr_options)
+                text = result.text
+                st.size = len(text)
+            if result.escalate and _AI_OCR_AVAILABLE and not handwritten:
+                # Last cascade step: printed engines stayed unsure, so try the handwriting model.
+                # TrOCR reads single handwritten lines; on printed pages it is usually worse, so it
+                # only replaces the printed text when its own confidence clears TROCR_ACCEPT_CONF.
+                try:
+                    with stage("trocr") as st:
+                        trocr = trocr_ocr_result(raw_img, **trocr_options)
+                        st.size = len(trocr.text)
+                except Exception as e:
+                    logger.warning(f"TrOCR escalation failed; keeping printed OCR result: {e}")
+                    trocr = None
+                if trocr is None or not trocr.text:
+                    winner = "printed (TrOCR returned no text)"
+                elif trocr.confidence is None:
+                    winner = "printed (TrOCR confidence unknown)"
+                elif trocr.confidence < TROCR_ACCEPT_CONF:
+                    winner = f"printed (TrOCR conf {trocr.confidence:.3f})"
+                else:
+                    text, used_trocr = trocr.text, True
+                    winner = f"TrOCR (conf {trocr.confidence:.3f})"
+                logger.info(f"🪜 {filename}: printed OCR conf {result.confidence:.3f} → escalated to TrOCR; "
+                            f"kept {winner}")
+    except Exception as e:
+        logger.error(f"Error during AI OCR decision/TrOCR run: {e}")
+        # Fallback to default
+        with stage("extract_text") as st:
+            text = extract_text_result(img, reader, **ocr_options).text
+            st.size = len(text)
+
+    return text, used_trocr
+
+
+def build_record(filepath: str, category: str, content_hash: str, cleaned: str,
+                 fields: Dict[str, str], used_trocr: bool = False, doc_type: Optional[str] = None) -> Dict[str, Any]:
+    """Validate extracted fields, label the document type and assemble its export record.
+
+    doc_type is the classifier's prediction; without one, the type is guessed from the OCR engine and filename.
+    """
+    filename = os.path.basename(filepath)
+    logger.info(f"📄 Extracted Fields for {filename}: {fields}")
+
+    # Step 2: Validate with NLP
+    with stage("validate_fields") as st:
+        validated_fields, confidence_scores = validate_fields(fields)
+        st.size = len(validated_fields)
+    logger.info(f"✅ Validated Fields: {validated_fields}")
+    logger.info(f"📊 Confidence Scores: {confidence_scores}")
+
+    # Step 3: Document type from the classifier (or from OCR choice and filename)
+    if doc_type in DOC_TYPE_LABELS:
+        doc_type = DOC_TYPE_LABELS[doc_type]
+    elif used_trocr:
+        doc_type = "Handwritten"
+    elif "receipt" in filename.lower():
+        doc_type = "Receipt"
+    elif "id" in filename.lower():
+        doc_type = "ID Card"
+    else:
+        doc_type = "Document"
+    logger.info(f"📑 Document Type: {doc_type}")
+
+    # Step 4: Structured record with consistent column naming
+    record = {
+        "file_hash": content_hash,
+        "filename": filename,
+        "doc_type": doc_type,
+        "category": category,
+        "path": filepath,
+        "extracted_text": cleaned,
+        **{k.lower(): v for k, v in validated_fields.items()},
+        **{f"{k.lower()}_conf": v for k, v in confidence_scores.items()}
+    }
+    logger.info(f"✅ Extraction successful for {filename} (category: {category})")
+    return record
+
+
+def _safe_process(filepath: str, category: str, reader, cache: Optional[OCRCache],
+                  options: Optional[Dict[str, Dict[str, Any]]], retries: int = 0, backoff: float = 0.0):
+    """Wrap process_document so one bad file never aborts the batch.
+
+    Failed attempts are retried up to ``retries`` times, sleeping
+    backoff * 2**n seconds before retry n + 1.
+
+    Returns (record, error, attempts, duration, (cache hits, cache misses) delta, stage events to forward).
+    """
+    before = cache.stats() if cache is not None else (0, 0)
+    start = time.perf_counter()
+    attempts = 0
+    with document(filepath), stage("document"):
+        while True:
+            attempts += 1
+            try:
+                record, error = process_document(filepath, category, reader, cache, options), None
+                break
+            except Exception as e:
+                logger.error(f"❌ Error processing {os.path.basename(filepath)} (category: {category}, "
+                             f"attempt {attempts}): {e}")
+                record, error = None, str(e)
+                if attempts > retries:
+                    break
+                time.sleep(backoff * (2 ** (attempts - 1)))
+    duration = time.perf_counter() - start
+    after = cache.stats() if cache is not None else (0, 0)
+    return record, error, attempts, duration, (after[0] - before[0], after[1] - before[1]), get_profiler().drain()
+
+
+def _init_worker(lang_list: Sequence[str], log_queue, log_level: int, num_threads: int,
+                 cache_path: Optional[str], cache_max_mb: float,
+                 options: Optional[Dict[str, Dict[str, Any]]], retry: Tuple[int, float]) -> None:
+    """Pool initializer: route logs to the parent and load the OCR reader once."""
+    global _READER, _CACHE, _OPTIONS, _RETRY
+    _OPTIONS = options
+    _RETRY = retry
+    # Stage timings travel back to the parent with each result
+    get_profiler().forward = True
+    worker_logger = logging.getLogger("IDIS")
+    worker_logger.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    worker_logger.setLevel(log_level)
+    worker_logger.propagate = False
+
+    # Avoid oversubscription: each worker gets its share of the cores
+    cv2.setNumThreads(num_threads)
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except Exception:
+        pass
+
+    _READER = get_reader(lang_list)
+    _CACHE = OCRCache(cache_path, max_mb=cache_max_mb) if cache_path else None
+    worker_logger.info(f"Worker {os.getpid()} initialized EasyOCR reader")
+
+
+def _worker_process(filepath: str, category: str):
+    return _safe_process(filepath, category, _READER, _CACHE, _OPTIONS, *_RETRY)
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    """Return the effective worker count (None -> DEFAULT_WORKERS, 0 -> number of CPU cores)."""
+    if workers is None:
+        return DEFAULT_WORKERS
+    if workers < 1:
+        return max(1, os.cpu_count() or 1)
+    return int(workers)
+
+
+def run_batch(items: Sequence[Tuple[str, str]], *, workers: Optional[int] = None,
+              max_pending: Optional[int] = None,
+              lang_list: Sequence[str] = ("en",),
+              cache_path: Optional[str] = None,
+              cache_max_mb: float = DEFAULT_MAX_MB,
+              options: Optional[Dict[str, Dict[str, Any]]] = None,
+              retries: int = 0,
+              retry_backoff: float = 1.0) -> Iterator[BatchResult]:
+    """Process (filepath, category) items and yield results in input order.
+
+    Args:
+        items: sequence of (filepath, category) pairs, e.g. from discover_images()
+        workers: number of worker processes (None -> DEFAULT_WORKERS, 0 -> CPU count, 1 -> serial
+            in-process); each process holds its own models, see DEFAULT_WORKERS
+        max_pending: bound on documents submitted but not yet yielded (default 2x workers)
+        lang_list: EasyOCR languages loaded by each worker
+        cache_path: SQLite OCR cache file shared by all workers (None disables caching)
+        cache_max_mb: size budget for the OCR cache before LRU eviction
+        options: per-stage keyword arguments, e.g. {"preprocess": {"profile": "fast"},
+            "ocr": {"strategy": "single_pass"}, "trocr": {"batch_size": 16}, "classify": {}} (see process_document)
+        retries: extra attempts for a failing document
+        retry_backoff: seconds before the first retry, doubled for each further one
+
+    Yields:
+        BatchResult(filepath, category, record, error, attempts, duration) where exactly
+        one of record/error is None. If a worker process dies, the documents in flight
+        are yielded as failed and the pool is restarted for the rest.
+    """
+    if not items:
+        return
+    workers = min(resolve_workers(workers), len(items))
+
+    hits = misses = 0
+    if workers == 1:
+        reader = get_reader(lang_list)
+        cache = OCRCache(cache_path, max_mb=cache_max_mb) if cache_path else None
+        logger.info("Initialized EasyOCR reader (serial mode)")
+        try:
+            for filepath, category in items:
+                record, error, attempts, duration, (h, m), _ = _safe_process(filepath, category, reader, cache,
+                                                                              options, retries, retry_backoff)
+                hits, misses = hits + h, misses + m
+                yield BatchResult(filepath, category, record, error, attempts, duration)
+        finally:
+            if cache is not None:
+                cache.close()
+                _log_cache_totals(hits, misses)
+        return
+
+    max_pending = max(workers, int(max_pending or 2 * workers))
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    logger.info(f"Starting batch engine: workers={workers} max_pending={max_pending} threads/worker={num_threads}")
+
+    ctx = mp.get_context()
+    log_queue = ctx.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+    listener.start()
+
+    def start_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                   initargs=(tuple(lang_list), log_queue, logger.getEffectiveLevel(), num_threads,
+                                             cache_path, cache_max_mb, options, (retries, retry_backoff)))
+
+    pool = start_pool()
+    try:
+        pending: deque = deque()
+        source = iter(items)
+        exhausted = False
+        held = None  # item taken from source but not yet accepted by the pool
+        while True:
+            try:
+                # Keep the bounded work queue full
+                while not exhausted and len(pending) < max_pending:
+                    if held is None:
+                        try:
+                            held = next(source)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                    pending.append((*held, pool.submit(_worker_process, *held)))
+                    held = None
+                if not pending:
+                    break
+                # Yield strictly in submission order
+                filepath, category, future = pending[0]
+                record, error, attempts, duration, (h, m), events = future.result()
+                pending.popleft()
+            except BrokenProcessPool as e:
+                # A worker died (e.g. killed by the OOM killer) and took every in-flight document with it
+                logger.error(f"💥 OCR worker process died ({e}); failing the unfinished documents of "
+                             f"{len(pending)} in flight and restarting the worker pool")
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = start_pool()
+                while pending:
+                    filepath, category, future = pending.popleft()
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        record, error, attempts, duration, (h, m), events = future.result()
+                        hits, misses = hits + h, misses + m
+                        get_profiler().merge(events)
+                        yield BatchResult(filepath, category, record, error, attempts, duration)
+                    else:
+                        yield BatchResult(filepath, category, None, f"OCR worker process died: {e}", 1, 0.0)
+                continue
+            hits, misses = hits + h, misses + m
+            get_profiler().merge(events)
+            yield BatchResult(filepath, category, record, error, attempts, duration)
+    finally:
+        pool.shutdown()
+        listener.stop()
+        if cache_path:
+            _log_cache_totals(hits, misses)
+
+
+def _log_cache_totals(hits: int, misses: int) -> None:
+    total = hits + misses
+    rate = (hits / total) if total else 0.0
+    logger.info(f"♻️ OCR cache: hits={hits} misses={misses} hit_rate={rate:.1%}")
@@ -1,55 +1,337 @@
+"""OCR engine benchmark: accuracy (WER/CER) vs speed.
+
+Single image:
+    python -m modules.benchmark image.png "ground truth text"
+
+Labelled corpus (data/input_images/<category>/<name>.<ext> with a sidecar
+<name>.txt holding the ground truth), written to JSON for diffing runs:
+    python -m modules.benchmark data/input_images --output results/benchmark.json
+    python -m modules.benchmark data/input_images --baseline results/benchmark.json
+
+Preprocessing is timed separately and shared by all engines, and each
+engine's models are loaded before its timing loop, so engine latencies only
+cover OCR itself.
+"""
+import os
+import sys
+import json
 import time
-import pytesseract
-import easyocr
+import platform
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
 from modules.image_preprocess import preprocess_image
-from modules.text_extraction import extract_text
+from modules.text_extraction import (extract_text, _run_easyocr_on_image, tesseract_available,
+                                     STRATEGY_CASCADE, STRATEGY_MULTISCALE, STRATEGY_SINGLE_PASS)
 from modules.evaluation import evaluate_ocr
+from modules.profiling import percentile
+from modules.models import get_reader, warmup
 
-reader = easyocr.Reader(['en'])
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tiff", ".tif", ".bmp", ".gif")
+
+ALL_ENGINES = ("easyocr", "tesseract", "trocr", "extract_text:cascade", "extract_text:multiscale",
+               "extract_text:single_pass")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, if the platform exposes it."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KB on Linux, bytes on macOS
+        return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except Exception:
+        return None
 
-def run_benchmark(image_path, ground_truth_text):
-    results = []
 
-    # -------- EasyOCR --------
-    start = time.time()
-    easy_text = extract_text(preprocess_image(image_path), reader)
-    easy_time = round(time.time() - start, 2)
-    easy_wer, easy_cer = evaluate_ocr(ground_truth_text, easy_text)
-    results.append({
-        "Engine": "EasyOCR",
-        "WER": easy_wer,
-        "CER": easy_cer,
-        "Time_s": easy_time
-    })
-
-    # -------- Tesseract --------
-    start = time.time()
-    tess_text = pytesseract.image_to_string(preprocess_image(image_path))
-    tess_time = round(time.time() - start, 2)
-    tess_wer, tess_cer = evaluate_ocr(ground_truth_text, tess_text)
-    results.append({
-        "Engine": "Tesseract",
-        "WER": tess_wer,
-        "CER": tess_cer,
-        "Time_s": tess_time
-    })
+def _tesseract_text(img: np.ndarray) -> str:
+    import pytesseract
+    return pytesseract.image_to_string(img)
 
+
+def _trocr_text(raw: np.ndarray) -> str:
+    from modules.ai_ocr import trocr_handwriting_ocr
+    return trocr_handwriting_ocr(raw)
+
+
+def get_engines(names: Sequence[str] = ALL_ENGINES) -> Dict[str, Callable[[np.ndarray, np.ndarray], str]]:
+    """Map engine name -> fn(raw_bgr, preprocessed) returning text, skipping unavailable engines."""
+    engines: Dict[str, Callable[[np.ndarray, np.ndarray], str]] = {}
+    for name in names:
+        if name == "easyocr":
+            engines[name] = lambda raw, img: _run_easyocr_on_image(get_reader(), img)[0]
+        elif name == "tesseract":
+            if tesseract_available():
+                engines[name] = lambda raw, img: _tesseract_text(img)
+        elif name == "trocr":
+            engines[name] = lambda raw, img: _trocr_text(raw)
+        elif name == "extract_text:multiscale":
+            engines[name] = lambda raw, img: extract_text(img, get_reader(), strategy=STRATEGY_MULTISCALE)
+        elif name == "extract_text:cascade":
+            engines[name] = lambda raw, img: extract_text(img, get_reader(), strategy=STRATEGY_CASCADE)
+        elif name == "extract_text:single_pass":
+            engines[name] = lambda raw, img: extract_text(img, get_reader(), strategy=STRATEGY_SINGLE_PASS)
+        else:
+            raise ValueError(f"Unknown engine: {name}")
+    return engines
+
+
+def warm_engine(name: str) -> float:
+    """Load the models an engine needs (untimed by callers); returns seconds spent."""
+    if name == "trocr":
+        timings = warmup(ocr=False, ner=False, spelling=False, handwriting=True)
+    elif name == "tesseract":
+        start = time.perf_counter()
+        tesseract_available()
+        return round(time.perf_counter() - start, 3)
+    else:
+        timings = warmup(ner=False, spelling=False)
+    return round(sum(timings.values()), 3)
+
+
+def run_benchmark(image_path, ground_truth_text, engines: Sequence[str] = ("extract_text:cascade", "extract_text:multiscale", "tesseract")):
+    """Benchmark engines on a single image; returns a list of per-engine result dicts."""
+    results = []
+    raw = cv2.imread(str(image_path))
+    if raw is None:
+        raise ValueError(f"Could not read image: {image_path}")
+    start = time.perf_counter()
+    img = preprocess_image(raw)
+    prep_time = time.perf_counter() - start
+
+    for name, fn in get_engines(engines).items():
+        warm_engine(name)
+        start = time.perf_counter()
+        text = fn(raw, img)
+        elapsed = time.perf_counter() - start
+        w, c = evaluate_ocr(ground_truth_text, text)
+        results.append({
+            "Engine": name,
+            "WER": w,
+            "CER": c,
+            "Time_s": round(elapsed, 2),
+            "Preprocess_s": round(prep_time, 2),
+        })
     return results
 
 
+def discover_labelled(root: str) -> List[Tuple[str, str, Optional[str]]]:
+    """Return (image_path, category, ground_truth or None) for images under root."""
+    items = []
+    for dirpath, _, files in os.walk(root):
+        rel = os.path.relpath(dirpath, root)
+        category = rel.split(os.sep)[0] if rel != "." else ""
+        for filename in sorted(files):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(dirpath, filename)
+            gt_path = os.path.splitext(path)[0] + ".txt"
+            gt = None
+            if os.path.isfile(gt_path):
+                with open(gt_path, "r", encoding="utf-8") as f:
+                    gt = f.read()
+            items.append((path, category, gt))
+    return sorted(items)
+
+
+def _latency_stats(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(1000 * percentile(ordered, 50), 1),
+        "p95_ms": round(1000 * percentile(ordered, 95), 1),
+        "p99_ms": round(1000 * percentile(ordered, 99), 1),
+    }
+
+
+def _aggregate(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    labelled = [r for r in rows if r["wer"] is not None]
+    total = sum(r["time_s"] for r in rows)
+    out: Dict[str, Any] = {
+        "documents": len(rows),
+        "labelled": len(labelled),
+        "wer": round(sum(r["wer"] for r in labelled) / len(labelled), 4) if labelled else None,
+        "cer": round(sum(r["cer"] for r in labelled) / len(labelled), 4) if labelled else None,
+        "total_s": round(total, 3),
+        "docs_per_s": round(len(rows) / total, 3) if total else None,
+        # Process CPU time (all threads), so parallel engines are not flattered by wall-clock latency
+        "cpu_ms_per_doc": round(1000 * sum(r["cpu_s"] for r in rows) / len(rows), 1) if rows else None,
+    }
+    out.update(_latency_stats([r["time_s"] for r in rows]))
+    return out
+
+
+def run_corpus_benchmark(root: str, engines: Sequence[str] = ALL_ENGINES, *, labelled_only: bool = True,
+                         limit: Optional[int] = None, preprocess_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Benchmark engines over a labelled directory tree.
+
+    Returns a JSON-serializable report with per-engine, per-category WER/CER,
+    throughput, latency percentiles, model warm-up time and the process peak
+    RSS after each engine (cumulative, so engines run in the order given). Images are decoded and
+    preprocessed again for each engine to keep memory flat; only OCR is timed.
+    """
+    items = discover_labelled(root)
+    if labelled_only:
+        items = [it for it in items if it[2] is not None]
+    if limit:
+        items = items[:limit]
+
+    def prepared():
+        for path, category, gt in items:
+            raw = cv2.imread(path)
+            if raw is None:
+                print(f"⚠️ Skipping unreadable image: {path}", file=sys.stderr)
+                continue
+            start = time.perf_counter()
+            img = preprocess_image(raw, **(preprocess_options or {}))
+            prep_latencies.append(time.perf_counter() - start)
+            yield path, category, gt, raw, img
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "root": root,
+            "documents": len(items),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "preprocess_options": preprocess_options or {},
+        },
+        "preprocess": {},
+        "engines": {},
+    }
+
+    for name, fn in get_engines(engines).items():
+        # Model load time would otherwise land on the first timed document
+        warmup_s = warm_engine(name)
+        rows = []
+        prep_latencies: List[float] = []
+        for path, category, gt, raw, img in prepared():
+            start, cpu_start = time.perf_counter(), time.process_time()
+            try:
+                text = fn(raw, img)
+            except Exception as e:
+                print(f"⚠️ {name} failed on {path}: {e}", file=sys.stderr)
+                text = ""
+            elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+            w, c = evaluate_ocr(gt, text) if gt is not None else (None, None)
+            rows.append({"path": path, "category": category, "wer": w, "cer": c, "time_s": elapsed, "cpu_s": cpu})
+
+        by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for r in rows:
+            by_category.setdefault(r["category"] or "(root)", []).append(r)
+        if not report["preprocess"] and prep_latencies:
+            report["preprocess"] = {"total_s": round(sum(prep_latencies), 3), **_latency_stats(prep_latencies)}
+        report["engines"][name] = {
+            "overall": _aggregate(rows),
+            "categories": {cat: _aggregate(rs) for cat, rs in sorted(by_category.items())},
+            "warmup_s": warmup_s,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    return report
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], *, cer_tolerance: float = 0.01,
+                    speed_tolerance: float = 0.2) -> List[str]:
+    """Return human-readable regressions of current vs baseline.
+
+    Flags CER/WER increases above cer_tolerance (absolute) and p50 latency
+    increases above speed_tolerance (relative), overall and per category.
+    """
+    regressions = []
+    for engine, cur in current.get("engines", {}).items():
+        base = baseline.get("engines", {}).get(engine)
+        if not base:
+            continue
+        scopes = [("overall", base["overall"], cur["overall"])]
+        scopes += [(cat, base["categories"][cat], stats) for cat, stats in cur["categories"].items()
+                   if cat in base.get("categories", {})]
+        for scope, b, c in scopes:
+            for metric in ("cer", "wer"):
+                if b.get(metric) is not None and c.get(metric) is not None and c[metric] - b[metric] > cer_tolerance:
+                    regressions.append(f"{engine} [{scope}] {metric.upper()} {b[metric]:.4f} -> {c[metric]:.4f}")
+            if b.get("p50_ms") and c.get("p50_ms") and c["p50_ms"] > b["p50_ms"] * (1 + speed_tolerance):
+                regressions.append(f"{engine} [{scope}] p50 {b['p50_ms']:.1f}ms -> {c['p50_ms']:.1f}ms")
+    return regressions
+
+
+def _print_table(headers: List[str], rows: List[List[str]]) -> None:
+    # Pretty print table without extra dependencies
+    col_widths = [max(len(str(x)) for x in col) for col in zip(*(rows + [headers]))]
+    fmt = "  ".join(f"{{:<{w}}}" for w in col_widths)
+    print(fmt.format(*headers))
+    print("-" * (sum(col_widths) + 2 * (len(col_widths)-1)))
+    for row in rows:
+        print(fmt.format(*row))
+
+
+def _fmt(value, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
 if __name__ == "__main__":
     import argparse
-    parser = argparse.ArgumentParser(description="Run OCR benchmark on a single image")
-    parser.add_argument("image", help="Path to the image file to OCR")
-    parser.add_argument("ground_truth", help="Ground truth text or path to a .txt file containing the reference text")
+    parser = argparse.ArgumentParser(description="Benchmark OCR engines on a single image or a labelled corpus")
+    parser.add_argument("path", help="Image file, or a directory tree of images with sidecar .txt ground truth")
+    parser.add_argument("ground_truth", nargs="?", help="Single-image mode: ground truth text or path to a .txt file")
+    parser.add_argument("--engines", default=None,
+                        help=f"Comma-separated engines (default: all available for corpus mode): {','.join(ALL_ENGINES)}")
+    parser.add_argument("--include-unlabelled", action="store_true", help="Corpus mode: also time images without ground truth")
+    parser.add_argument("--limit", type=int, default=None, help="Corpus mode: only use the first N images")
+    parser.add_argument("--preprocess-profile", default="default", help="preprocess_image profile (default/fast)")
+    parser.add_argument("--output", default=None, help="Corpus mode: write the JSON report to this path")
+    parser.add_argument("--baseline", default=None, help="Corpus mode: compare against a previous JSON report")
+    parser.add_argument("--cer-tolerance", type=float, default=0.01, help="Allowed absolute CER/WER increase vs baseline")
     parser.add_argument("--json", action="store_true", help="Output results as JSON")
     args = parser.parse_args()
+    engine_names = [e.strip() for e in args.engines.split(",")] if args.engines else None
+
+    if os.path.isdir(args.path):
+        report = run_corpus_benchmark(args.path, engine_names or ALL_ENGINES,
+                                      labelled_only=not args.include_unlabelled, limit=args.limit,
+                                      preprocess_options={"profile": args.preprocess_profile})
+        if args.output:
+            os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            headers = ["Engine", "Category", "Docs", "WER", "CER", "Docs/s", "p50_ms", "p95_ms", "p99_ms", "CPU_ms/doc",
+                       "Warmup_s", "PeakRSS_MB"]
+            rows = []
+            for name, res in report["engines"].items():
+                for cat, s in [("ALL", res["overall"])] + list(res["categories"].items()):
+                    rows.append([name, cat, str(s["documents"]), _fmt(s["wer"], ".3f"), _fmt(s["cer"], ".3f"),
+                                 _fmt(s["docs_per_s"], ".2f"), _fmt(s["p50_ms"], ".0f"), _fmt(s["p95_ms"], ".0f"),
+                                 _fmt(s["p99_ms"], ".0f"), _fmt(s.get("cpu_ms_per_doc"), ".0f"),
+                                 _fmt(res.get("warmup_s"), ".1f"), _fmt(res["peak_rss_mb"], ".0f")])
+            _print_table(headers, rows)
+
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+            regressions = compare_reports(baseline, report, cer_tolerance=args.cer_tolerance)
+            if regressions:
+                print("\n❌ Regressions vs baseline:")
+                for line in regressions:
+                    print(f"  - {line}")
+                sys.exit(1)
+            print("\n✅ No regressions vs baseline")
+        sys.exit(0)
 
-    image = args.image
+    if args.ground_truth is None:
+        parser.error("ground_truth is required when benchmarking a single image")
     gt = args.ground_truth
     # If ground_truth points to a file, read it
     try:
-        import os
         if os.path.isfile(gt):
             with open(gt, "r", encoding="utf-8") as f:
                 gt_text = f.read()
@@ -58,22 +340,14 @@ if __name__ == "__main__":
     except Exception:
         gt_text = gt
 
-    out = run_benchmark(image, gt_text)
+    out = run_benchmark(args.path, gt_text, engine_names or ("extract_text:cascade", "extract_text:multiscale", "tesseract"))
     try:
         if args.json:
-            import json
             print(json.dumps(out, ensure_ascii=False, indent=2))
         else:
-            # Pretty print table without extra dependencies
             headers = ["Engine", "WER", "CER", "Time_s"]
             rows = [[r['Engine'], f"{r['WER']:.3f}", f"{r['CER']:.3f}", f"{r['Time_s']:.2f}"] for r in out]
-            # compute column widths
-            col_widths = [max(len(str(x)) for x in col) for col in zip(*(rows + [headers]))]
-            fmt = "  ".join(f"{{:<{w}}}" for w in col_widths)
-            print(fmt.format(*headers))
-            print("-" * (sum(col_widths) + 2 * (len(col_widths)-1)))
-            for row in rows:
-                print(fmt.format(*row))
+            _print_table(headers, rows)
     except Exception:
         # Fallback simple print
         for r in out:
@@ -1,19 +1,36 @@
 # modules/data_export.py
-import pandas as pd
 import sqlite3
 from datetime import datetime
 import os
+import csv
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .ocr_cache import hash_bytes, hash_file
+
+logger = logging.getLogger("IDIS")
+
+# Columns every OCR record carries, in export order; extracted fields follow
+CORE_COLUMNS = ["file_hash", "filename", "doc_type", "category", "path", "extracted_text", "export_timestamp"]
+INDEXED_COLUMNS = ("filename", "doc_type", "category")
+DEFAULT_DB_PATH = "results/ocr_results.db"
+DEFAULT_BATCH_SIZE = 500
+
+def normalize_column(name):
+    """Normalize a single column name (spaces/dashes -> underscores, lower case)."""
+    return str(name).replace(" ", "_").replace("-", "_").lower()
 
 def normalize_columns(df):
     """Normalize column names to be consistent across exports."""
     # Replace spaces and special characters with underscores
-    df.columns = [col.replace(" ", "_").replace("-", "_") for col in df.columns]
     # Ensure no CamelCase causes issues (e.g., DocType -> doc_type)
-    df.columns = [col.lower() for col in df.columns]
+    df.columns = [normalize_column(col) for col in df.columns]
     return df
 
 def export_to_csv(data_records, output_path):
     """Save OCR results to CSV with timestamp."""
+    import pandas as pd
     df = pd.DataFrame(data_records)
     df = normalize_columns(df)
     df["export_timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -21,23 +38,197 @@ def export_to_csv(data_records, output_path):
     df.to_csv(output_path, index=False, encoding='utf-8')
     print(f"✅ CSV saved to: {output_path}")
 
-def export_to_sqlite(data_records, db_path="results/ocr_results.db"):
-    """Export OCR results to SQLite database with proper column naming."""
-    df = pd.DataFrame(data_records)
-    df = normalize_columns(df)
-    df["export_timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    conn = sqlite3.connect(db_path)
-    
-    try:
-        # Drop existing table to ensure schema consistency
-        try:
-            conn.execute("DROP TABLE IF EXISTS ocr_results")
-        except:
-            pass
-            
-        df.to_sql("ocr_results", conn, if_exists="replace", index=False)
-        print(f"💾 Data inserted into SQLite DB: {db_path}")
-    finally:
-        conn.close()
+def export_to_sqlite(data_records, db_path=DEFAULT_DB_PATH):
+    """Upsert OCR results into the SQLite database (keyed by file hash, history is kept)."""
+    with StreamingExporter(db_path=db_path) as exporter:
+        exporter.write_many(data_records)
+    print(f"💾 Data upserted into SQLite DB: {db_path}")
+
+
+class StreamingExporter:
+    """Append-only exporter that writes OCR records as they arrive.
+
+    Records are buffered and flushed every ``batch_size`` rows in a single
+    SQLite transaction (WAL mode, ``executemany`` upsert keyed by file hash),
+    appended to a CSV file and, optionally, written as Parquet chunk files.
+    Memory stays bounded by the batch size and everything flushed survives
+    an interrupted run.
+
+    Args:
+        db_path: SQLite database file (None disables the SQLite sink)
+        csv_path: CSV file to append to (None disables the CSV sink)
+        parquet_dir: directory for part-NNNNN.parquet chunks (requires pyarrow)
+        batch_size: records buffered between flushes
+        append_csv: keep rows from an existing CSV instead of starting a new file
+        table: SQLite table name
+        on_flush: called with the flushed rows once every sink has written them
+            (e.g. to checkpoint a job manifest)
+    """
+
+    def __init__(self, db_path: Optional[str] = DEFAULT_DB_PATH, csv_path: Optional[str] = None,
+                 parquet_dir: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                 append_csv: bool = False, table: str = "ocr_results",
+                 on_flush: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.db_path = db_path
+        self.csv_path = csv_path
+        self.parquet_dir = parquet_dir
+        self.batch_size = max(1, int(batch_size))
+        self.table = table
+        self.on_flush = on_flush
+        self.written = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_columns: List[str] = []
+        self._csv_columns: List[str] = []
+        self._parquet_part = 0
+
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._prepare_schema()
+
+        if csv_path:
+            os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+            if append_csv and os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
+                with open(csv_path, newline="", encoding="utf-8") as f:
+                    self._csv_columns = next(csv.reader(f), [])
+            elif os.path.exists(csv_path):
+                os.remove(csv_path)
+
+        if parquet_dir:
+            try:
+                import pyarrow  # noqa: F401
+                os.makedirs(parquet_dir, exist_ok=True)
+                self._parquet_part = len([f for f in os.listdir(parquet_dir) if f.endswith(".parquet")])
+            except ImportError:
+                logger.warning("pyarrow not installed; Parquet export disabled")
+                self.parquet_dir = None
+
+    def _prepare_schema(self) -> None:
+        cols = [row[1] for row in self._conn.execute(f"PRAGMA table_info({self.table})")]
+        if cols and "file_hash" not in cols:
+            # Table written by the old drop-and-replace export: keep it, start a keyed table
+            legacy = f"{self.table}_legacy_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            self._conn.execute(f"ALTER TABLE {self.table} RENAME TO {legacy}")
+            logger.warning(f"Existing {self.table} table has no file_hash column; renamed to {legacy}")
+            cols = []
+        if not cols:
+            defs = ", ".join(f'"{c}" TEXT PRIMARY KEY' if c == "file_hash" else f'"{c}"' for c in CORE_COLUMNS)
+            self._conn.execute(f"CREATE TABLE {self.table} ({defs})")
+            cols = list(CORE_COLUMNS)
+        for col in INDEXED_COLUMNS:
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_{col} ON {self.table}("{col}")')
+        self._conn.commit()
+        self._db_columns = cols
+
+    def _row(self, record: Dict[str, Any], timestamp: str) -> Dict[str, Any]:
+        row = {normalize_column(k): v for k, v in record.items()}
+        row["export_timestamp"] = timestamp
+        if not row.get("file_hash"):
+            path = row.get("path")
+            row["file_hash"] = hash_file(path) if path and os.path.isfile(path) \
+                else hash_bytes(str(path or row.get("filename", "")).encode("utf-8"))
+        return row
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Buffer one record, flushing when the batch is full."""
+        with self._lock:
+            self._buffer.append(self._row(record, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def write_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        for record in records:
+            self.write(record)
+
+    def flush(self) -> None:
+        """Write all buffered records to every sink."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        columns = list(CORE_COLUMNS)
+        for row in rows:
+            columns.extend(c for c in row if c not in columns)
+        if self._conn is not None:
+            self._flush_sqlite(rows, columns)
+        if self.csv_path:
+            self._flush_csv(rows, columns)
+        if self.parquet_dir:
+            self._flush_parquet(rows)
+        self.written += len(rows)
+        logger.debug(f"Exported {len(rows)} records ({self.written} total)")
+        if self.on_flush is not None:
+            self.on_flush(rows)
+
+    def _flush_sqlite(self, rows: List[Dict[str, Any]], columns: List[str]) -> None:
+        with self._conn:  # one transaction per batch
+            for col in columns:
+                if col not in self._db_columns:
+                    self._conn.execute(f'ALTER TABLE {self.table} ADD COLUMN "{col}"')
+                    self._db_columns.append(col)
+            cols = self._db_columns
+            quoted = ", ".join(f'"{c}"' for c in cols)
+            updates = ", ".join(f'"{c}" = excluded."{c}"' for c in cols if c != "file_hash")
+            sql = (f"INSERT INTO {self.table} ({quoted}) VALUES ({', '.join('?' * len(cols))}) "
+                   f"ON CONFLICT(file_hash) DO UPDATE SET {updates}")
+            self._conn.executemany(sql, [tuple(_sql_value(row.get(c)) for c in cols) for row in rows])
+
+    def _flush_csv(self, rows: List[Dict[str, Any]], columns: List[str]) -> None:
+        new_cols = [c for c in columns if c not in self._csv_columns]
+        if new_cols and self._csv_columns:
+            self._extend_csv_header(self._csv_columns + new_cols)
+        header_needed = not self._csv_columns
+        self._csv_columns = self._csv_columns + new_cols
+        with open(self.csv_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=self._csv_columns, extrasaction="ignore")
+            if header_needed:
+                writer.writeheader()
+            writer.writerows(rows)
+
+    def _extend_csv_header(self, columns: List[str]) -> None:
+        """Rewrite the CSV with a wider header (streamed, so memory stays flat)."""
+        tmp_path = self.csv_path + ".tmp"
+        with open(self.csv_path, newline="", encoding="utf-8") as src, \
+                open(tmp_path, "w", newline="", encoding="utf-8") as dst:
+            writer = csv.DictWriter(dst, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(csv.DictReader(src))
+        os.replace(tmp_path, self.csv_path)
+
+    def _flush_parquet(self, rows: List[Dict[str, Any]]) -> None:
+        import pandas as pd
+        path = os.path.join(self.parquet_dir, f"part-{self._parquet_part:05d}.parquet")
+        pd.DataFrame(rows).to_parquet(path, index=False)
+        self._parquet_part += 1
+
+    def close(self) -> None:
+        """Flush remaining records and close the database."""
+        with self._lock:
+            try:
+                self._flush()
+            finally:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _sql_value(value: Any) -> Any:
+    """Coerce values SQLite cannot bind (lists, dicts, numpy scalars) to text/numbers."""
+    if value is None or isinstance(value, (str, int, float, bytes)):
+        return value
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
@@ -0,0 +1,341 @@
+"""Fast document-type classifier: HOG + LBP features and a linear softmax model.
+
+Every page is reduced to a 256 px grayscale thumbnail and described by a
+coarse HOG (layout and stroke orientation), a uniform-LBP histogram (print vs
+handwriting vs screen texture) and a few global statistics (aspect ratio,
+ink coverage, edge density, glyph size). A multinomial logistic regression,
+trained with plain NumPy from the data/input_images/<category> folders,
+predicts one of DOC_TYPES in a few milliseconds on CPU.
+
+The trained weights live in data/models/doc_classifier.npz, and the
+leave-one-out evaluation of the same training run in
+data/models/doc_classifier_eval.json. Retrain after adding labelled images:
+    python -m modules.doc_classifier data/input_images
+
+The bundled model is trained on a couple of dozen images and its held-out
+predictions are often wrong with high confidence, so the pipeline only routes
+by document type when asked to (batch options["classify"], main.py
+--classify-docs); otherwise is_handwritten and the filename heuristics decide.
+
+Usage:
+    prediction = classify(page)      # Prediction(doc_type="receipt", confidence=0.91) or None
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from collections import namedtuple
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .resolution import estimate_text_height
+
+logger = logging.getLogger("IDIS")
+
+DOC_TYPES = ("printed", "handwritten", "receipt", "id_card", "screenshot")
+
+# Training folder (first-level category under data/input_images) -> document type
+CATEGORY_DOC_TYPES = {
+    "printed_text": "printed",
+    "handwritten_notes": "handwritten",
+    "receipts_invoices": "receipt",
+    "id_cards_documents": "id_card",
+    "screenshots": "screenshot",
+}
+
+# Export labels (the doc_type column)
+DOC_TYPE_LABELS = {
+    "printed": "Document",
+    "handwritten": "Handwritten",
+    "receipt": "Receipt",
+    "id_card": "ID Card",
+    "screenshot": "Screenshot",
+}
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "models")
+DEFAULT_MODEL_PATH = os.path.join(MODEL_DIR, "doc_classifier.npz")
+DEFAULT_REPORT_PATH = os.path.join(MODEL_DIR, "doc_classifier_eval.json")
+
+THUMB_SIDE = 256
+HOG_SIZE = 64        # HOG window: 4x4 cells of 16 px, 9 orientation bins, 2x2-cell blocks
+HOG_CELL = 16
+HOG_BINS = 9
+L2 = 1.0
+EPOCHS = 500
+LEARNING_RATE = 0.5
+MIN_CONFIDENCE = 0.5     # less confident predictions are not used for routing
+
+Prediction = namedtuple("Prediction", ["doc_type", "confidence"])
+
+def _uniform_lbp_table() -> np.ndarray:
+    """Map the 256 LBP codes to 59 bins: one per uniform pattern (<= 2 bit transitions) plus one for the rest."""
+    table = np.full(256, 58, dtype=np.int64)
+    next_bin = 0
+    for code in range(256):
+        bits = [(code >> i) & 1 for i in range(8)]
+        if sum(bits[i] != bits[(i + 1) % 8] for i in range(8)) <= 2:
+            table[code] = next_bin
+            next_bin += 1
+    return table
+
+
+_LBP_BINS = _uniform_lbp_table()
+
+
+def _hog(gray: np.ndarray) -> np.ndarray:
+    """Histogram of oriented gradients (unsigned, magnitude-weighted), L2-normalized per 2x2-cell block.
+
+    Implemented with NumPy because cv2.HOGDescriptor is not part of every OpenCV build.
+    """
+    img = cv2.resize(gray, (HOG_SIZE, HOG_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    gx = cv2.Sobel(img, cv2.CV_32F, 1, 0, ksize=1)
+    gy = cv2.Sobel(img, cv2.CV_32F, 0, 1, ksize=1)
+    magnitude, angle = cv2.cartToPolar(gx, gy, angleInDegrees=True)
+    bins = ((angle % 180.0) / (180.0 / HOG_BINS)).astype(np.int64) % HOG_BINS
+    cells = HOG_SIZE // HOG_CELL
+    cell_index = (np.arange(HOG_SIZE) // HOG_CELL)
+    flat = (cell_index[:, None] * cells + cell_index[None, :]) * HOG_BINS + bins
+    hist = np.bincount(flat.ravel(), weights=magnitude.ravel(), minlength=cells * cells * HOG_BINS)
+    blocks = hist.reshape(cells // 2, 2, cells // 2, 2, HOG_BINS).transpose(0, 2, 1, 3, 4).reshape(-1, 4 * HOG_BINS)
+    blocks /= np.linalg.norm(blocks, axis=1, keepdims=True) + 1e-6
+    return blocks.ravel()
+
+
+def _lbp_histogram(gray: np.ndarray) -> np.ndarray:
+    center = gray[1:-1, 1:-1]
+    h, w = gray.shape
+    codes = np.zeros(center.shape, dtype=np.uint8)
+    offsets = ((0, 0), (0, 1), (0, 2), (1, 2), (2, 2), (2, 1), (2, 0), (1, 0))
+    for bit, (dy, dx) in enumerate(offsets):
+        codes |= (gray[dy:dy + h - 2, dx:dx + w - 2] >= center).astype(np.uint8) << bit
+    hist = np.bincount(_LBP_BINS[codes.ravel()], minlength=59).astype(np.float64)
+    return hist / max(1.0, hist.sum())
+
+
+def features(image: np.ndarray) -> np.ndarray:
+    """Feature vector for a BGR or grayscale page."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    h, w = gray.shape[:2]
+    scale = THUMB_SIDE / float(max(h, w))
+    thumb = cv2.resize(gray, (max(8, int(w * scale)), max(8, int(h * scale))),
+                       interpolation=cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR)
+
+    hog = _hog(thumb)
+    lbp = _lbp_histogram(thumb)
+
+    _, ink = cv2.threshold(thumb, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    ink_fraction = cv2.countNonZero(ink) / float(ink.size)
+    edges = cv2.Canny(thumb, 50, 150)
+    text_height = estimate_text_height(thumb) or 0.0
+    hist = np.bincount(thumb.ravel(), minlength=256) / float(thumb.size)
+    nonzero = hist[hist > 0]
+    stats = np.array([
+        np.log(w / float(h)),
+        thumb.mean() / 255.0,
+        thumb.std() / 255.0,
+        min(ink_fraction, 1.0 - ink_fraction),
+        cv2.countNonZero(edges) / float(edges.size),
+        text_height / float(thumb.shape[0]),
+        -float((nonzero * np.log2(nonzero)).sum()) / 8.0,
+    ])
+    return np.concatenate([hog, lbp, stats]).astype(np.float32)
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+class DocClassifier:
+    """Linear softmax classifier over standardized page features.
+
+    Args:
+        weights: (n_features, n_classes) matrix
+        bias: (n_classes,) vector
+        mean, std: feature standardization
+        labels: class names, in column order
+    """
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, mean: np.ndarray, std: np.ndarray,
+                 labels: Sequence[str]):
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.std = std
+        self.labels = tuple(labels)
+
+    @classmethod
+    def fit(cls, X: np.ndarray, y: Sequence[str], labels: Sequence[str] = DOC_TYPES, *, l2: float = L2,
+            epochs: int = EPOCHS, learning_rate: float = LEARNING_RATE) -> "DocClassifier":
+        """Train multinomial logistic regression with L2 by full-batch gradient descent."""
+        labels = [label for label in labels if label in set(y)]
+        mean = X.mean(axis=0)
+        std = X.std(axis=0) + 1e-6
+        Z = (X - mean) / std
+        n, d = Z.shape
+        targets = np.zeros((n, len(labels)))
+        targets[np.arange(n), [labels.index(label) for label in y]] = 1.0
+        W = np.zeros((d, len(labels)))
+        b = np.zeros(len(labels))
+        for _ in range(epochs):
+            grad = (_softmax(Z @ W + b) - targets) / n
+            W -= learning_rate * (Z.T @ grad + l2 * W / n)
+            b -= learning_rate * grad.sum(axis=0)
+        return cls(W.astype(np.float32), b.astype(np.float32), mean.astype(np.float32), std.astype(np.float32),
+                   labels)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> "DocClassifier":
+        with np.load(path) as data:
+            return cls(data["weights"], data["bias"], data["mean"], data["std"], [str(x) for x in data["labels"]])
+
+    def save(self, path: str = DEFAULT_MODEL_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, weights=self.weights, bias=self.bias, mean=self.mean, std=self.std,
+                 labels=np.array(self.labels))
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return _softmax(((np.atleast_2d(X) - self.mean) / self.std) @ self.weights + self.bias)
+
+    def predict(self, image: np.ndarray) -> Prediction:
+        proba = self.predict_proba(features(image))[0]
+        best = int(proba.argmax())
+        return Prediction(self.labels[best], round(float(proba[best]), 3))
+
+
+def load_training_set(root: str) -> Tuple[np.ndarray, List[str], List[str]]:
+    """Features, doc types and paths for every image under root/<category>/ with a known category."""
+    rows, labels, paths = [], [], []
+    for category, doc_type in sorted(CATEGORY_DOC_TYPES.items()):
+        folder = os.path.join(root, category)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                continue
+            rows.append(features(image))
+            labels.append(doc_type)
+            paths.append(path)
+    if not rows:
+        raise ValueError(f"No labelled images found under {root}")
+    return np.stack(rows), labels, paths
+
+
+def leave_one_out(X: np.ndarray, y: Sequence[str]) -> List[Prediction]:
+    """Held-out prediction for every sample, each from a DocClassifier.fit on all the others."""
+    predictions = []
+    for i in range(len(y)):
+        keep = np.arange(len(y)) != i
+        model = DocClassifier.fit(X[keep], [label for j, label in enumerate(y) if j != i])
+        proba = model.predict_proba(X[i])[0]
+        best = int(proba.argmax())
+        predictions.append(Prediction(model.labels[best], round(float(proba[best]), 3)))
+    return predictions
+
+
+def leave_one_out_accuracy(X: np.ndarray, y: Sequence[str]) -> float:
+    """Leave-one-out accuracy of DocClassifier.fit on (X, y)."""
+    predictions = leave_one_out(X, y)
+    return sum(p.doc_type == label for p, label in zip(predictions, y)) / float(len(y))
+
+
+_CLASSIFIER: Optional[DocClassifier] = None
+_LOADED = False
+_LOCK = threading.Lock()
+
+
+def get_classifier(path: str = DEFAULT_MODEL_PATH) -> Optional[DocClassifier]:
+    """The trained classifier, loaded on first use (None if no model has been trained)."""
+    global _CLASSIFIER, _LOADED
+    if not _LOADED:
+        with _LOCK:
+            if not _LOADED:
+                try:
+                    _CLASSIFIER = DocClassifier.load(path)
+                except (OSError, KeyError, ValueError) as e:
+                    logger.warning(f"Document classifier unavailable ({e}); using heuristics")
+                _LOADED = True
+    return _CLASSIFIER
+
+
+@lru_cache(maxsize=None)
+def model_version(path: str = DEFAULT_MODEL_PATH) -> Optional[str]:
+    """Short hash of the model file, for cache keys (None if there is no model)."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except OSError:
+        return None
+
+
+def classify(image: np.ndarray, min_confidence: float = MIN_CONFIDENCE) -> Optional[Prediction]:
+    """Predict the document type of a page.
+
+    Returns None when no classifier is available or the prediction is less confident than min_confidence.
+    """
+    classifier = get_classifier()
+    if classifier is None:
+        return None
+    try:
+        prediction = classifier.predict(image)
+    except Exception as e:
+        logger.warning(f"Document classification failed: {e}")
+        return None
+    if prediction.confidence < min_confidence:
+        return None
+    logger.info(f"🗂️ Classified as {prediction.doc_type} ({prediction.confidence:.2f})")
+    return prediction
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the document-type classifier from labelled folders")
+    parser.add_argument("root", help="Directory with one subfolder per category (e.g. data/input_images)")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH, help="Model file (default: %(default)s)")
+    parser.add_argument("--report", default=DEFAULT_REPORT_PATH,
+                        help="Leave-one-out evaluation JSON (default: %(default)s)")
+    args = parser.parse_args()
+
+    X, y, paths = load_training_set(args.root)
+    counts = {label: y.count(label) for label in DOC_TYPES if label in y}
+    print(f"Training on {len(y)} images: {counts}")
+    held_out = leave_one_out(X, y)
+    accuracy = sum(p.doc_type == label for p, label in zip(held_out, y)) / float(len(y))
+    gated = [(p, label) for p, label in zip(held_out, y) if p.confidence >= MIN_CONFIDENCE]
+    gated_accuracy = sum(p.doc_type == label for p, label in gated) / float(len(gated)) if gated else 0.0
+    model = DocClassifier.fit(X, y)
+    model.save(args.output)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump({
+            "model": os.path.basename(args.output),
+            "model_version": model_version(args.output),
+            "training_images": len(y),
+            "counts": counts,
+            "leave_one_out_accuracy": round(accuracy, 3),
+            "min_confidence": MIN_CONFIDENCE,
+            "coverage_at_min_confidence": round(len(gated) / float(len(y)), 3),
+            "accuracy_at_min_confidence": round(gated_accuracy, 3),
+            "held_out": [{"path": os.path.relpath(path, args.root).replace(os.sep, "/"), "label": label,
+                          "predicted": p.doc_type, "confidence": p.confidence}
+                         for path, label, p in zip(paths, y, held_out)],
+        }, f, indent=2)
+
+    pages = [cv2.imread(path, cv2.IMREAD_GRAYSCALE) for path in paths]
+    start = time.perf_counter()
+    for page in pages:
+        model.predict(page)
+    per_image = 1000 * (time.perf_counter() - start) / len(pages)
+    print(f"Leave-one-out accuracy: {accuracy:.1%} ({gated_accuracy:.1%} on the {len(gated)} held-out predictions "
+          f"at confidence >= {MIN_CONFIDENCE}); features + predict: {per_image:.1f} ms/image")
+    print(f"Saved {args.output} and {args.report}")
+    sys.exit(0)
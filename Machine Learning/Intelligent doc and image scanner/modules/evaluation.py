@@ -4,38 +4,180 @@ This module provides:
 - Word Error Rate (WER) calculation
 - Character Error Rate (CER) calculation
 - Text normalization and comparison utilities
+- Edit-operation breakdowns (substitutions / insertions / deletions)
+- Vectorized batch scoring for many (reference, hypothesis) pairs
+
+Distances are computed with rapidfuzz's bit-parallel Levenshtein
+implementation when available, falling back to a pure-Python bit-parallel
+(Myers/Hyyrö) engine. Word sequences are mapped to one character per
+distinct word so both engines compare them as strings.
 """
 
 import logging
 logger = logging.getLogger("IDIS")
-from typing import Tuple
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+try:
+    from rapidfuzz.distance import Levenshtein as _RFLevenshtein
+    from rapidfuzz import process as _rf_process
+    _HAS_RAPIDFUZZ = True
+except ImportError:
+    _HAS_RAPIDFUZZ = False
+
+Seq = Union[str, Sequence]
+
 
+def _encode_words(*seqs: Sequence) -> List[str]:
+    """Map sequences of hashable tokens to strings with one code point per distinct token."""
+    vocab: Dict = {}
+    out = []
+    for seq in seqs:
+        chars = []
+        for tok in seq:
+            code = vocab.get(tok)
+            if code is None:
+                idx = len(vocab)
+                # Skip the UTF-16 surrogate block so every code point is a valid str character
+                code = vocab[tok] = chr(idx if idx < 0xD800 else idx + 0x800)
+            chars.append(code)
+        out.append("".join(chars))
+    return out
 
-def edit_distance(a: list, b: list) -> int:
-    """Compute Levenshtein edit distance between sequences a and b."""
-    na = len(a)
-    nb = len(b)
-    if na == 0:
-        return nb
-    if nb == 0:
-        return na
 
-    prev = list(range(nb + 1))
+def _as_strings(a: Seq, b: Seq) -> Tuple[str, str]:
+    if isinstance(a, str) and isinstance(b, str):
+        return a, b
+    if all(isinstance(x, str) and len(x) == 1 for x in a) and all(isinstance(x, str) and len(x) == 1 for x in b):
+        return "".join(a), "".join(b)
+    ea, eb = _encode_words(a, b)
+    return ea, eb
+
+
+def _myers_distance(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """Bit-parallel Levenshtein distance (Hyyrö's variant of Myers' algorithm).
+
+    Processes one column of the DP matrix per character of b using Python
+    integers as bit-vectors over a. With max_distance, returns
+    max_distance + 1 as soon as the bound can no longer be met.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    m, n = len(a), len(b)
+    if n == 0:
+        return m if max_distance is None else min(m, max_distance + 1)
+    peq: Dict[str, int] = {}
+    for i, c in enumerate(a):
+        peq[c] = peq.get(c, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    for j, c in enumerate(b):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+        # Score can drop by at most one per remaining column (Ukkonen cut-off)
+        if max_distance is not None and score - (n - j - 1) > max_distance:
+            return max_distance + 1
+    return score if max_distance is None else min(score, max_distance + 1)
+
+
+def edit_distance(a: Seq, b: Seq, max_distance: Optional[int] = None) -> int:
+    """Compute Levenshtein edit distance between sequences a and b.
+
+    a and b may be strings or sequences of hashable tokens (e.g. word lists).
+    If max_distance is given, any distance above it is reported as
+    max_distance + 1, which lets the engine stop early.
+    """
+    if max_distance is not None and abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    sa, sb = _as_strings(a, b)
+    if _HAS_RAPIDFUZZ:
+        return int(_RFLevenshtein.distance(sa, sb, score_cutoff=max_distance))
+    return _myers_distance(sa, sb, max_distance)
+
+
+def _dp_editops(a: str, b: str) -> List[Tuple[str, int, int]]:
+    """Full-matrix fallback alignment; returns (tag, index_in_a, index_in_b) edits."""
+    na, nb = len(a), len(b)
+    dp = [list(range(nb + 1))]
     for i in range(1, na + 1):
+        prev = dp[-1]
         cur = [i] + [0] * nb
         for j in range(1, nb + 1):
             cost = 0 if a[i - 1] == b[j - 1] else 1
-            cur[j] = min(prev[j] + 1,      # deletion
-                         cur[j - 1] + 1,   # insertion
-                         prev[j - 1] + cost)  # substitution
-        prev = cur
-    return prev[nb]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+        dp.append(cur)
+    ops = []
+    i, j = na, nb
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and dp[i][j] == dp[i - 1][j - 1] + (a[i - 1] != b[j - 1]):
+            if a[i - 1] != b[j - 1]:
+                ops.append(("replace", i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif i > 0 and dp[i][j] == dp[i - 1][j] + 1:
+            ops.append(("delete", i - 1, j))
+            i -= 1
+        else:
+            ops.append(("insert", i, j - 1))
+            j -= 1
+    return ops[::-1]
+
+
+def edit_ops(ref: Seq, hyp: Seq) -> List[Tuple[str, int, int]]:
+    """Return a minimal alignment as (tag, ref_index, hyp_index) tuples.
+
+    Tags are "replace" (substitution), "delete" (ref token missing from hyp)
+    and "insert" (extra token in hyp).
+    """
+    sa, sb = _as_strings(ref, hyp)
+    if _HAS_RAPIDFUZZ:
+        return [tuple(op) for op in _RFLevenshtein.editops(sa, sb).as_list()]
+    return _dp_editops(sa, sb)
+
+
+def error_breakdown(ref: str, hyp: str, words: bool = False) -> Dict[str, float]:
+    """Count substitutions, insertions and deletions between ref and hyp.
+
+    Works on characters by default, or on whitespace-split words with words=True.
+    Returns counts plus the reference length and the overall error rate.
+    """
+    ref = ref or ""
+    hyp = hyp or ""
+    a = ref.split() if words else ref
+    b = hyp.split() if words else hyp
+    counts = {"substitutions": 0, "insertions": 0, "deletions": 0}
+    for tag, _, _ in edit_ops(a, b):
+        if tag == "replace":
+            counts["substitutions"] += 1
+        elif tag == "insert":
+            counts["insertions"] += 1
+        elif tag == "delete":
+            counts["deletions"] += 1
+    edits = sum(counts.values())
+    return {
+        **counts,
+        "ref_length": len(a),
+        "error_rate": (edits / len(a)) if a else (0.0 if not b else 1.0),
+    }
 
 
 def cer(ref: str, hyp: str) -> float:
     """Character Error Rate: edits / len(ref_chars). Returns float in [0,1]."""
-    ref_chars = list(ref) if ref is not None else []
-    hyp_chars = list(hyp) if hyp is not None else []
+    ref_chars = ref if ref is not None else ""
+    hyp_chars = hyp if hyp is not None else ""
     if len(ref_chars) == 0:
         return 0.0 if len(hyp_chars) == 0 else 1.0
     edits = edit_distance(ref_chars, hyp_chars)
@@ -52,6 +194,42 @@ def wer(ref: str, hyp: str) -> float:
     return edits / len(ref_words)
 
 
+def batch_edit_distance(refs: Sequence[Seq], hyps: Sequence[Seq], *, workers: int = 1) -> np.ndarray:
+    """Pairwise edit distances for aligned (refs[i], hyps[i]) pairs as an int array.
+
+    Uses rapidfuzz's multi-threaded pairwise scorer when available (workers=-1 for all cores).
+    """
+    if len(refs) != len(hyps):
+        raise ValueError("refs and hyps must have the same length")
+    pairs = [_as_strings(r, h) for r, h in zip(refs, hyps)]
+    if _HAS_RAPIDFUZZ and hasattr(_rf_process, "cpdist") and pairs:
+        return np.asarray(_rf_process.cpdist([p[0] for p in pairs], [p[1] for p in pairs],
+                                             scorer=_RFLevenshtein.distance, workers=workers), dtype=np.int64)
+    return np.fromiter((edit_distance(a, b) for a, b in pairs), dtype=np.int64, count=len(pairs))
+
+
+def _batch_rates(refs: Sequence[Seq], hyps: Sequence[Seq], workers: int) -> np.ndarray:
+    dist = batch_edit_distance(refs, hyps, workers=workers).astype(np.float64)
+    ref_len = np.fromiter((len(r) for r in refs), dtype=np.float64, count=len(refs))
+    hyp_len = np.fromiter((len(h) for h in hyps), dtype=np.float64, count=len(hyps))
+    # Same convention as cer()/wer(): empty reference scores 0 if hyp is empty, else 1
+    empty = np.where(hyp_len == 0, 0.0, 1.0)
+    return np.where(ref_len > 0, dist / np.maximum(ref_len, 1.0), empty)
+
+
+def batch_cer(refs: Sequence[str], hyps: Sequence[str], *, workers: int = 1) -> np.ndarray:
+    """CER for each aligned (ref, hyp) pair as a float array."""
+    return _batch_rates([r or "" for r in refs], [h or "" for h in hyps], workers)
+
+
+def batch_wer(refs: Sequence[str], hyps: Sequence[str], *, workers: int = 1) -> np.ndarray:
+    """WER for each aligned (ref, hyp) pair as a float array."""
+    ref_words = [(r or "").split() for r in refs]
+    hyp_words = [(h or "").split() for h in hyps]
+    encoded = [_encode_words(r, h) for r, h in zip(ref_words, hyp_words)]
+    return _batch_rates([e[0] for e in encoded], [e[1] for e in encoded], workers)
+
+
 def evaluate_ocr(true_text: str, predicted_text: str) -> Tuple[float, float]:
     """Return (wer_score, cer_score) for the given reference and hypothesis texts.
 
@@ -0,0 +1,145 @@
+"""Precompiled regex field extraction with pluggable field specs.
+
+All field patterns are compiled once when the extractor is built. When the
+optional ``hyperscan`` package is installed, every pattern goes into one
+multi-pattern database and a document is scanned exactly once; the value is
+then read with an anchored match at the reported start offset. Otherwise each
+field's specs are searched in priority order, stopping at the first hit.
+
+Either way a spec reports its leftmost match, exactly as ``re.search`` would,
+and when a field has several specs the first one declared wins.
+
+Usage:
+    extractor = FieldExtractor(DEFAULT_FIELD_SPECS)
+    extractor.add(EXTRA_FIELD_SPECS["gstin"], FieldSpec("po_number", r'p\\.?o\\.?\\s*#?\\s*(\\d{4,})'))
+    fields = extractor.extract(text)
+"""
+import re
+import logging
+from collections import namedtuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("IDIS")
+
+# Optional multi-pattern engine
+try:
+    import hyperscan
+    _HYPERSCAN_AVAILABLE = True
+except ImportError:
+    _HYPERSCAN_AVAILABLE = False
+
+# name: output field; pattern: regex whose first group (or whole match) is the value;
+# flags: re flags; value: constant to return instead of the matched text
+FieldSpec = namedtuple("FieldSpec", ["name", "pattern", "flags", "value"], defaults=(re.I, None))
+
+# Receipt / ID fields extracted by text_cleaning.extract_fields (order = priority)
+DEFAULT_FIELD_SPECS: List[FieldSpec] = [
+    FieldSpec("id_number", r'(?:id|number|no)[\s.:#-]*([A-Z0-9]{4,})'),
+    FieldSpec("total_amount", r'(?:total|amount|sum|price)\s*[:\-]?\s*[\$£€]?\s*(\d+[.,]?\d*)'),
+    FieldSpec("date", r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'),  # DD/MM/YYYY
+    FieldSpec("date", r'(\d{4}[/-]\d{1,2}[/-]\d{1,2})'),     # YYYY/MM/DD
+    FieldSpec("date", r'(\d{1,2}(?:st|nd|rd|th)?\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.?\s+\d{4})'),  # 1st January 2025
+]
+
+# Ready-made specs for Indian tax documents and invoices; not enabled by default
+EXTRA_FIELD_SPECS: Dict[str, FieldSpec] = {
+    "gstin": FieldSpec("gstin", r'\b(\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z])\b', 0),
+    "pan": FieldSpec("pan", r'\b([A-Z]{5}\d{4}[A-Z])\b', 0),
+    # The value must contain a digit (no lookahead, which Hyperscan does not support),
+    # so "Invoice Date 12/03/2024" does not yield "Date"
+    "invoice_number": FieldSpec("invoice_number",
+                                r'invoice\s*(?:no|number|#)?[\s.:#-]*([A-Z0-9][A-Z0-9/-]*\d[A-Z0-9/-]*)'),
+}
+
+
+class FieldExtractor:
+    """Extract named fields from text using precompiled patterns.
+
+    Args:
+        specs: FieldSpec entries; for a field with several specs, earlier specs take priority
+        use_hyperscan: scan with one Hyperscan database when the package is installed
+    """
+
+    def __init__(self, specs: Iterable[FieldSpec] = (), *, use_hyperscan: bool = True):
+        self.use_hyperscan = use_hyperscan and _HYPERSCAN_AVAILABLE
+        self.specs: Tuple[FieldSpec, ...] = ()
+        self._compiled: Tuple[re.Pattern, ...] = ()
+        self._by_field: List[Tuple[str, List[int]]] = []
+        self._hs_db: Any = None
+        self.add(*specs)
+
+    def add(self, *specs: FieldSpec) -> None:
+        """Register more field specs (appended with lowest priority for their field)."""
+        specs = tuple(FieldSpec(*s) for s in specs)
+        compiled = tuple(re.compile(s.pattern, s.flags) for s in specs)
+        self.specs = self.specs + specs
+        self._compiled = self._compiled + compiled
+        order: Dict[str, List[int]] = {}
+        for i, spec in enumerate(self.specs):
+            order.setdefault(spec.name, []).append(i)
+        self._by_field = list(order.items())
+        self._hs_db = self._build_hyperscan() if self.use_hyperscan else None
+
+    @property
+    def fields(self) -> List[str]:
+        """Field names in first-declared order."""
+        return [name for name, _ in self._by_field]
+
+    def _build_hyperscan(self) -> Any:
+        if not self.specs:
+            return None
+        flag_map = ((re.I, hyperscan.HS_FLAG_CASELESS), (re.M, hyperscan.HS_FLAG_MULTILINE),
+                    (re.S, hyperscan.HS_FLAG_DOTALL))
+        try:
+            db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+            db.compile(
+                expressions=[s.pattern.encode("utf-8") for s in self.specs],
+                ids=list(range(len(self.specs))),
+                elements=len(self.specs),
+                flags=[hyperscan.HS_FLAG_SOM_LEFTMOST | hyperscan.HS_FLAG_UTF8
+                       | sum(hs for py, hs in flag_map if s.flags & py) for s in self.specs],
+            )
+            return db
+        except Exception as e:
+            logger.warning(f"Hyperscan could not compile field specs, using re: {e}")
+            return None
+
+    def _value(self, i: int, match: re.Match) -> str:
+        spec = self.specs[i]
+        if spec.value is not None:
+            return spec.value
+        return (match.group(1) if match.re.groups else match.group(0)).strip()
+
+    def extract(self, text: str) -> Dict[str, str]:
+        """Return {field: value} for every field found in text, in field declaration order."""
+        if not text or not self.specs:
+            return {}
+        # Hyperscan offsets are bytes; they equal str indices only for ASCII text
+        if self._hs_db is not None and text.isascii():
+            return self._extract_hyperscan(text)
+        fields: Dict[str, str] = {}
+        for name, indices in self._by_field:
+            for i in indices:
+                match = self._compiled[i].search(text)
+                if match:
+                    fields[name] = self._value(i, match)
+                    break
+        return fields
+
+    def _extract_hyperscan(self, text: str) -> Dict[str, str]:
+        starts: Dict[int, int] = {}
+
+        def on_match(spec_id: int, start: int, end: int, flags: int, context: Optional[Any]) -> None:
+            if start < starts.get(spec_id, len(text) + 1):
+                starts[spec_id] = start
+
+        self._hs_db.scan(text.encode("ascii"), match_event_handler=on_match)
+        fields: Dict[str, str] = {}
+        for name, indices in self._by_field:
+            for i in indices:
+                if i in starts:
+                    match = self._compiled[i].match(text, starts[i])
+                    if match:
+                        fields[name] = self._value(i, match)
+                        break
+        return fields
@@ -0,0 +1,137 @@
+"""Precomputed fuzzy-match index for normalizing names against a catalogue.
+
+Choices are preprocessed once and indexed by character trigrams. A lookup
+counts shared trigrams with one ``np.bincount`` over the posting lists, keeps
+the best ``candidate_limit`` choices and only scores those with rapidfuzz.
+Small catalogues (up to ``candidate_limit`` entries) skip the prefilter and
+are scored exhaustively. Choices and queries go through ``processor``
+(``utils.default_process`` by default: lower-cased, punctuation stripped), so
+results match ``process.extractOne(query, choices, scorer=scorer,
+processor=processor)``, not a bare ``process.extractOne``, which compares
+raw strings.
+
+Usage:
+    index = FuzzyIndex(["Computer Science and Engineering", "Civil Engineering", ...])
+    choice, score = index.match("Computr Science Engg")
+    matches = index.match_many(texts, score_cutoff=70)
+"""
+import os
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+
+logger = logging.getLogger("IDIS")
+
+NGRAM = 3
+CANDIDATE_LIMIT = 200
+
+
+def _ngrams(text: str, n: int = NGRAM) -> List[str]:
+    padded = f" {text} "
+    if len(padded) < n:
+        return [padded]
+    return list({padded[i:i + n] for i in range(len(padded) - n + 1)})
+
+
+class FuzzyIndex:
+    """Fuzzy string index over a fixed list of canonical choices.
+
+    Args:
+        choices: canonical strings (duplicates are dropped, order kept)
+        scorer: rapidfuzz scorer (default WRatio, as used by extractOne)
+        processor: applied once to choices and to each query (None to compare raw strings)
+        candidate_limit: choices kept by the trigram prefilter per query
+        score_cutoff: default minimum score (0-100) for a match
+    """
+
+    def __init__(self, choices: Iterable[str], *, scorer: Callable = fuzz.WRatio,
+                 processor: Optional[Callable[[str], str]] = utils.default_process,
+                 candidate_limit: int = CANDIDATE_LIMIT, score_cutoff: float = 0.0):
+        self.choices: List[str] = list(dict.fromkeys(c for c in choices if c))
+        self.scorer = scorer
+        self.processor = processor
+        self.candidate_limit = candidate_limit
+        self.score_cutoff = score_cutoff
+        self._processed = [processor(c) if processor else c for c in self.choices]
+
+        postings: Dict[str, List[int]] = {}
+        for i, text in enumerate(self._processed):
+            for gram in _ngrams(text):
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.choices)
+
+    @classmethod
+    def from_file(cls, path: str, extra: Iterable[str] = (), **kwargs) -> "FuzzyIndex":
+        """Build an index from a one-entry-per-line catalogue file plus extra entries."""
+        with open(path, encoding="utf-8") as f:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        return cls(list(extra) + entries, **kwargs)
+
+    def _prepare(self, text: str) -> str:
+        return self.processor(text) if self.processor else text
+
+    def candidates(self, query: str) -> np.ndarray:
+        """Indices of the choices sharing the most trigrams with an already processed query."""
+        if len(self.choices) <= self.candidate_limit:
+            return np.arange(len(self.choices))
+        lists = [self._postings[g] for g in _ngrams(query) if g in self._postings]
+        if not lists:
+            return np.empty(0, dtype=np.int64)
+        counts = np.bincount(np.concatenate(lists), minlength=len(self.choices))
+        hits = np.flatnonzero(counts)
+        if len(hits) <= self.candidate_limit:
+            return hits
+        top = np.argpartition(counts[hits], -self.candidate_limit)[-self.candidate_limit:]
+        return hits[top]
+
+    def match(self, text: str, score_cutoff: Optional[float] = None) -> Tuple[str, float]:
+        """Return (best choice, score 0-100), or ("", 0.0) if nothing reaches score_cutoff."""
+        if not text or not self.choices:
+            return "", 0.0
+        query = self._prepare(text)
+        cand = self.candidates(query)
+        if not len(cand):
+            return "", 0.0
+        cutoff = self.score_cutoff if score_cutoff is None else score_cutoff
+        res = process.extractOne(query, [self._processed[i] for i in cand], scorer=self.scorer,
+                                 processor=None, score_cutoff=cutoff or None)
+        if not res or not res[1]:
+            return "", 0.0
+        return self.choices[cand[res[2]]], float(res[1])
+
+    def match_many(self, texts: Sequence[str], score_cutoff: Optional[float] = None,
+                   workers: int = -1) -> List[Tuple[str, float]]:
+        """Match many texts at once; returns one (choice, score) per text, in order.
+
+        Small catalogues are scored with one multi-threaded rapidfuzz cdist;
+        larger ones go through the per-query trigram prefilter, which is far
+        cheaper than scoring every query against every choice.
+        """
+        if not texts or not self.choices:
+            return [("", 0.0) for _ in texts]
+        if len(self.choices) > self.candidate_limit:
+            return [self.match(t, score_cutoff) for t in texts]
+        cutoff = self.score_cutoff if score_cutoff is None else score_cutoff
+        queries = [self._prepare(t or "") for t in texts]
+        scores = process.cdist(queries, self._processed, scorer=self.scorer, processor=None,
+                               score_cutoff=cutoff or None, workers=workers)
+        best = scores.argmax(axis=1)
+        out = []
+        for row, (text, j) in enumerate(zip(texts, best)):
+            score = float(scores[row, j])
+            out.append((self.choices[j], score) if text and score and score >= cutoff else ("", 0.0))
+        return out
+
+
+def load_catalogue(path: Optional[str], extra: Iterable[str] = (), **kwargs) -> FuzzyIndex:
+    """Index extra entries plus the catalogue file at path, if it exists."""
+    if path and os.path.exists(path):
+        index = FuzzyIndex.from_file(path, extra, **kwargs)
+        logger.info(f"Loaded {len(index)} catalogue entries from {path}")
+        return index
+    return FuzzyIndex(extra, **kwargs)
@@ -0,0 +1,215 @@
+"""Image ingestion: memory-mapped reads, grayscale decode and page streaming.
+
+Files are memory-mapped instead of read into Python bytes, decoded straight to
+grayscale (every OCR engine works on a single channel), and pages are brought
+to the resolution chosen by the resolution policy (resolution.py) while they
+are decoded: JPEGs are decoded at 1/2, 1/4 or 1/8 scale by the decoder itself
+(cv2.IMREAD_REDUCED_*, which skips DCT work instead of resizing afterwards).
+Multi-page TIFFs and PDFs are yielded one page at a time, so only one page is
+ever held in memory.
+
+Usage:
+    data = read_buffer("scan.tif")            # read-only np.memmap, no copy
+    for page in iter_pages(data):
+        ocr(page.image)                       # uint8 grayscale, page.index of page.count
+"""
+import io
+import logging
+from collections import namedtuple
+from typing import Iterator, Optional, Union
+
+import cv2
+import numpy as np
+
+from .resolution import (SCALE_TOLERANCE, TARGET_TEXT_HEIGHT, THUMB_SIDE, estimate_text_height, normalize_resolution,
+                         resize_to_scale, target_scale, thumbnail)
+
+logger = logging.getLogger("IDIS")
+
+Buffer = Union[bytes, bytearray, memoryview, np.ndarray]
+
+# One decoded page of a document
+Page = namedtuple("Page", ["image", "index", "count"])
+
+# Pixel budget for pages whose text height cannot be estimated
+# (a 600-dpi A4 scan is ~35 MP; 300 dpi, which OCR engines are tuned for, is ~9 MP)
+MAX_DECODE_PIXELS = 16_000_000
+PDF_DPI = 300
+
+_REDUCED_FLAGS = {
+    (True, 2): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    (True, 4): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    (True, 8): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    (False, 2): cv2.IMREAD_REDUCED_COLOR_2,
+    (False, 4): cv2.IMREAD_REDUCED_COLOR_4,
+    (False, 8): cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def read_buffer(path: str) -> np.ndarray:
+    """Memory-map a file read-only; pages are faulted in by the OS as the decoder reads them."""
+    try:
+        return np.memmap(path, dtype=np.uint8, mode="r")
+    except ValueError:
+        # mmap cannot map empty files
+        return np.empty(0, dtype=np.uint8)
+
+
+def ingest_params(grayscale: bool = True, max_pixels: int = MAX_DECODE_PIXELS, pdf_dpi: int = PDF_DPI,
+                  target_text_height: float = TARGET_TEXT_HEIGHT, max_side: Optional[int] = None) -> dict:
+    """Parameters that affect the decoded pages, for building cache keys."""
+    return {"grayscale": grayscale, "max_pixels": max_pixels, "pdf_dpi": pdf_dpi,
+            "target_text_height": target_text_height, "max_side": max_side}
+
+
+def _kind(data: Buffer) -> str:
+    head = bytes(data[:5])
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    if head[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    return "image"
+
+
+def _open(data: Buffer):
+    """File object over data: the mapped file itself for memmaps, otherwise an in-memory view."""
+    filename = getattr(data, "filename", None)
+    return open(filename, "rb") if filename else io.BytesIO(data)
+
+
+def _reduction(scale: float) -> int:
+    """Largest decoder reduction (1, 2, 4 or 8) that does not go (much) below scale."""
+    factor = 1
+    while factor < 8 and scale * factor * 2 <= 1.0 + SCALE_TOLERANCE:
+        factor *= 2
+    return factor
+
+
+def _image_size(data: Buffer) -> Optional[tuple]:
+    """(width, height) from the image header without decoding pixels."""
+    try:
+        from PIL import Image
+        with _open(data) as f, Image.open(f) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def decode_image(data: Buffer, *, grayscale: bool = True, max_pixels: int = MAX_DECODE_PIXELS,
+                 target_text_height: float = TARGET_TEXT_HEIGHT, max_side: Optional[int] = None) -> np.ndarray:
+    """Decode a single-page encoded image at the resolution the OCR engines need.
+
+    The glyph height is estimated on a thumbnail (for large JPEGs, a 1/8-scale
+    decode) and the page is decoded, or downscaled, so that glyphs are about
+    target_text_height pixels tall. Pages are never upscaled here.
+
+    Args:
+        data: encoded image bytes (or a memmap)
+        grayscale: decode to single-channel uint8 (BGR otherwise)
+        max_pixels: pixel budget when no text height can be estimated (0 disables)
+        target_text_height: glyph height to scale down to (0 disables the text policy)
+        max_side: hard cap on the long side
+
+    Raises:
+        ValueError: data is not a decodable image
+    """
+    buf = data if isinstance(data, np.ndarray) else np.frombuffer(data, np.uint8)
+    color_flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    size = _image_size(data)
+    if size is None or _kind(data) != "jpeg" or max(size) < 2 * THUMB_SIDE:
+        img = cv2.imdecode(buf, color_flag)
+        if img is None:
+            raise ValueError("Could not decode image")
+        return normalize_resolution(img, target_text_height=target_text_height, max_pixels=max_pixels,
+                                    max_side=max_side)
+
+    # Large JPEG: estimate on a reduced decode, then let the decoder do most of the downscaling
+    width, height = size
+    thumb_factor = _reduction(THUMB_SIDE / float(max(width, height)))
+    thumb = cv2.imdecode(buf, _REDUCED_FLAGS[(True, thumb_factor)])
+    if thumb is None:
+        raise ValueError("Could not decode image")
+    thumb, thumb_scale = thumbnail(thumb)
+    thumb_scale /= thumb_factor
+    text_height = estimate_text_height(thumb) if target_text_height else None
+    if text_height:
+        text_height /= thumb_scale
+    scale = target_scale(text_height, width, height, target_text_height=target_text_height,
+                         max_pixels=max_pixels, max_side=max_side)
+    factor = _reduction(scale)
+    img = cv2.imdecode(buf, _REDUCED_FLAGS[(grayscale, factor)] if factor > 1 else color_flag)
+    if img is None:
+        raise ValueError("Could not decode image")
+    if factor > 1:
+        logger.info(f"📉 Decoding {width}x{height} JPEG at 1/{factor} resolution")
+    return resize_to_scale(img, scale * factor, text_height / factor if text_height else None)
+
+
+def _from_pil(img, grayscale: bool, policy: dict) -> np.ndarray:
+    """Convert a PIL page to a uint8 array at the policy resolution."""
+    arr = np.asarray(img.convert("L" if grayscale else "RGB"))
+    if not grayscale:
+        arr = cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
+    return normalize_resolution(arr, **policy)
+
+
+def _tiff_pages(data: Buffer, grayscale: bool, policy: dict) -> Iterator[Page]:
+    from PIL import Image
+    with _open(data) as f, Image.open(f) as tiff:
+        count = getattr(tiff, "n_frames", 1)
+        if count == 1:
+            yield Page(decode_image(data, grayscale=grayscale, **policy), 0, 1)
+            return
+        for index in range(count):
+            tiff.seek(index)
+            yield Page(_from_pil(tiff, grayscale, policy), index, count)
+
+
+def _pdf_pages(data: Buffer, grayscale: bool, policy: dict, dpi: int) -> Iterator[Page]:
+    try:
+        from pdf2image import convert_from_bytes, convert_from_path, pdfinfo_from_bytes, pdfinfo_from_path
+    except ImportError as e:
+        raise ValueError("PDF input requires pdf2image (and poppler)") from e
+
+    filename = getattr(data, "filename", None)
+    if filename:
+        count = int(pdfinfo_from_path(filename)["Pages"])
+        render = lambda **kw: convert_from_path(filename, **kw)  # noqa: E731
+    else:
+        raw = bytes(data)
+        count = int(pdfinfo_from_bytes(raw)["Pages"])
+        render = lambda **kw: convert_from_bytes(raw, **kw)  # noqa: E731
+    for index in range(count):
+        # Rendered one page at a time so a long PDF never sits in memory as a list of bitmaps
+        page = render(dpi=dpi, first_page=index + 1, last_page=index + 1, grayscale=grayscale)[0]
+        yield Page(_from_pil(page, grayscale, policy), index, count)
+
+
+def iter_pages(data: Buffer, *, grayscale: bool = True, max_pixels: int = MAX_DECODE_PIXELS,
+               pdf_dpi: int = PDF_DPI, target_text_height: float = TARGET_TEXT_HEIGHT,
+               max_side: Optional[int] = None) -> Iterator[Page]:
+    """Yield the pages of an encoded image, multi-page TIFF or PDF one at a time.
+
+    Args:
+        data: encoded file contents (bytes, or the memmap from read_buffer)
+        grayscale: decode to single-channel uint8 (BGR otherwise)
+        max_pixels: pixel budget for pages whose text height cannot be estimated (0 disables)
+        pdf_dpi: PDF rendering resolution
+        target_text_height: pages are scaled down so glyphs are about this tall (0 disables)
+        max_side: hard cap on the long side
+
+    Raises:
+        ValueError: the data cannot be decoded
+    """
+    if not len(data):
+        raise ValueError("Empty file")
+    policy = {"max_pixels": max_pixels, "target_text_height": target_text_height, "max_side": max_side}
+    kind = _kind(data)
+    if kind == "pdf":
+        yield from _pdf_pages(data, grayscale, policy, pdf_dpi)
+    elif kind == "tiff":
+        yield from _tiff_pages(data, grayscale, policy)
+    else:
+        yield Page(decode_image(data, grayscale=grayscale, **policy), 0, 1)
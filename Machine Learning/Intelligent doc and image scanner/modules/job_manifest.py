@@ -0,0 +1,135 @@
+"""Checkpointed job manifest for resumable batch runs.
+
+Every discovered file gets a row with its status (pending/done/failed),
+attempt count, last duration and error. A restarted batch reads the manifest
+to skip completed files and, optionally, retry failed ones. Storage is a
+single SQLite file in WAL mode, like the OCR cache.
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("IDIS")
+
+DEFAULT_MANIFEST_PATH = "results/job_manifest.db"
+DEFAULT_MAX_ATTEMPTS = 3
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class JobManifest:
+    """SQLite-backed record of which batch items finished, failed or are still pending.
+
+    Args:
+        path: SQLite database file
+
+    Completed items are buffered by mark_done() and only written by flush(),
+    so callers can tie the checkpoint to their own export flushes and never
+    mark a file done before its results are persisted.
+    """
+
+    def __init__(self, path: str = DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done: List[Tuple[int, float, float, str]] = []
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                path TEXT PRIMARY KEY,
+                category TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                duration REAL,
+                error TEXT,
+                updated REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+        self._conn.commit()
+
+    def reset(self) -> None:
+        """Forget all previous jobs (start a fresh run)."""
+        with self._lock:
+            self._done.clear()
+            self._conn.execute("DELETE FROM jobs")
+            self._conn.commit()
+
+    def add(self, items: Sequence[Tuple[str, str]]) -> int:
+        """Register (filepath, category) items as pending; known items keep their status.
+
+        Returns the number of newly added items.
+        """
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (path, category, status, attempts, updated) VALUES (?, ?, ?, 0, ?)",
+                [(path, category, STATUS_PENDING, now) for path, category in items],
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def todo(self, retry_failed: bool = False, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> List[Tuple[str, str]]:
+        """Return (filepath, category) items still to process, in path order.
+
+        Pending items are always included; failed items only with retry_failed
+        and while their attempt count is below max_attempts.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, category FROM jobs WHERE status = ? OR (? AND status = ? AND attempts < ?) ORDER BY path",
+                (STATUS_PENDING, int(retry_failed), STATUS_FAILED, max_attempts),
+            ).fetchall()
+        return [(path, category or "") for path, category in rows]
+
+    def mark_done(self, path: str, attempts: int = 1, duration: Optional[float] = None) -> None:
+        """Buffer a successful item; it is written by the next flush()."""
+        with self._lock:
+            self._done.append((attempts, duration, time.time(), path))
+
+    def mark_failed(self, path: str, error: str, attempts: int = 1, duration: Optional[float] = None) -> None:
+        """Record a failed item immediately."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + ?, duration = ?, error = ?, updated = ? WHERE path = ?",
+                (STATUS_FAILED, attempts, duration, error, time.time(), path),
+            )
+            self._conn.commit()
+
+    def flush(self) -> None:
+        """Write buffered completions in one transaction."""
+        with self._lock:
+            if not self._done:
+                return
+            done, self._done = self._done, []
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'done', attempts = attempts + ?, duration = ?, error = NULL, updated = ? "
+                "WHERE path = ?",
+                done,
+            )
+            self._conn.commit()
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of jobs per status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def log_counts(self) -> None:
+        counts = self.counts()
+        logger.info(f"📋 Job manifest: done={counts.get(STATUS_DONE, 0)} failed={counts.get(STATUS_FAILED, 0)} "
+                    f"pending={counts.get(STATUS_PENDING, 0)}")
+
+    def close(self) -> None:
+        """Close the database; completions not yet flush()ed are discarded."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,77 @@
+"""On-first-use model singletons and an explicit warm-up.
+
+Nothing heavy is imported when the package loads: EasyOCR/torch, spaCy and
+TrOCR are loaded the first time they are needed. Long-running callers (the
+HTTP service, the Streamlit app, the webcam loop) can call warmup() at start
+so the first document does not pay the load cost.
+
+Usage:
+    from modules import warmup
+    warmup(handwriting=True)     # load EasyOCR, spaCy, the spelling dictionary and TrOCR now
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Sequence, Tuple
+
+from .profiling import stage
+
+logger = logging.getLogger("IDIS")
+
+DEFAULT_LANGS = ("en",)
+
+_READERS: Dict[Tuple[str, ...], Any] = {}
+_LOCK = threading.Lock()
+
+
+def get_reader(lang_list: Sequence[str] = DEFAULT_LANGS):
+    """Return the process-wide EasyOCR reader for lang_list, creating it on first use."""
+    key = tuple(lang_list)
+    reader = _READERS.get(key)
+    if reader is None:
+        with _LOCK:
+            reader = _READERS.get(key)
+            if reader is None:
+                import easyocr
+                with stage("easyocr_load"):
+                    reader = _READERS[key] = easyocr.Reader(list(key))
+    return reader
+
+
+def warmup(*, ocr: bool = True, ner: bool = True, spelling: bool = True, handwriting: bool = False,
+           lang_list: Sequence[str] = DEFAULT_LANGS) -> Dict[str, float]:
+    """Load the selected models now instead of on first use.
+
+    Args:
+        ocr: EasyOCR reader for lang_list
+        ner: spaCy NER pipeline used by extract_fields
+        spelling: SymSpell dictionary used by correct_spelling
+        handwriting: TrOCR model (large; only if handwritten documents are expected)
+        lang_list: EasyOCR languages
+
+    Returns:
+        Seconds spent loading each model
+    """
+    timings: Dict[str, float] = {}
+
+    def load(name: str, fn) -> None:
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed: {e}")
+        timings[name] = round(time.perf_counter() - start, 3)
+
+    if ocr:
+        load("easyocr", lambda: get_reader(lang_list))
+    if ner:
+        from .text_cleaning import get_nlp
+        load("spacy", get_nlp)
+    if spelling:
+        from .nlp_postprocess import get_spell_corrector
+        load("spelling", get_spell_corrector)
+    if handwriting:
+        from .ai_ocr import _ensure_trocr_loaded
+        load("trocr", _ensure_trocr_loaded)
+    logger.info(f"🔥 Models warmed up: {timings}")
+    return timings
@@ -7,23 +7,50 @@ recover common OCR errors (e.g. `B.Lech` -> `B.Tech`, `CSE-Of latch` -> `CSE`).
 """
 
 from functools import lru_cache
+import os
 import re
-from textblob import TextBlob
-from rapidfuzz import fuzz, process
+import threading
+from rapidfuzz import fuzz
 from typing import Dict, Tuple, Any
 
+from .profiling import stage
+from .field_extractor import FieldExtractor, FieldSpec
+from .spell_correction import build_spell_corrector, LEXICON_DIR
+from .fuzzy_index import FuzzyIndex, load_catalogue
+
+_SPELLER = None
+_SPELLER_LOCK = threading.Lock()
+
+
+def get_spell_corrector():
+    """Return the shared spelling corrector, building the SymSpell index on first use."""
+    global _SPELLER
+    if _SPELLER is None:
+        with _SPELLER_LOCK:
+            if _SPELLER is None:
+                lexicon = _DEPARTMENTS + _ORG_TYPES + list(_DEGREES.values())
+                _SPELLER = build_spell_corrector(lexicon=lexicon)
+    return _SPELLER
+
+
+def set_spell_corrector(corrector) -> None:
+    """Swap the correction engine (any object with correct(text) -> str, e.g. TextBlobCorrector())."""
+    global _SPELLER
+    with _SPELLER_LOCK:
+        _SPELLER = corrector
+    correct_spelling.cache_clear()
+
 
 @lru_cache(maxsize=1024)
 def correct_spelling(text: str) -> str:
     """Auto-correct spelling mistakes in extracted text (cached).
 
-    Uses TextBlob but caches results to avoid repeated expensive calls.
+    Uses the SymSpell corrector (with the department/degree lexicon) by default.
     """
     if not isinstance(text, str):
         return str(text)
     try:
-        corrected = str(TextBlob(text).correct())
-        return corrected
+        return get_spell_corrector().correct(text)
     except Exception:
         return text
 
@@ -59,28 +86,49 @@ _DEPARTMENTS = [
 
 _ORG_TYPES = ["College", "Institute", "University", "Department", "Office", "Center"]
 
+# Optional larger catalogue of departments/institutions/degrees (one per line), merged with _DEPARTMENTS
+DEPARTMENT_CATALOGUE_PATH = os.path.join(LEXICON_DIR, "departments.txt")
+# Minimum WRatio score (0-100) for a department match; weaker matches are noise
+DEPARTMENT_MATCH_CUTOFF = 70
+_DEPARTMENT_INDEX = None
+
+# Degree, department acronym and org type patterns, compiled once into one scanner
+_ORG_EXTRACTOR = FieldExtractor(
+    [FieldSpec("degree", pat, re.I, canon) for pat, canon in _DEGREES.items()]
+    + [FieldSpec("cse", r'\b(c\W?s\W?e)\b', re.I, "CSE")]
+    + [FieldSpec("org_type", rf'\b{re.escape(t.lower())}\b', re.I, t) for t in _ORG_TYPES]
+)
+
 
 def _regex_find_degree(text: str) -> Tuple[str, float]:
     """Find and normalize degree mentions using regex mapping.
 
     Returns (normalized_degree or empty, score)
     """
-    txt = text.lower()
-    for pat, canon in _DEGREES.items():
-        if re.search(pat, txt):
-            return canon, 1.0
-    return "", 0.0
+    degree = _ORG_EXTRACTOR.extract(text).get("degree", "")
+    return (degree, 1.0) if degree else ("", 0.0)
+
+
+def get_department_index() -> FuzzyIndex:
+    """Return the department fuzzy index, built on first use from _DEPARTMENTS and the catalogue file."""
+    global _DEPARTMENT_INDEX
+    if _DEPARTMENT_INDEX is None:
+        _DEPARTMENT_INDEX = load_catalogue(DEPARTMENT_CATALOGUE_PATH, _DEPARTMENTS)
+    return _DEPARTMENT_INDEX
+
+
+def set_department_catalogue(choices) -> None:
+    """Replace the department catalogue (e.g. thousands of institutions and degree names)."""
+    global _DEPARTMENT_INDEX
+    _DEPARTMENT_INDEX = FuzzyIndex(list(_DEPARTMENTS) + list(choices))
 
 
 def _fuzzy_match_department(text: str) -> Tuple[str, float]:
     """Attempt fuzzy matching of department names from known list."""
     if not text:
         return "", 0.0
-    # Use rapidfuzz to get best match
-    res = process.extractOne(text, _DEPARTMENTS)
-    if not res:
-        return "", 0.0
-    choice, score, _ = res
+    # Trigram-prefiltered rapidfuzz match against the precomputed index
+    choice, score = get_department_index().match(text, score_cutoff=DEPARTMENT_MATCH_CUTOFF)
     return (choice, score / 100.0) if score else ("", 0.0)
 
 
@@ -98,14 +146,16 @@ def normalize_organization(text: str) -> Tuple[str, float]:
     # quick cleanup of obvious OCR artifacts
     working = working.replace('_', ' ').replace('|', 'I').replace('0f', 'of')
 
-    # Try to find degree
-    degree, deg_score = _regex_find_degree(working)
+    # Degree, CSE acronym and org type in one regex scan
+    found = _ORG_EXTRACTOR.extract(working)
+    degree = found.get("degree", "")
+    deg_score = 1.0 if degree else 0.0
 
     # Try fuzzy department match on the whole string
     dept, dept_score = _fuzzy_match_department(working)
 
     # If dept is generic (CSE) but original contains acronym-like tokens (C S E), try simple token fix
-    if not dept and re.search(r'\b(c\W?s\W?e)\b', working, re.I):
+    if not dept and "cse" in found:
         dept = 'CSE'
         dept_score = 0.9
 
@@ -117,11 +167,7 @@ def normalize_organization(text: str) -> Tuple[str, float]:
         pieces.append(dept)
 
     # Try to extract org type (College/Institute/University)
-    found_type = None
-    for t in _ORG_TYPES:
-        if re.search(rf'\b{re.escape(t.lower())}\b', working.lower()):
-            found_type = t
-            break
+    found_type = found.get("org_type")
     if found_type:
         pieces.append(found_type)
 
@@ -173,12 +219,14 @@ def validate_fields(fields: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, f
             continue
 
         if k == 'name':
-            corrected = correct_spelling(v)
+            with stage("correct_spelling"):
+                corrected = correct_spelling(v)
             validated[key] = corrected
             confidence[key] = compute_confidence(v, corrected)
         elif k == 'organization' or k == 'org':
             # Normalize organization strings
-            normalized, conf = normalize_organization(v)
+            with stage("normalize_organization"):
+                normalized, conf = normalize_organization(v)
             validated[key] = normalized if normalized else v
             confidence[key] = conf if conf is not None else 0.0
         else:
@@ -0,0 +1,191 @@
+"""Content-addressed, persistent OCR result cache.
+
+Entries are keyed by a hash of the raw image bytes (or pixel buffer) combined
+with the preprocessing/engine parameters that produced the text, so a change
+to ``clahe_clip``, ``target_min_dim``, scales or engine naturally misses.
+Storage is a single SQLite file (WAL mode, safe to share between batch worker
+processes) with size-bounded LRU eviction. Lookups do not write: access times
+are batched and flushed with the next put (or every ACCESS_FLUSH_S seconds),
+and the stored size is tracked as a running total that is only recounted when
+it crosses the budget or every RECOUNT_PUTS writes (other processes may write too).
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("IDIS")
+
+# Bump when OCR/cleaning logic changes in a way that should invalidate old entries
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_PATH = "results/cache/ocr_cache.db"
+DEFAULT_MAX_MB = 512
+ACCESS_FLUSH_S = 5.0       # pending last_access updates are written at least this often
+ACCESS_FLUSH_MAX = 256     # ... or once this many are pending
+RECOUNT_PUTS = 256         # resync the running size total with the table every N puts
+
+
+def hash_bytes(data: bytes) -> str:
+    """Return the sha256 hex digest of raw bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the sha256 hex digest of a file's contents (streamed)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_array(image: np.ndarray) -> str:
+    """Return a sha256 digest of an image array (pixels + shape + dtype)."""
+    h = hashlib.sha256()
+    h.update(f"{image.shape}|{image.dtype}".encode("utf-8"))
+    h.update(np.ascontiguousarray(image).data)
+    return h.hexdigest()
+
+
+def make_key(content_hash: str, **params: Any) -> str:
+    """Combine a content hash with pipeline parameters into a cache key."""
+    payload = json.dumps({"v": CACHE_VERSION, "content": content_hash, **params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class OCRCache:
+    """SQLite-backed OCR result store with LRU eviction and hit/miss counters.
+
+    Args:
+        path: SQLite database file
+        max_mb: approximate upper bound on stored text size; least recently
+            used entries are evicted beyond it
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_mb: float = DEFAULT_MAX_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._touched_since = time.time()
+        self._puts = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS ocr_cache (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                confidence REAL,
+                engine TEXT,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_access ON ocr_cache(last_access)")
+        self._conn.commit()
+        self._total = self._count_size()
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[float], str]]:
+        """Return (text, confidence, engine) for key, or None on a miss."""
+        return self._lookup(key, count=True)
+
+    def peek(self, key: str) -> Optional[Tuple[str, Optional[float], str]]:
+        """Like get, but not counted as a hit or miss (for data stored alongside a counted lookup)."""
+        return self._lookup(key, count=False)
+
+    def _lookup(self, key: str, count: bool) -> Optional[Tuple[str, Optional[float], str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, confidence, engine FROM ocr_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                if count:
+                    self.misses += 1
+                return None
+            if count:
+                self.hits += 1
+            now = time.time()
+            self._touched[key] = now
+            if len(self._touched) >= ACCESS_FLUSH_MAX or now - self._touched_since >= ACCESS_FLUSH_S:
+                self._flush_access()
+                self._conn.commit()
+            return row[0], row[1], row[2] or ""
+
+    def put(self, key: str, text: str, confidence: Optional[float] = None, engine: str = "") -> None:
+        """Store an OCR result and evict least recently used entries if over budget."""
+        now = time.time()
+        size = len(text.encode("utf-8")) + len(key)
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, text, confidence, engine, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, text, confidence, engine, size, now, now),
+            )
+            self._touched.pop(key, None)
+            self._flush_access()
+            self._total += size - (old[0] if old else 0)
+            self._puts += 1
+            if self._puts % RECOUNT_PUTS == 0:
+                self._total = self._count_size()
+            self._evict()
+            self._conn.commit()
+
+    def _flush_access(self) -> None:
+        """Write pending last_access updates (caller holds the lock and commits)."""
+        if self._touched:
+            self._conn.executemany("UPDATE ocr_cache SET last_access = ? WHERE key = ?",
+                                   [(ts, key) for key, ts in self._touched.items()])
+            self._touched.clear()
+        self._touched_since = time.time()
+
+    def _count_size(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+
+    def _evict(self) -> None:
+        if self._total <= self.max_bytes:
+            return
+        # The running total may include other processes' writes only partially: recount before deleting
+        self._total = self._count_size()
+        if self._total <= self.max_bytes:
+            return
+        # Keep the most recently used entries that fit within the budget
+        cur = self._conn.execute(
+            """DELETE FROM ocr_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_access DESC, key) AS running
+                    FROM ocr_cache
+                ) WHERE running > ?
+            )""",
+            (self.max_bytes,),
+        )
+        self._total = self._count_size()
+        logger.debug(f"OCR cache evicted {cur.rowcount} entries (budget {self.max_bytes} bytes)")
+
+    def stats(self) -> Tuple[int, int]:
+        """Return (hits, misses) counted by this instance."""
+        return self.hits, self.misses
+
+    def log_stats(self) -> None:
+        total = self.hits + self.misses
+        rate = (self.hits / total) if total else 0.0
+        logger.info(f"OCR cache: hits={self.hits} misses={self.misses} hit_rate={rate:.1%}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,456 @@
+"""Long-running HTTP OCR service with a warm model pool and micro-batching.
+
+Endpoints:
+    POST /ocr          raw image bytes as the body (query: filename, category)
+                       -> {"record": {...}} or {"error": "..."}
+    POST /ocr/batch    {"images": [{"filename": ..., "category": ..., "data": "<base64>"}, ...]}
+                       -> {"results": [{"record": {...}} | {"error": "..."}, ...]}
+    GET  /metrics      Prometheus text format
+    GET  /health       pool and queue status
+
+Documents from all requests go into one bounded queue; when it is full the
+service answers 503 with Retry-After instead of letting latency grow without
+limit. A dispatcher waits for a free pool slot and OCRs the next queued
+document on it; each slot owns a warm EasyOCR reader, and spaCy NER and TrOCR
+are process-wide singletons that are warmed up at start. As soon as a
+document's OCR finishes it moves on to NER, where up to ``max_batch`` OCR'd
+documents (waiting at most ``batch_wait_ms`` for more) share one spaCy
+``nlp.pipe`` call. A document never waits for another document's OCR.
+
+The HTTP layer is a small HTTP/1.1 server on asyncio streams (keep-alive,
+Content-Length bodies), so no web framework is required.
+"""
+import json
+import time
+import queue
+import base64
+import asyncio
+import logging
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .batch_engine import OCRDocument, ocr_document, build_record, _AI_OCR_AVAILABLE
+from .models import warmup
+from .ocr_cache import OCRCache, DEFAULT_MAX_MB
+from .profiling import document, get_profiler, percentile, stage
+from .text_cleaning import clean_text, extract_fields_batch
+
+logger = logging.getLogger("IDIS")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+POOL_SIZE = 2
+MAX_BATCH = 8
+BATCH_WAIT_MS = 5.0
+MAX_QUEUE = 64
+MAX_BODY_MB = 20
+LATENCY_WINDOW = 10_000   # recent requests kept for latency quantiles
+RETRY_AFTER_S = 1
+ROUTES = ("/ocr", "/ocr/batch", "/metrics", "/health")
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+# One queued document; future receives (record, error)
+_Job = namedtuple("_Job", ["data", "filename", "category", "future", "enqueued"])
+
+# A document whose OCR has finished, waiting for NER
+_OCRDone = Tuple[_Job, OCRDocument]
+
+
+class ServiceBusy(Exception):
+    """Raised when the request queue cannot take more documents."""
+
+
+class ModelPool:
+    """Fixed set of warm EasyOCR readers, each used by one document at a time.
+
+    Args:
+        size: number of readers (documents OCR'd concurrently)
+        lang_list: EasyOCR languages
+        reader_factory: builds a reader (default: easyocr.Reader(lang_list))
+    """
+
+    def __init__(self, size: int = POOL_SIZE, lang_list: Sequence[str] = ("en",),
+                 reader_factory: Optional[Callable[[], Any]] = None):
+        if reader_factory is None:
+            import easyocr
+            # Each slot needs its own reader, so models.get_reader's singleton is not used here
+            reader_factory = lambda: easyocr.Reader(list(lang_list))  # noqa: E731
+        self.size = size
+        self._free: "queue.Queue[Any]" = queue.Queue()
+        self._readers = [reader_factory() for _ in range(size)]
+        for reader in self._readers:
+            self._free.put(reader)
+        logger.info(f"Model pool ready with {size} EasyOCR readers")
+
+    @contextmanager
+    def slot(self) -> Iterator[Any]:
+        """Check out a reader for the duration of the block."""
+        reader = self._free.get()
+        try:
+            yield reader
+        finally:
+            self._free.put(reader)
+
+    def warmup(self) -> None:
+        """Run a tiny inference on every model so the first request pays no lazy-init cost."""
+        blank = np.full((32, 128), 255, dtype=np.uint8)
+        for reader in self._readers:
+            reader.readtext(blank)
+        warmup(ocr=False, handwriting=_AI_OCR_AVAILABLE)
+        extract_fields_batch(["warm up"])
+        logger.info("Model pool warmed up")
+
+
+class OCRService:
+    """Micro-batching OCR service (see module docstring for the HTTP API).
+
+    Args:
+        pool: warm model pool (created with POOL_SIZE readers if None)
+        max_batch: OCR'd documents per NER micro-batch
+        batch_wait_ms: how long an NER batch waits for more documents after the first
+        max_queue: documents waiting for a slot before requests get 503
+        max_body_mb: largest accepted request body
+        cache_path: OCR result cache (None disables it)
+        cache_max_mb: OCR cache size budget
+        options: per-stage pipeline options, as for process_document
+    """
+
+    def __init__(self, pool: Optional[ModelPool] = None, *, max_batch: int = MAX_BATCH,
+                 batch_wait_ms: float = BATCH_WAIT_MS, max_queue: int = MAX_QUEUE,
+                 max_body_mb: float = MAX_BODY_MB, cache_path: Optional[str] = None,
+                 cache_max_mb: float = DEFAULT_MAX_MB, options: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.pool = pool or ModelPool()
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self.max_body = int(max_body_mb * 1024 * 1024)
+        self.cache = OCRCache(cache_path, max_mb=cache_max_mb) if cache_path else None
+        self.options = options or {}
+
+        self._executor = ThreadPoolExecutor(max_workers=self.pool.size, thread_name_prefix="ocr-slot")
+        # spaCy pipelines are not guaranteed thread-safe; NER batches run one at a time on this thread
+        self._ner_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ner")
+        self._queue: Optional[asyncio.Queue] = None
+        self._ner_queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: set = set()
+
+        # Metrics (only touched from the event loop thread)
+        self._started = time.time()
+        self._requests: Dict[Tuple[str, int], int] = {}
+        self._latency: Dict[str, deque] = {}
+        self._latency_sum: Dict[str, float] = {}
+        self._rejected = 0
+        self._batches = 0
+        self._batched_docs = 0
+        self._docs_failed = 0
+        self._busy_slots = 0
+
+        get_profiler().max_samples = LATENCY_WINDOW
+
+    # ---- batching -------------------------------------------------------
+
+    def _enqueue(self, items: Sequence[Tuple[bytes, str, str]]) -> List[asyncio.Future]:
+        if self.max_queue - self._queue.qsize() < len(items):
+            self._rejected += len(items)
+            raise ServiceBusy(f"queue full ({self._queue.qsize()}/{self.max_queue} documents waiting)")
+        loop = asyncio.get_running_loop()
+        futures = []
+        for data, filename, category in items:
+            future = loop.create_future()
+            self._queue.put_nowait(_Job(data, filename, category, future, time.perf_counter()))
+            futures.append(future)
+        return futures
+
+    async def _dispatcher(self) -> None:
+        while True:
+            # Hold documents in the (bounded) queue until a slot can take them
+            await self._slots.acquire()
+            job = await self._queue.get()
+            task = asyncio.create_task(self._dispatch(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, job: _Job) -> None:
+        self._busy_slots += 1
+        try:
+            ocr = await asyncio.get_running_loop().run_in_executor(self._executor, self._run_ocr, job)
+        except Exception as e:
+            logger.error(f"❌ Error processing {job.filename}: {e}")
+            self._resolve(job, None, str(e))
+            return
+        finally:
+            self._busy_slots -= 1
+            self._slots.release()
+        self._ner_queue.put_nowait((job, ocr))
+
+    async def _ner_batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[_OCRDone] = [await self._ner_queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.max_batch:
+                if not self._ner_queue.empty():
+                    batch.append(self._ner_queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._ner_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._batches += 1
+            self._batched_docs += len(batch)
+            try:
+                results = await loop.run_in_executor(self._ner_executor, self._run_ner, batch)
+            except Exception as e:
+                logger.error(f"NER batch failed: {e}")
+                results = [(None, str(e))] * len(batch)
+            for (job, _), (record, error) in zip(batch, results):
+                self._resolve(job, record, error)
+
+    def _resolve(self, job: _Job, record: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        if error:
+            self._docs_failed += 1
+        if not job.future.done():
+            job.future.set_result((record, error))
+
+    def _run_ocr(self, job: _Job) -> OCRDocument:
+        """OCR one document on a pool slot."""
+        with self.pool.slot() as reader:
+            with document(job.filename), stage("service_ocr"):
+                return ocr_document(job.data, job.filename, reader, self.cache, self.options)
+
+    def _run_ner(self, batch: List[_OCRDone]) -> List[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+        """Extract fields for a batch of OCR'd documents in one NER call and build their records."""
+        with stage("clean_text") as st:
+            cleaned = [clean_text(ocr.text) for _, ocr in batch]
+            st.size = len(cleaned)
+        fields = extract_fields_batch(cleaned, doc_types=[ocr.doc_type for _, ocr in batch])
+        results: List[Tuple[Optional[Dict[str, Any]], Optional[str]]] = []
+        for (job, ocr), text, doc_fields in zip(batch, cleaned, fields):
+            try:
+                results.append((build_record(job.filename, job.category, ocr.content_hash, text, doc_fields,
+                                             ocr.used_trocr, ocr.doc_type), None))
+            except Exception as e:
+                logger.error(f"❌ Error validating {job.filename}: {e}")
+                results.append((None, str(e)))
+        return results
+
+    # ---- HTTP -----------------------------------------------------------
+
+    async def _route(self, method: str, target: str, body: bytes) -> Tuple[int, Any, Dict[str, str]]:
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        if path == "/health":
+            if method != "GET":
+                return 405, {"error": "use GET"}, {}
+            return 200, {"status": "ok", "pool_size": self.pool.size, "busy_slots": self._busy_slots,
+                         "queued": self._queue.qsize(), "max_queue": self.max_queue}, {}
+        if path == "/metrics":
+            if method != "GET":
+                return 405, {"error": "use GET"}, {}
+            return 200, self.metrics_text(), {"Content-Type": "text/plain; version=0.0.4"}
+        if path not in ("/ocr", "/ocr/batch"):
+            return 404, {"error": f"no route {path}"}, {}
+        if method != "POST":
+            return 405, {"error": "use POST"}, {}
+
+        if path == "/ocr":
+            if not body:
+                return 400, {"error": "empty body; send the image bytes"}, {}
+            query = parse_qs(url.query)
+            items = [(body, query.get("filename", ["upload"])[0], query.get("category", [""])[0])]
+        else:
+            try:
+                images = json.loads(body)["images"]
+                items = [(base64.b64decode(img["data"], validate=True), img.get("filename") or f"upload_{n}",
+                          img.get("category", "")) for n, img in enumerate(images)]
+            except Exception as e:
+                return 400, {"error": f"expected {{\"images\": [{{\"filename\", \"data\": base64}}]}}: {e}"}, {}
+            if not items:
+                return 400, {"error": "no images"}, {}
+            if len(items) > self.max_queue:
+                return 413, {"error": f"at most {self.max_queue} images per batch"}, {}
+
+        try:
+            futures = self._enqueue(items)
+        except ServiceBusy as e:
+            return 503, {"error": str(e)}, {"Retry-After": str(RETRY_AFTER_S)}
+        results = [{"record": record} if error is None else {"error": error}
+                   for record, error in await asyncio.gather(*futures)]
+        if path == "/ocr":
+            return (200 if "record" in results[0] else 422), results[0], {}
+        return 200, {"results": results}, {}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, {}, keep_alive=False)
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if "transfer-encoding" in headers:
+                    await self._respond(writer, 411, {"error": "send a Content-Length body"}, {}, keep_alive=False)
+                    break
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "invalid Content-Length"}, {}, keep_alive=False)
+                    break
+                if length > self.max_body:
+                    await self._respond(writer, 413, {"error": f"body larger than {self.max_body} bytes"}, {},
+                                        keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                start = time.perf_counter()
+                try:
+                    status, payload, extra = await self._route(method.upper(), target, body)
+                except Exception as e:
+                    logger.error(f"Service error on {method} {target}: {e}")
+                    status, payload, extra = 500, {"error": str(e)}, {}
+                self._observe(urlsplit(target).path, status, time.perf_counter() - start)
+                await self._respond(writer, status, payload, extra, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: Any, extra: Dict[str, str],
+                       keep_alive: bool) -> None:
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+        else:
+            body = json.dumps(payload, default=str).encode("utf-8")
+            extra = {"Content-Type": "application/json", **extra}
+        headers = {"Content-Length": str(len(body)), "Connection": "keep-alive" if keep_alive else "close", **extra}
+        head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    # ---- metrics --------------------------------------------------------
+
+    def _observe(self, path: str, status: int, seconds: float) -> None:
+        # Unknown paths share one label so probes cannot grow the metric set
+        path = path.rstrip("/") or "/"
+        path = path if path in ROUTES else "other"
+        self._requests[(path, status)] = self._requests.get((path, status), 0) + 1
+        self._latency.setdefault(path, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+        self._latency_sum[path] = self._latency_sum.get(path, 0.0) + seconds
+
+    def metrics_text(self) -> str:
+        """Service and per-stage metrics in Prometheus text exposition format."""
+        lines = [
+            "# TYPE idis_requests_total counter",
+            *(f'idis_requests_total{{path="{p}",status="{s}"}} {n}' for (p, s), n in sorted(self._requests.items())),
+            "# TYPE idis_request_seconds summary",
+        ]
+        for path, window in sorted(self._latency.items()):
+            ordered = sorted(window)
+            for q in (50, 95, 99):
+                lines.append(f'idis_request_seconds{{path="{path}",quantile="{q / 100}"}} {percentile(ordered, q):.6f}')
+            lines.append(f'idis_request_seconds_sum{{path="{path}"}} {self._latency_sum[path]:.6f}')
+            lines.append(f'idis_request_seconds_count{{path="{path}"}} '
+                         f'{sum(n for (p, _), n in self._requests.items() if p == path)}')
+        lines += [
+            "# TYPE idis_rejected_documents_total counter",
+            f"idis_rejected_documents_total {self._rejected}",
+            "# TYPE idis_failed_documents_total counter",
+            f"idis_failed_documents_total {self._docs_failed}",
+            "# TYPE idis_batches_total counter",
+            f"idis_batches_total {self._batches}",
+            "# TYPE idis_batched_documents_total counter",
+            f"idis_batched_documents_total {self._batched_docs}",
+            "# TYPE idis_queue_depth gauge",
+            f"idis_queue_depth {self._queue.qsize() if self._queue else 0}",
+            "# TYPE idis_queue_capacity gauge",
+            f"idis_queue_capacity {self.max_queue}",
+            "# TYPE idis_pool_busy_slots gauge",
+            f"idis_pool_busy_slots {self._busy_slots}",
+            "# TYPE idis_pool_size gauge",
+            f"idis_pool_size {self.pool.size}",
+            "# TYPE idis_uptime_seconds gauge",
+            f"idis_uptime_seconds {time.time() - self._started:.0f}",
+            "# TYPE idis_stage_seconds summary",
+        ]
+        for name, s in get_profiler().summary().items():
+            for key, q in (("p50_ms", "0.5"), ("p95_ms", "0.95"), ("p99_ms", "0.99")):
+                lines.append(f'idis_stage_seconds{{stage="{name}",quantile="{q}"}} {s[key] / 1000:.6f}')
+            lines.append(f'idis_stage_seconds_sum{{stage="{name}"}} {s["total_s"]:.6f}')
+            lines.append(f'idis_stage_seconds_count{{stage="{name}"}} {s["count"]}')
+        if self.cache is not None:
+            hits, misses = self.cache.stats()
+            lines += ["# TYPE idis_cache_hits_total counter", f"idis_cache_hits_total {hits}",
+                      "# TYPE idis_cache_misses_total counter", f"idis_cache_misses_total {misses}"]
+        return "\n".join(lines) + "\n"
+
+    # ---- lifecycle ------------------------------------------------------
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, warmup: bool = True) -> asyncio.AbstractServer:
+        """Warm the models, start the dispatcher and NER batcher and begin accepting connections."""
+        self._queue = asyncio.Queue()
+        self._ner_queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.pool.size)
+        if warmup:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.pool.warmup)
+        for worker in (self._dispatcher(), self._ner_batcher()):
+            task = asyncio.create_task(worker)
+            self._tasks.add(task)
+        server = await asyncio.start_server(self._handle, host, port)
+        logger.info(f"🚀 IDIS OCR service listening on http://{host}:{port} "
+                    f"(pool={self.pool.size}, max_batch={self.max_batch}, max_queue={self.max_queue})")
+        return server
+
+    async def serve_forever(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        server = await self.start(host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        self._executor.shutdown(wait=False)
+        self._ner_executor.shutdown(wait=False)
+        if self.cache is not None:
+            self.cache.close()
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, **kwargs) -> None:
+    """Run the service until interrupted; kwargs go to OCRService (plus pool_size, lang_list)."""
+    pool = ModelPool(kwargs.pop("pool_size", POOL_SIZE), kwargs.pop("lang_list", ("en",)))
+    service = OCRService(pool, **kwargs)
+    try:
+        asyncio.run(service.serve_forever(host, port))
+    except KeyboardInterrupt:
+        logger.info("OCR service stopped")
@@ -0,0 +1,214 @@
+"""Lightweight per-stage latency instrumentation for the IDIS pipeline.
+
+Usage:
+    with document("receipt_01.png"):
+        with stage("preprocess") as st:
+            img = preprocess_image(raw)
+            st.size = img.nbytes
+
+Every stage records its wall-clock duration (and optional output size) for
+the current document. At the end of a run the process-wide Profiler can log
+and write a p50/p95/p99 summary per stage, and optionally a Chrome-trace
+timeline (open in chrome://tracing or https://ui.perfetto.dev).
+
+Batch worker processes set ``forward = True`` so events are buffered and
+shipped back to the parent with each result (see batch_engine). Long-running
+processes (the OCR service) set ``max_samples`` so percentiles come from a
+rolling window of recent events while counts and totals stay exact.
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+from collections import defaultdict, deque, namedtuple
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger("IDIS")
+
+StageEvent = namedtuple("StageEvent", ["stage", "doc", "ts", "duration", "size", "pid", "tid"])
+
+_LOCAL = threading.local()
+
+
+class _StageHandle:
+    """Yielded by stage(); set ``size`` to record the stage's output size."""
+    __slots__ = ("size", "discarded")
+
+    def __init__(self):
+        self.size: Optional[int] = None
+        self.discarded = False
+
+    def discard(self) -> None:
+        """Do not record this event (e.g. the block turned out to do no work)."""
+        self.discarded = True
+
+
+class Profiler:
+    """Collects stage events and aggregates them into per-stage statistics."""
+
+    def __init__(self):
+        self.forward = False      # buffer events for another process instead of aggregating
+        self.keep_events = False  # keep the full timeline for write_chrome_trace()
+        self.max_samples: Optional[int] = None  # per-stage samples kept for percentiles (None = all)
+        self._lock = threading.Lock()
+        self._durations: Dict[str, deque] = defaultdict(self._window)
+        self._sizes: Dict[str, deque] = defaultdict(self._window)
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._totals: Dict[str, float] = defaultdict(float)
+        self._events: List[StageEvent] = []
+        self._pending: List[StageEvent] = []
+
+    def record(self, event: StageEvent) -> None:
+        with self._lock:
+            if self.forward:
+                self._pending.append(event)
+            else:
+                self._add(event)
+
+    def _window(self) -> deque:
+        return deque(maxlen=self.max_samples)
+
+    def _add(self, event: StageEvent) -> None:
+        self._counts[event.stage] += 1
+        self._totals[event.stage] += event.duration
+        self._durations[event.stage].append(event.duration)
+        if event.size is not None:
+            self._sizes[event.stage].append(event.size)
+        if self.keep_events:
+            self._events.append(event)
+
+    def drain(self) -> List[StageEvent]:
+        """Return and clear events buffered in forward mode."""
+        with self._lock:
+            events, self._pending = self._pending, []
+        return events
+
+    def merge(self, events: Iterable[StageEvent]) -> None:
+        """Aggregate events recorded in another process."""
+        with self._lock:
+            for event in events:
+                self._add(StageEvent(*event))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._durations.clear()
+            self._sizes.clear()
+            self._counts.clear()
+            self._totals.clear()
+            self._events.clear()
+            self._pending.clear()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-stage count, total and mean/p50/p95/p99/max latency (ms) and mean output size."""
+        out: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for name, durations in self._durations.items():
+                ordered = sorted(durations)
+                sizes = self._sizes.get(name)
+                count, total = self._counts[name], self._totals[name]
+                out[name] = {
+                    "count": count,
+                    "total_s": round(total, 3),
+                    "mean_ms": round(1000 * total / count, 2),
+                    "p50_ms": round(1000 * percentile(ordered, 50), 2),
+                    "p95_ms": round(1000 * percentile(ordered, 95), 2),
+                    "p99_ms": round(1000 * percentile(ordered, 99), 2),
+                    "max_ms": round(1000 * ordered[-1], 2),
+                    "mean_size": round(sum(sizes) / len(sizes), 1) if sizes else None,
+                }
+        return dict(sorted(out.items(), key=lambda kv: kv[1]["total_s"], reverse=True))
+
+    def log_summary(self) -> None:
+        summary = self.summary()
+        if not summary:
+            return
+        logger.info("⏱️ Stage latency summary (ms):")
+        width = max(len(name) for name in summary)
+        logger.info(f"{'stage':<{width}}  {'count':>6}  {'total_s':>9}  {'p50':>9}  {'p95':>9}  {'p99':>9}")
+        for name, s in summary.items():
+            logger.info(f"{name:<{width}}  {s['count']:>6}  {s['total_s']:>9.2f}  {s['p50_ms']:>9.1f}  "
+                        f"{s['p95_ms']:>9.1f}  {s['p99_ms']:>9.1f}")
+
+    def write_summary(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        logger.info(f"⏱️ Stage timing summary saved to {path}")
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Dump recorded events in Chrome trace-event JSON format (requires keep_events)."""
+        with self._lock:
+            events = list(self._events)
+        trace = [{
+            "name": e.stage,
+            "cat": "idis",
+            "ph": "X",
+            "ts": int(e.ts * 1e6),
+            "dur": int(e.duration * 1e6),
+            "pid": e.pid,
+            "tid": e.tid,
+            "args": {"doc": e.doc, "size": e.size},
+        } for e in events]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        logger.info(f"⏱️ Chrome trace with {len(trace)} events saved to {path}")
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+_PROFILER = Profiler()
+
+
+def get_profiler() -> Profiler:
+    """Return the process-wide Profiler."""
+    return _PROFILER
+
+
+@contextmanager
+def document(doc_id: str) -> Iterator[None]:
+    """Attribute stages recorded inside this block (on this thread) to doc_id."""
+    previous = getattr(_LOCAL, "doc", None)
+    _LOCAL.doc = doc_id
+    try:
+        yield
+    finally:
+        _LOCAL.doc = previous
+
+
+@contextmanager
+def stage(name: str) -> Iterator[_StageHandle]:
+    """Time a pipeline stage for the current document."""
+    handle = _StageHandle()
+    ts = time.time()
+    start = time.perf_counter()
+    try:
+        yield handle
+    finally:
+        duration = time.perf_counter() - start
+        if not handle.discarded:
+            _PROFILER.record(StageEvent(name, getattr(_LOCAL, "doc", None), ts, duration, handle.size,
+                                        os.getpid(), threading.get_ident()))
+
+
+def timed(name: Optional[str] = None):
+    """Decorator form of stage(); defaults to the function's name."""
+    def decorator(func):
+        label = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,69 +1,408 @@
-import cv2
-import easyocr
-import pandas as pd
+"""Real-time webcam OCR.
+
+The capture loop reads and renders frames at camera rate on the main thread.
+OCR runs in a background worker that always takes the most recent frame;
+frames that arrive while it is busy replace each other instead of queueing.
+Detections are merged across frames by a small IoU + text tracker, so the CSV
+gets one row per piece of text on screen rather than one per frame, and every
+buffer (frame slot, live tracks, finished rows) has a fixed upper bound.
+
+Before OCR, a FrameGate compares a tiny grayscale thumbnail of the frame with
+the previous one and with the last OCR'd frame. OCR only runs once the scene
+has changed and then held still, and only on the changed part of the frame;
+detections outside it are reused. A static document costs one OCR pass.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque, namedtuple
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
 import numpy as np
-import logging
-logger = logging.getLogger()
+from rapidfuzz import fuzz
+
+from .models import get_reader
+
+logger = logging.getLogger("IDIS")
+
+REALTIME_CSV_PATH = "results/csv/realtime_ocr_results.csv"
+WINDOW_NAME = "🧠 IDIS - Real-Time OCR"
+
+IOU_THRESHOLD = 0.3      # boxes overlapping at least this much can be the same text
+TEXT_SIMILARITY = 80     # rapidfuzz ratio (0-100) for two readings to count as the same text
+TRACK_TTL = 2.0          # seconds a track survives without being re-detected
+MAX_TRACKS = 256
+MAX_RESULTS = 10_000
+
+GATE_SIZE = (64, 48)     # thumbnail (w, h) the change detector works on
+GATE_GRID = (8, 6)       # cells (w, h) used to localize changes
+MOTION_THRESHOLD = 4.0   # mean abs diff (0-255) between consecutive thumbnails that counts as motion
+CHANGE_THRESHOLD = 8.0   # per-cell mean abs diff vs the last OCR'd thumbnail that counts as changed
+SETTLE_FRAMES = 3        # still frames required after a change before OCR runs
+FULL_FRAME_FRACTION = 0.5  # OCR the whole frame once the changed area exceeds this fraction
+
+# box: axis-aligned (x1, y1, x2, y2); points: the four EasyOCR corner points
+Detection = namedtuple("Detection", ["box", "points", "text", "confidence"])
+
+
+def _to_detection(bbox: Sequence[Sequence[float]], text: str, confidence: float) -> Detection:
+    pts = np.array([tuple(map(int, p)) for p in bbox], dtype=np.int32)
+    x1, y1 = pts.min(axis=0)
+    x2, y2 = pts.max(axis=0)
+    return Detection((int(x1), int(y1), int(x2), int(y2)), pts, text, float(confidence))
+
+
+def _intersects(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def box_iou(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> float:
+    """Intersection over union of two (x1, y1, x2, y2) boxes."""
+    iw = min(a[2], b[2]) - max(a[0], b[0])
+    ih = min(a[3], b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class LatestFrame:
+    """Single-slot handoff between the capture loop and the OCR worker.
+
+    put() overwrites any frame the worker has not picked up yet, so the worker
+    always sees the newest frame and at most one frame is ever buffered.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame: Optional[np.ndarray] = None
+        self._seq = 0
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, frame: np.ndarray) -> None:
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._seq += 1
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[int, np.ndarray]]:
+        """Wait for a frame; returns (sequence number, frame) or None on timeout/close."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._frame is not None or self.closed, timeout)
+            if self._frame is None:
+                return None
+            frame, self._frame = self._frame, None
+            return self._seq, frame
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class FrameGate:
+    """Decide when a frame is worth OCR-ing and which part of it changed.
 
+    Args:
+        size: thumbnail (w, h) used for differencing
+        grid: cells (w, h) used to localize changes
+        motion_threshold: mean abs difference between consecutive thumbnails treated as motion
+        change_threshold: per-cell mean abs difference vs the last OCR'd thumbnail treated as change
+        settle_frames: consecutive still frames required before OCR
+        full_frame_fraction: changed-area fraction above which the whole frame is OCR'd
+    """
 
-def start_realtime_ocr(save_csv=False):
-    # Initialize the OCR reader
-    reader = easyocr.Reader(['en'])
-    cap = cv2.VideoCapture(0)  # 0 means your default webcam
-    
-    print("📸 Starting real-time OCR... Press 'q' to quit.")
-    results = []
+    def __init__(self, size: Tuple[int, int] = GATE_SIZE, grid: Tuple[int, int] = GATE_GRID,
+                 motion_threshold: float = MOTION_THRESHOLD, change_threshold: float = CHANGE_THRESHOLD,
+                 settle_frames: int = SETTLE_FRAMES, full_frame_fraction: float = FULL_FRAME_FRACTION):
+        self.size = size
+        self.grid = grid
+        self.motion_threshold = motion_threshold
+        self.change_threshold = change_threshold
+        self.settle_frames = settle_frames
+        self.full_frame_fraction = full_frame_fraction
+        self._prev: Optional[np.ndarray] = None
+        self._ref: Optional[np.ndarray] = None
+        self._still = 0
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("⚠️ Failed to grab frame")
-            break
+    def reset(self) -> None:
+        """Forget the reference frame so the next settled frame is fully OCR'd."""
+        self._prev = self._ref = None
+        self._still = 0
 
-        # Convert to grayscale for better performance
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    def check(self, gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """Return the (x1, y1, x2, y2) region to OCR in gray, or None to skip this frame."""
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        moving = self._prev is not None and cv2.absdiff(small, self._prev).mean() > self.motion_threshold
+        self._prev = small
+        self._still = 0 if moving else self._still + 1
+        if self._still < self.settle_frames:
+            return None
 
-        # Perform OCR
-        detections = reader.readtext(gray)
+        h, w = gray.shape[:2]
+        if self._ref is None:
+            self._ref = small
+            return 0, 0, w, h
 
-        for (bbox, text, confidence) in detections:
-            # Draw bounding box
-            (top_left, top_right, bottom_right, bottom_left) = bbox
-            pts = [tuple(map(int, point)) for point in [top_left, top_right, bottom_right, bottom_left]]
-            cv2.polylines(frame, [np.array(pts)], isClosed=True, color=(0, 255, 0), thickness=2)
+        cells = cv2.resize(cv2.absdiff(small, self._ref), self.grid, interpolation=cv2.INTER_AREA)
+        changed = cells > self.change_threshold
+        if not changed.any():
+            return None
+        self._ref = small
+        if changed.mean() > self.full_frame_fraction:
+            return 0, 0, w, h
 
-            # Display detected text and confidence
-            cv2.putText(frame, f"{text} ({confidence:.2f})", (pts[0][0], pts[0][1] - 10),
+        # Bounding box of the changed cells plus one cell of margin, in frame pixels
+        gw, gh = self.grid
+        rows, cols = np.nonzero(changed)
+        x1, x2 = max(cols.min() - 1, 0), min(cols.max() + 2, gw)
+        y1, y2 = max(rows.min() - 1, 0), min(rows.max() + 2, gh)
+        return x1 * w // gw, y1 * h // gh, x2 * w // gw, y2 * h // gh
+
+
+class _Track:
+    __slots__ = ("text", "confidence", "box", "first_seen", "last_seen", "hits")
+
+    def __init__(self, det: Detection, now: float):
+        self.text = det.text
+        self.confidence = det.confidence
+        self.box = det.box
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+
+    def row(self) -> Dict[str, Any]:
+        return {
+            "Timestamp": datetime.fromtimestamp(self.first_seen).strftime("%Y-%m-%d %H:%M:%S"),
+            "Last Seen": datetime.fromtimestamp(self.last_seen).strftime("%Y-%m-%d %H:%M:%S"),
+            "Text": self.text,
+            "Confidence": self.confidence,
+            "Frames": self.hits,
+        }
+
+
+class DetectionTracker:
+    """De-duplicate OCR detections across frames.
+
+    A detection continues an existing track when its box overlaps the track's
+    last box (IoU) and its text is similar; the highest-confidence reading is
+    kept. Tracks not seen for ``ttl`` seconds are retired into ``results``.
+
+    Args:
+        iou_threshold: minimum box IoU to continue a track
+        text_similarity: minimum rapidfuzz ratio (0-100) between readings
+        ttl: seconds a track may go unseen before it is retired
+        max_tracks: live tracks kept; the stalest are retired first
+        max_results: retired rows kept (oldest dropped first)
+    """
+
+    def __init__(self, iou_threshold: float = IOU_THRESHOLD, text_similarity: float = TEXT_SIMILARITY,
+                 ttl: float = TRACK_TTL, max_tracks: int = MAX_TRACKS, max_results: int = MAX_RESULTS):
+        self.iou_threshold = iou_threshold
+        self.text_similarity = text_similarity
+        self.ttl = ttl
+        self.max_tracks = max_tracks
+        self.tracks: List[_Track] = []
+        self.results: deque = deque(maxlen=max_results)
+
+    def _match(self, det: Detection) -> Optional[_Track]:
+        best, best_iou = None, self.iou_threshold
+        for track in self.tracks:
+            iou = box_iou(track.box, det.box)
+            if iou >= best_iou and fuzz.ratio(track.text.lower(), det.text.lower()) >= self.text_similarity:
+                best, best_iou = track, iou
+        return best
+
+    def update(self, detections: Sequence[Detection], now: Optional[float] = None) -> List[Detection]:
+        """Merge one frame's detections; returns the ones that started a new track."""
+        now = time.time() if now is None else now
+        new = []
+        for det in detections:
+            track = self._match(det)
+            if track is None:
+                self.tracks.append(_Track(det, now))
+                new.append(det)
+                continue
+            track.box = det.box
+            track.last_seen = now
+            track.hits += 1
+            if det.confidence > track.confidence:
+                track.text, track.confidence = det.text, det.confidence
+        self._expire(now)
+        return new
+
+    def keep_alive(self, detections: Sequence[Detection], now: Optional[float] = None) -> None:
+        """Mark the tracks of reused (not re-OCR'd) detections as still on screen.
+
+        Call this before update() for the same frame; update() expires stale tracks.
+        """
+        now = time.time() if now is None else now
+        for det in detections:
+            track = self._match(det)
+            if track is not None:
+                track.last_seen = now
+
+    def _expire(self, now: float) -> None:
+        live = []
+        for track in self.tracks:
+            if now - track.last_seen > self.ttl:
+                self.results.append(track.row())
+            else:
+                live.append(track)
+        if len(live) > self.max_tracks:
+            live.sort(key=lambda t: t.last_seen)
+            for track in live[:len(live) - self.max_tracks]:
+                self.results.append(track.row())
+            live = live[len(live) - self.max_tracks:]
+        self.tracks = live
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Retired rows followed by the still-live tracks, one row per distinct text."""
+        return list(self.results) + [t.row() for t in self.tracks]
+
+
+class RealtimeOCR:
+    """Camera capture/render loop with OCR in a background thread.
+
+    Args:
+        reader: EasyOCR reader (created on demand if None)
+        camera: cv2.VideoCapture source
+        tracker: detection tracker (a default one if None)
+        gate: change-detection gate (a default one if None; pass False to OCR every frame)
+    """
+
+    def __init__(self, reader=None, camera: Any = 0, tracker: Optional[DetectionTracker] = None,
+                 gate: Optional[FrameGate] = None):
+        self.reader = reader
+        self.camera = camera
+        self.tracker = tracker or DetectionTracker()
+        self.gate = FrameGate() if gate is None else gate
+        self._slot = LatestFrame()
+        self._lock = threading.Lock()
+        self._overlay: List[Detection] = []
+        self._ocr_frames = 0
+        self._gated_frames = 0
+        self._worker: Optional[threading.Thread] = None
+
+    def _ocr_loop(self) -> None:
+        while True:
+            item = self._slot.get(timeout=0.5)
+            if item is None:
+                if self._slot.closed:
+                    return
+                continue
+            _, gray = item
+            h, w = gray.shape[:2]
+            region = self.gate.check(gray) if self.gate else (0, 0, w, h)
+            if region is None:
+                with self._lock:
+                    self._gated_frames += 1
+                    self.tracker.keep_alive(self._overlay)
+                continue
+
+            # Previous detections touching the changed region are re-read with it; the rest are reused
+            with self._lock:
+                previous = self._overlay
+            if region != (0, 0, w, h):
+                grown = True
+                while grown:
+                    grown = False
+                    for det in previous:
+                        if _intersects(region, det.box) and not (
+                                region[0] <= det.box[0] and region[1] <= det.box[1]
+                                and det.box[2] <= region[2] and det.box[3] <= region[3]):
+                            region = (max(min(region[0], det.box[0]), 0), max(min(region[1], det.box[1]), 0),
+                                      min(max(region[2], det.box[2]), w), min(max(region[3], det.box[3]), h))
+                            grown = True
+            reused = [det for det in previous if not _intersects(region, det.box)]
+
+            x1, y1, x2, y2 = region
+            try:
+                raw = self.reader.readtext(gray[y1:y2, x1:x2])
+            except Exception as e:
+                logger.error(f"Real-time OCR failed on frame: {e}")
+                if self.gate:
+                    self.gate.reset()
+                continue
+            detections = [_to_detection([(px + x1, py + y1) for px, py in bbox], text, conf)
+                          for bbox, text, conf in raw]
+            now = time.time()
+            with self._lock:
+                # Refresh reused tracks first, or update() would expire them and re-add them as new
+                self.tracker.keep_alive(reused, now)
+                new = self.tracker.update(detections, now)
+                self._overlay = reused + detections
+                self._ocr_frames += 1
+            for det in new:
+                logger.info(f"Detected text: {det.text} ({det.confidence:.2f})")
+
+    def _draw(self, frame: np.ndarray) -> None:
+        with self._lock:
+            overlay = self._overlay
+        for det in overlay:
+            cv2.polylines(frame, [det.points], isClosed=True, color=(0, 255, 0), thickness=2)
+            cv2.putText(frame, f"{det.text} ({det.confidence:.2f})", (int(det.points[0][0]), int(det.points[0][1]) - 10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
 
-            # Log detected text
-            logger.info(f"Detected text: {text} ({confidence:.2f})")
+    def run(self) -> List[Dict[str, Any]]:
+        """Run until 'q' is pressed or the camera fails; returns the de-duplicated rows."""
+        if self.reader is None:
+            self.reader = get_reader()
+        cap = cv2.VideoCapture(self.camera)
+        self._worker = threading.Thread(target=self._ocr_loop, name="realtime-ocr", daemon=True)
+        self._worker.start()
+
+        print("📸 Starting real-time OCR... Press 'q' to quit.")
+        frames, start = 0, time.perf_counter()
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    print("⚠️ Failed to grab frame")
+                    break
+                frames += 1
+
+                # OCR works on grayscale; the converted copy also decouples the worker from the display frame
+                self._slot.put(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+
+                self._draw(frame)
+                cv2.imshow(WINDOW_NAME, frame)
 
-            # Save detected text
-            results.append({
-                "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "Text": text,
-                "Confidence": confidence
-            })
+                # Press 'q' to quit
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+        finally:
+            self._slot.close()
+            cap.release()
+            cv2.destroyAllWindows()
+            self._worker.join(timeout=10)
 
-        # Show live window
-        cv2.imshow("🧠 IDIS - Real-Time OCR", frame)
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        logger.info(f"⏱️ Real-time OCR: {frames / elapsed:.1f} fps displayed, {self._ocr_frames / elapsed:.1f} fps OCR'd, "
+                    f"{self._slot.dropped} stale frames skipped, {self._gated_frames} unchanged frames not OCR'd")
+        with self._lock:
+            return self.tracker.rows()
 
-        # Press 'q' to quit
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
 
-    # Release camera
-    cap.release()
-    cv2.destroyAllWindows()
+def start_realtime_ocr(save_csv=False, camera=0, csv_path=REALTIME_CSV_PATH):
+    """Run webcam OCR until 'q' is pressed; optionally save one CSV row per distinct detection."""
+    results = RealtimeOCR(camera=camera).run()
 
     # Save results to CSV if requested
     if save_csv and results:
         try:
+            import pandas as pd
+            os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
             df = pd.DataFrame(results)
-            csv_path = "results/csv/realtime_ocr_results.csv"
             df.to_csv(csv_path, index=False)
-            logger.info(f"✅ Saved results to {csv_path}")
+            logger.info(f"✅ Saved {len(results)} results to {csv_path}")
         except Exception as e:
-            logger.error(f"Failed to save results to CSV: {str(e)}")
\ No newline at end of file
+            logger.error(f"Failed to save results to CSV: {str(e)}")
+    return results
@@ -0,0 +1,97 @@
+"""Resolution policy: how many pixels a page needs for OCR.
+
+OCR engines are tuned for text of a certain pixel height (EasyOCR's detector
+and Tesseract both do best around 20-30 px glyphs, i.e. body text scanned at
+~300 dpi). Anything larger only costs decode, preprocessing and inference time.
+The median glyph height is estimated from connected components on a small
+thumbnail, and the page is scaled so glyphs land at TARGET_TEXT_HEIGHT.
+Scan DPI metadata is often missing or wrong, so the text itself is measured.
+
+Usage:
+    height = estimate_text_height(thumb) / thumb_scale     # glyph height at full resolution
+    scale = target_scale(height, w, h)                     # <= 1.0; resize/decode at this scale
+"""
+import logging
+from typing import Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("IDIS")
+
+TARGET_TEXT_HEIGHT = 24      # median glyph height (px) the page is scaled to; ~300 dpi for 10-11 pt text
+THUMB_SIDE = 1024            # long side of the thumbnail used for the estimate
+MIN_GLYPHS = 20              # fewer character-like components than this -> no estimate
+MIN_GLYPH_HEIGHT = 3         # thumbnail pixels; smaller components are noise
+MAX_GLYPH_FRACTION = 0.05    # components taller than this fraction of the page are not glyphs
+SCALE_TOLERANCE = 0.1        # scales within 10% of 1.0 (or of a decoder reduction) are not worth a resample
+
+
+def estimate_text_height(gray: np.ndarray) -> Optional[float]:
+    """Median height in pixels of character-like connected components, or None if there is too little text."""
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    if cv2.countNonZero(mask) > mask.size // 2:
+        # Light text on a dark background
+        mask = cv2.bitwise_not(mask)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    heights = stats[1:n, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:n, cv2.CC_STAT_WIDTH]
+    areas = stats[1:n, cv2.CC_STAT_AREA]
+    glyphs = ((heights >= MIN_GLYPH_HEIGHT) & (heights <= MAX_GLYPH_FRACTION * gray.shape[0] + MIN_GLYPH_HEIGHT)
+              & (widths <= 3 * heights) & (areas >= 0.1 * widths * heights))
+    if int(glyphs.sum()) < MIN_GLYPHS:
+        return None
+    return float(np.median(heights[glyphs]))
+
+
+def thumbnail(gray: np.ndarray, side: int = THUMB_SIDE):
+    """Downscale gray so its long side is at most side; return (thumbnail, scale)."""
+    h, w = gray.shape[:2]
+    scale = min(1.0, side / float(max(h, w)))
+    if scale == 1.0:
+        return gray, 1.0
+    return cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA), scale
+
+
+def target_scale(text_height: Optional[float], width: int, height: int, *,
+                 target_text_height: float = TARGET_TEXT_HEIGHT, max_pixels: int = 0,
+                 max_side: Optional[int] = None) -> float:
+    """Scale (never above 1.0) at which the page should be processed.
+
+    Args:
+        text_height: estimated glyph height at full resolution (None if unknown)
+        width, height: full-resolution page size
+        target_text_height: glyph height to scale down to (0 disables the text policy)
+        max_pixels: pixel budget used when the text height is unknown (0 disables)
+        max_side: hard cap on the long side (e.g. a UI setting)
+    """
+    scale = 1.0
+    if text_height and target_text_height:
+        scale = min(scale, target_text_height / text_height)
+    elif max_pixels and width * height > max_pixels:
+        scale = min(scale, (max_pixels / float(width * height)) ** 0.5)
+    if max_side and max(width, height) > max_side:
+        scale = min(scale, max_side / float(max(width, height)))
+    return scale
+
+
+def normalize_resolution(image: np.ndarray, *, target_text_height: float = TARGET_TEXT_HEIGHT,
+                         max_pixels: int = 0, max_side: Optional[int] = None) -> np.ndarray:
+    """Downscale an already-decoded page according to the policy (returns image unchanged if no downscale)."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    h, w = gray.shape[:2]
+    thumb, thumb_scale = thumbnail(gray)
+    text_height = estimate_text_height(thumb) if target_text_height else None
+    scale = target_scale(text_height / thumb_scale if text_height else None, w, h,
+                         target_text_height=target_text_height, max_pixels=max_pixels, max_side=max_side)
+    return resize_to_scale(image, scale, text_height / thumb_scale if text_height else None)
+
+
+def resize_to_scale(image: np.ndarray, scale: float, text_height: Optional[float] = None) -> np.ndarray:
+    """INTER_AREA resize by scale; reductions within SCALE_TOLERANCE are skipped."""
+    if scale > 1.0 - SCALE_TOLERANCE:
+        return image
+    h, w = image.shape[:2]
+    if text_height:
+        logger.info(f"📏 Text height ~{text_height:.0f}px → processing {w}x{h} page at {scale:.2f}x")
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
@@ -0,0 +1,230 @@
+"""Symmetric-delete (SymSpell-style) spelling correction.
+
+Every dictionary word is indexed under all strings obtainable by deleting up
+to ``max_edit_distance`` characters from its prefix. A lookup generates the
+same deletes for the input word, so candidate words are found with a few
+dictionary probes instead of enumerating every possible edit (as TextBlob's
+Norvig-style corrector does). Candidates are verified with an optimal string
+alignment distance and ranked by distance, then frequency.
+
+The word frequencies live in a compact gzip'd ``word<TAB>count`` file; a
+domain lexicon (names, departments, degrees, ...) can be layered on top so
+domain terms are never "corrected" into common English words. Capitalised and
+all-caps tokens are left alone by default: most unknown ones are names and
+acronyms ("Barkha", "ISRO") that no lexicon can list exhaustively.
+"""
+import os
+import re
+import gzip
+import logging
+import importlib.util
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from rapidfuzz.distance import OSA
+
+logger = logging.getLogger("IDIS")
+
+LEXICON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "lexicon")
+DEFAULT_DICTIONARY_PATH = os.path.join(LEXICON_DIR, "en_frequency.txt.gz")
+DEFAULT_LEXICON_PATH = os.path.join(LEXICON_DIR, "domain_lexicon.txt")
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+
+_WORD_RE = re.compile(r"[A-Za-z]+")
+
+
+class SymSpell:
+    """Symmetric-delete spelling corrector.
+
+    Args:
+        max_edit_distance: largest edit distance considered for suggestions
+        prefix_length: only this many leading characters are indexed (SymSpell's
+            prefix trick; keeps the index small with little loss of accuracy)
+        keep_proper_nouns: correct() leaves unknown capitalised/all-caps tokens unchanged
+    """
+
+    def __init__(self, max_edit_distance: int = MAX_EDIT_DISTANCE, prefix_length: int = PREFIX_LENGTH,
+                 keep_proper_nouns: bool = True):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.keep_proper_nouns = keep_proper_nouns
+        self.words: Dict[str, int] = {}
+        self._deletes: Dict[str, List[str]] = {}
+        self._max_len = 0
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def _edits(self, word: str) -> Set[str]:
+        """All strings reachable from word by deleting up to max_edit_distance characters."""
+        out = {word}
+        frontier = {word}
+        for _ in range(self.max_edit_distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+            out |= frontier
+        return out
+
+    def add_word(self, word: str, count: int = 1) -> None:
+        """Add a word (or raise its count) in the dictionary."""
+        word = word.lower()
+        if not word:
+            return
+        if word in self.words:
+            self.words[word] = max(self.words[word], count)
+            return
+        self.words[word] = count
+        self._max_len = max(self._max_len, len(word))
+        for delete in self._edits(word[:self.prefix_length]):
+            self._deletes.setdefault(delete, []).append(word)
+
+    def add_words(self, words: Iterable[Tuple[str, int]]) -> None:
+        for word, count in words:
+            self.add_word(word, count)
+
+    def add_lexicon(self, terms: Iterable[str], count: Optional[int] = None) -> None:
+        """Add domain terms (multi-word terms are split) so they outrank common words."""
+        count = count or max(self.words.values(), default=1)
+        for term in terms:
+            for word in _WORD_RE.findall(term):
+                self.add_word(word, count)
+
+    def load(self, path: str) -> None:
+        """Load a word<TAB>count (or 'word count') frequency file, optionally gzip'd."""
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and not line.startswith(";"):
+                    self.add_word(parts[0], int(parts[1]))
+
+    def save(self, path: str) -> None:
+        """Write the dictionary as a gzip'd word<TAB>count file."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for word, count in sorted(self.words.items()):
+                f.write(f"{word}\t{count}\n")
+
+    def lookup(self, word: str, max_edit_distance: Optional[int] = None) -> Tuple[str, int]:
+        """Return (best suggestion, distance) for a word, or (word, -1) if nothing is close enough.
+
+        The closest candidate wins; ties go to the more frequent word.
+        """
+        max_d = self.max_edit_distance if max_edit_distance is None else min(max_edit_distance, self.max_edit_distance)
+        lower = word.lower()
+        if lower in self.words:
+            return lower, 0
+        if len(lower) - self._max_len > max_d:
+            return word, -1
+
+        best, best_d, best_count = None, max_d, -1
+        seen: Set[str] = set()
+        level = {lower[:self.prefix_length]}
+        # Input deletes are probed level by level; a candidate reached after k
+        # deletions is at least k edits away, so stop once k exceeds the best distance
+        for k in range(max_d + 1):
+            if k > best_d:
+                break
+            for delete in level:
+                for cand in self._deletes.get(delete, ()):
+                    if cand in seen or abs(len(cand) - len(lower)) > best_d:
+                        continue
+                    seen.add(cand)
+                    d = OSA.distance(lower, cand, score_cutoff=best_d)
+                    if d > best_d:
+                        continue
+                    count = self.words[cand]
+                    if best is None or d < best_d or count > best_count:
+                        best, best_d, best_count = cand, d, count
+            level = {w[:i] + w[i + 1:] for w in level for i in range(len(w))}
+        return (best, best_d) if best is not None else (word, -1)
+
+    def correct(self, text: str) -> str:
+        """Correct alphabetic tokens in text, keeping punctuation, spacing and case style.
+
+        Unless keep_proper_nouns is off, capitalised and all-caps tokens are
+        returned unchanged.
+        """
+        def fix(match: re.Match) -> str:
+            token = match.group(0)
+            if self.keep_proper_nouns and token[0].isupper():
+                return token
+            suggestion, distance = self.lookup(token)
+            if distance <= 0:
+                return token
+            if token.isupper() and len(token) > 1:
+                return suggestion.upper()
+            if token[0].isupper():
+                return suggestion.capitalize()
+            return suggestion
+        return _WORD_RE.sub(fix, text)
+
+
+def _textblob_corpus() -> Optional[str]:
+    """Locate TextBlob's bundled en-spelling.txt without importing TextBlob."""
+    spec = importlib.util.find_spec("textblob")
+    if spec is None or not spec.origin:
+        return None
+    path = os.path.join(os.path.dirname(spec.origin), "en", "en-spelling.txt")
+    return path if os.path.exists(path) else None
+
+
+def build_spell_corrector(dictionary_path: str = DEFAULT_DICTIONARY_PATH,
+                          lexicon: Iterable[str] = (),
+                          lexicon_path: Optional[str] = DEFAULT_LEXICON_PATH) -> SymSpell:
+    """Create a SymSpell corrector from the frequency file plus domain terms.
+
+    If dictionary_path does not exist it is bootstrapped from TextBlob's word
+    counts (when installed) and saved there for next time.
+    """
+    speller = SymSpell()
+    if os.path.exists(dictionary_path):
+        speller.load(dictionary_path)
+    else:
+        corpus = _textblob_corpus()
+        if corpus:
+            speller.load(corpus)
+            speller.save(dictionary_path)
+            logger.info(f"Built spelling dictionary from {corpus} -> {dictionary_path}")
+        else:
+            logger.warning(f"Spelling dictionary {dictionary_path} not found; only the domain lexicon is used")
+    terms = list(lexicon)
+    if lexicon_path and os.path.exists(lexicon_path):
+        with open(lexicon_path, encoding="utf-8") as f:
+            terms.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    speller.add_lexicon(terms)
+    logger.debug(f"Spelling dictionary ready: {len(speller)} words")
+    return speller
+
+
+class TextBlobCorrector:
+    """Adapter exposing TextBlob's Norvig corrector through the same correct() interface."""
+
+    def __init__(self):
+        from textblob import TextBlob
+        self._blob = TextBlob
+
+    def correct(self, text: str) -> str:
+        return str(self._blob(text).correct())
+
+
+# Names and acronyms that must survive correction unchanged (see the __main__ check)
+REGRESSION_CASES = [
+    ("Barkha Sharma", "Barkha Sharma"),
+    ("Rahul Kumar", "Rahul Kumar"),
+    ("Priya", "Priya"),
+    ("Anjali", "Anjali"),
+    ("Govt", "Govt"),
+    ("ISRO", "ISRO"),
+    ("rahul kumar", "rahul kumar"),
+    ("recieved", "received"),
+]
+
+
+if __name__ == "__main__":
+    speller = build_spell_corrector()
+    failures = [(text, expected, speller.correct(text)) for text, expected in REGRESSION_CASES
+                if speller.correct(text) != expected]
+    for text, expected, got in failures:
+        print(f"FAIL {text!r}: expected {expected!r}, got {got!r}")
+    print(f"{len(REGRESSION_CASES) - len(failures)}/{len(REGRESSION_CASES)} spelling regression cases passed")
+    raise SystemExit(1 if failures else 0)
@@ -1,7 +1,45 @@
 import re
-import spacy
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence
 
-nlp = spacy.load("en_core_web_sm")
+from .profiling import stage
+from .field_extractor import FieldExtractor, DEFAULT_FIELD_SPECS, EXTRA_FIELD_SPECS
+
+# extract_fields only needs named entities; the parser, tagger and lemmatizer
+# are the most expensive components of en_core_web_sm and are never loaded
+NER_EXCLUDE = ["tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+NER_LABELS = {"PERSON", "ORG", "FAC"}
+
+SPACY_MODEL = "en_core_web_sm"
+
+_NLP: Any = None
+_NLP_LOCK = threading.Lock()
+
+# Regex fields (ids, totals, dates); add specs with FIELD_EXTRACTOR.add(...)
+FIELD_EXTRACTOR = FieldExtractor(DEFAULT_FIELD_SPECS)
+
+# Extra regex fields per document type (see doc_classifier.DOC_TYPES), scanned after FIELD_EXTRACTOR
+DOC_TYPE_EXTRACTORS: Dict[str, FieldExtractor] = {
+    "receipt": FieldExtractor([EXTRA_FIELD_SPECS["invoice_number"], EXTRA_FIELD_SPECS["gstin"]]),
+    "id_card": FieldExtractor([EXTRA_FIELD_SPECS["pan"]]),
+}
+
+def get_nlp():
+    """Load the spaCy NER pipeline on first use (importing spaCy alone takes seconds)."""
+    global _NLP
+    if _NLP is None:
+        with _NLP_LOCK:
+            if _NLP is None:
+                import spacy
+                with stage("spacy_load"):
+                    _NLP = spacy.load(SPACY_MODEL, exclude=NER_EXCLUDE)
+    return _NLP
+
+def __getattr__(name):
+    # Backwards compatible text_cleaning.nlp
+    if name == "nlp":
+        return get_nlp()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def clean_text(text):
     """Basic cleaning of OCR output"""
@@ -13,45 +51,59 @@ def clean_text(text):
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
 
-def extract_fields(text):
-    """Extract common structured fields using regex + NLP"""
-    fields = {}
-    
+def extract_fields(text, doc_type: Optional[str] = None):
+    """Extract common structured fields using regex + NLP (plus DOC_TYPE_EXTRACTORS fields for doc_type)"""
     if not text:
-        return fields
+        return {}
 
-    # 🔹 Name (using spaCy NER)
-    doc = nlp(text)
-    for ent in doc.ents:
+    # 🔹 Name / organization (using spaCy NER)
+    with stage("spacy_ner"):
+        doc = get_nlp()(text)
+    return _fields_from_doc(text, doc, doc_type)
+
+def extract_fields_batch(texts: Iterable[str], *, doc_types: Optional[Sequence[Optional[str]]] = None,
+                         batch_size: int = 64, n_process: int = 1) -> List[Dict[str, str]]:
+    """Extract fields from many cleaned texts, running spaCy NER in batches.
+
+    Args:
+        texts: cleaned texts (e.g. from clean_text)
+        doc_types: document type per text, selecting DOC_TYPE_EXTRACTORS (None = common fields only)
+        batch_size: documents per nlp.pipe batch
+        n_process: spaCy worker processes (1 = in-process)
+
+    Returns:
+        One field dict per input text, in input order
+    """
+    texts = list(texts)
+    doc_types = list(doc_types) if doc_types is not None else [None] * len(texts)
+    results: List[Dict[str, str]] = [{} for _ in texts]
+    # Empty texts yield no fields and are not sent through the pipeline
+    todo = [(i, t) for i, t in enumerate(texts) if t]
+    with stage("spacy_ner_batch") as st:
+        docs = get_nlp().pipe((t for _, t in todo), batch_size=batch_size, n_process=n_process)
+        for (i, text), doc in zip(todo, docs):
+            results[i] = _fields_from_doc(text, doc, doc_types[i])
+        st.size = len(todo)
+    return results
+
+def _fields_from_doc(text, doc, doc_type=None):
+    fields = {}
+    ents = [ent for ent in doc.ents if ent.label_ in NER_LABELS]
+
+    for ent in ents:
         if ent.label_ == "PERSON":
             fields["name"] = ent.text.strip()
             break
-    
-    # Extract any numeric ID numbers
-    id_match = re.search(r'(?:id|number|no)[\s.:#-]*([A-Z0-9]{4,})', text, re.I)
-    if id_match:
-        fields["id_number"] = id_match.group(1).strip()
-
-    # 🔹 Totals (more flexible pattern)
-    total_match = re.search(r'(?:total|amount|sum|price)\s*[:\-]?\s*[\$£€]?\s*(\d+[.,]?\d*)', text, re.I)
-    if total_match:
-        fields["total_amount"] = total_match.group(1).strip()
-
-    # 🔹 Date (multiple formats)
-    date_patterns = [
-        r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',  # DD/MM/YYYY
-        r'(\d{4}[/-]\d{1,2}[/-]\d{1,2})',     # YYYY/MM/DD
-        r'(\d{1,2}(?:st|nd|rd|th)?\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.?\s+\d{4})'  # 1st January 2025
-    ]
-    
-    for pattern in date_patterns:
-        date_match = re.search(pattern, text, re.I)
-        if date_match:
-            fields["date"] = date_match.group(1).strip()
-            break
+
+    # 🔹 ID numbers, totals and dates in a single regex scan
+    with stage("regex_fields"):
+        fields.update(FIELD_EXTRACTOR.extract(text))
+        extractor = DOC_TYPE_EXTRACTORS.get(doc_type)
+        if extractor is not None:
+            fields.update(extractor.extract(text))
 
     # Look for organization names
-    for ent in doc.ents:
+    for ent in ents:
         if ent.label_ in ["ORG", "FAC"]:
             fields["organization"] = ent.text.strip()
             break
@@ -2,28 +2,49 @@
 import os
 import cv2
 import numpy as np
-from typing import Optional, List, Union, Tuple
+from typing import Optional, List, Union, Tuple, Sequence
+from collections import namedtuple
 import statistics
 import shutil
 import logging
 
+from .ocr_cache import OCRCache, hash_array, make_key
+from .profiling import stage
+from .text_regions import propose_text_regions
+
 logger = logging.getLogger("IDIS")
 
 # Configure Tesseract
 pytesseract_path = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 os.environ["PATH"] += os.pathsep + os.path.dirname(pytesseract_path)
 
-# Check Tesseract availability
-has_tesseract = False
-try:
-    import pytesseract
-    if os.path.isfile(pytesseract_path):
-        pytesseract.pytesseract.tesseract_cmd = pytesseract_path
-        version = pytesseract.get_tesseract_version()
-        has_tesseract = True
-        logger.info(f"Using Tesseract v{version} from: {pytesseract_path}")
-except Exception as e:
-    logger.warning(f"Tesseract not available: {e}")
+# Tesseract availability is probed on first use (it spawns the tesseract binary)
+_HAS_TESSERACT: Optional[bool] = None
+
+
+def tesseract_available() -> bool:
+    """Return whether pytesseract and the Tesseract binary are usable (checked once)."""
+    global _HAS_TESSERACT
+    if _HAS_TESSERACT is None:
+        _HAS_TESSERACT = False
+        try:
+            import pytesseract
+            if os.path.isfile(pytesseract_path):
+                pytesseract.pytesseract.tesseract_cmd = pytesseract_path
+                version = pytesseract.get_tesseract_version()
+                _HAS_TESSERACT = True
+                logger.info(f"Using Tesseract v{version} from: {pytesseract_path}")
+        except Exception as e:
+            logger.warning(f"Tesseract not available: {e}")
+    return _HAS_TESSERACT
+
+
+def __getattr__(name):
+    # Backwards compatible text_extraction.has_tesseract
+    if name == "has_tesseract":
+        return tesseract_available()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def _run_easyocr_on_image(reader, img: np.ndarray) -> Tuple[str, float]:
     """Run EasyOCR on img and return concatenated text + average confidence."""
@@ -57,18 +78,186 @@ def _run_easyocr_on_image(reader, img: np.ndarray) -> Tuple[str, float]:
     return " ".join(texts), round(avg_conf, 3)
 
 
-def extract_text(image: np.ndarray, reader, combine_engines: bool = True) -> str:
+DEFAULT_SCALES = (1.0, 1.5, 2.0)
+
+# Strategies understood by extract_text
+STRATEGY_MULTISCALE = "multiscale"
+STRATEGY_SINGLE_PASS = "single_pass"
+STRATEGY_CASCADE = "cascade"
+STRATEGIES = (STRATEGY_CASCADE, STRATEGY_MULTISCALE, STRATEGY_SINGLE_PASS)
+
+# single_pass/cascade tuning: skip refinement when the page is already this confident,
+# and only re-recognize regions below REGION_CONF_THRESHOLD at higher scales
+EARLY_EXIT_CONF = 0.80
+REGION_CONF_THRESHOLD = 0.60
+# Below these page confidences the inverted-contrast recheck, Tesseract, and
+# (for callers that have it) TrOCR are tried
+INVERT_CONF = 0.45
+TESSERACT_CONF = 0.60
+TROCR_CONF = 0.30
+
+# Relative CPU cost of each cascade step (one EasyOCR pass at scale 1.0 = 1.0),
+# in escalation order; used to report what a page cost compared with multiscale
+CASCADE_COSTS = {
+    "easyocr": 1.0,
+    "refine": 0.5,
+    "inverted": 1.0,
+    "tesseract": 0.7,
+    "trocr": 6.0,
+}
+
+# text: OCR text; confidence: 0-1 page confidence; path: cascade steps that ran;
+# escalate: confidence is below trocr_conf and a handwriting engine is worth trying
+OCRResult = namedtuple("OCRResult", ["text", "confidence", "path", "escalate"])
+
+
+def extract_text(image: np.ndarray, reader, combine_engines: bool = True, **kwargs) -> str:
+    """
+    Extract text from image using EasyOCR and optional Tesseract.
+
+    See extract_text_result for the keyword arguments; this returns only the text.
     """
-    Extract text from image using EasyOCR (multi-scale) and optional Tesseract.
+    return extract_text_result(image, reader, combine_engines, **kwargs).text
+
+
+def extract_text_result(image: np.ndarray, reader, combine_engines: bool = True, *,
+                        scales: Sequence[float] = DEFAULT_SCALES,
+                        strategy: str = STRATEGY_MULTISCALE,
+                        early_exit_conf: float = EARLY_EXIT_CONF,
+                        region_conf: float = REGION_CONF_THRESHOLD,
+                        invert_conf: float = INVERT_CONF,
+                        tesseract_conf: float = TESSERACT_CONF,
+                        trocr_conf: float = TROCR_CONF,
+                        text_regions: bool = True,
+                        cache: Optional[OCRCache] = None, cache_key: Optional[str] = None) -> OCRResult:
+    """
+    Extract text from image using EasyOCR and optional Tesseract.
+
+    Strategies:
+    - "cascade": run the cheapest engine first and escalate only while
+      confidence stays low: EasyOCR at scale 1.0, stop if the page clears
+      early_exit_conf; re-recognize regions below region_conf at the higher
+      scales; rerun on the inverted image below invert_conf; run Tesseract
+      below tesseract_conf and merge in the words EasyOCR missed. Each
+      escalation keeps whichever read is more confident, and the steps taken
+      are logged and returned as the path
+    - "multiscale" (default): run full EasyOCR detection + recognition at
+      each scale (1.0, 1.5, 2.0) and keep the most confident result
+    - "single_pass": run CRAFT detection once, recognize every region at
+      scale 1.0, stop early if the page confidence clears early_exit_conf,
+      otherwise re-recognize only low-confidence crops at the higher scales
 
-    Strategy:
-    - Run EasyOCR on a small set of image scales (1.0, 1.5, 2.0)
-    - For each scale collect text + avg confidence
-    - Optionally run Tesseract on the best-scale image and merge results
+    For multiscale and single_pass, a low-confidence result is rechecked on
+    the inverted image and Tesseract output is always merged in.
 
-    Returns a best-effort concatenated text string.
+    With text_regions, text blocks are proposed first (see text_regions.py)
+    and every engine runs only on those crops, which are read in page order.
+    Dense pages, where cropping would not save much, are OCR'd whole.
+
+    When an OCRCache is given, results are looked up by cache_key (or by a
+    hash of the image pixels plus engine parameters) before running OCR.
+
+    Returns:
+        OCRResult(text, confidence, path, escalate); escalate is set when the
+        cascade ends below trocr_conf, so the caller can try TrOCR
     """
-    scales = [1.0, 1.5, 2.0]
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown OCR strategy: {strategy}")
+    params = engine_params(combine_engines, scales, strategy, early_exit_conf, region_conf, text_regions,
+                           invert_conf, tesseract_conf, trocr_conf)
+    if cache is not None:
+        if cache_key is None:
+            cache_key = make_key(hash_array(image), **params)
+        hit = cache.get(cache_key)
+        if hit is not None:
+            logger.info("OCR cache hit; skipping EasyOCR/Tesseract")
+            conf = hit[1] or 0.0
+            return OCRResult(hit[0], conf, ("cache",), strategy == STRATEGY_CASCADE and conf < trocr_conf)
+    thresholds = (early_exit_conf, region_conf, invert_conf, tesseract_conf)
+
+    rois = None
+    if text_regions:
+        with stage("text_regions") as st:
+            rois = propose_text_regions(image)
+            st.size = len(rois) if rois else 0
+
+    if rois:
+        h, w = image.shape[:2]
+        covered = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rois)
+        logger.info(f"OCR on {len(rois)} text regions ({covered / (h * w):.0%} of page pixels)")
+        parts = []
+        steps = set()
+        for x0, y0, x1, y1, _, _ in _reading_order([[*roi, "", 0.0] for roi in rois]):
+            part_text, part_conf, part_path = _ocr_image(image[y0:y1, x0:x1], reader, combine_engines, scales,
+                                                         strategy, thresholds)
+            steps.update(part_path)
+            if part_text:
+                parts.append((part_text, part_conf))
+        text = " ".join(t for t, _ in parts)
+        # Page confidence: region confidences weighted by text length
+        # (separators carry no confidence, so they are not part of the denominator)
+        chars = sum(len(t) for t, _ in parts)
+        conf = round(sum(c * len(t) for t, c in parts) / chars, 3) if chars else 0.0
+        path = tuple(_step_order(steps))
+    else:
+        text, conf, path = _ocr_image(image, reader, combine_engines, scales, strategy, thresholds)
+
+    escalate = strategy == STRATEGY_CASCADE and conf < trocr_conf
+    if strategy == STRATEGY_CASCADE:
+        cost = sum(CASCADE_COSTS.get(step, 0.0) for step in path)
+        logger.info(f"🪜 OCR cascade path: {' → '.join(path) or 'none'} (conf={conf:.3f}, "
+                    f"est. cost {cost:.1f} EasyOCR passes)")
+    if cache is not None and text:
+        used_tesseract = "tesseract" in path if strategy == STRATEGY_CASCADE else params["tesseract"]
+        cache.put(cache_key, text, conf, engine="easyocr+tesseract" if used_tesseract else "easyocr")
+    return OCRResult(text, conf, path, escalate)
+
+
+def _step_order(steps) -> List[str]:
+    """Order step names as they run: cascade steps first, then any others by name."""
+    order = list(CASCADE_COSTS)
+    return sorted(steps, key=lambda step: (order.index(step) if step in order else len(order), step))
+
+
+def _ocr_image(image: np.ndarray, reader, combine_engines: bool, scales: Sequence[float], strategy: str,
+               thresholds: Tuple[float, float, float, float]) -> Tuple[str, float, Tuple[str, ...]]:
+    """Run the selected strategy on one image or crop; return (text, confidence, steps taken)."""
+    early_exit_conf, region_conf, invert_conf, tesseract_conf = thresholds
+    if strategy == STRATEGY_CASCADE:
+        return _cascade_ocr(image, reader, combine_engines, scales, early_exit_conf, region_conf,
+                            invert_conf, tesseract_conf)
+    if strategy == STRATEGY_SINGLE_PASS:
+        best_text, best_conf = _single_pass_ocr(image, reader, scales, early_exit_conf, region_conf)
+        best_img = image
+    else:
+        best_text, best_conf, best_img = _multiscale_ocr(image, reader, scales)
+    text, conf = _recheck_and_merge(image, reader, best_text, best_conf, best_img, combine_engines)
+    return text, conf, (strategy,)
+
+
+def engine_params(combine_engines: bool = True, scales: Sequence[float] = DEFAULT_SCALES,
+                  strategy: str = STRATEGY_MULTISCALE, early_exit_conf: float = EARLY_EXIT_CONF,
+                  region_conf: float = REGION_CONF_THRESHOLD, text_regions: bool = True,
+                  invert_conf: float = INVERT_CONF, tesseract_conf: float = TESSERACT_CONF,
+                  trocr_conf: float = TROCR_CONF) -> dict:
+    """Parameters that affect extract_text output, for building cache keys."""
+    params = {
+        "engine": "easyocr",
+        "scales": list(scales),
+        "strategy": strategy,
+        "tesseract": bool(combine_engines and tesseract_available()),
+    }
+    if strategy in (STRATEGY_SINGLE_PASS, STRATEGY_CASCADE):
+        params.update(early_exit_conf=early_exit_conf, region_conf=region_conf)
+    if strategy == STRATEGY_CASCADE:
+        params.update(invert_conf=invert_conf, tesseract_conf=tesseract_conf, trocr_conf=trocr_conf)
+    if text_regions:
+        params["text_regions"] = True
+    return params
+
+
+def _multiscale_ocr(image: np.ndarray, reader, scales: Sequence[float]) -> Tuple[str, float, np.ndarray]:
+    """Full EasyOCR pass per scale; return (best text, its confidence, image at the best scale)."""
     candidates: List[Tuple[str, float, float]] = []  # (text, avg_conf, scale)
 
     h0, w0 = image.shape[:2]
@@ -79,7 +268,9 @@ def extract_text(image: np.ndarray, reader, combine_engines: bool = True) -> str
             else:
                 img_scaled = cv2.resize(image, (int(w0 * s), int(h0 * s)), interpolation=cv2.INTER_CUBIC)
 
-            easy_text, easy_conf = _run_easyocr_on_image(reader, img_scaled)
+            with stage(f"easyocr_scale_{s}") as st:
+                easy_text, easy_conf = _run_easyocr_on_image(reader, img_scaled)
+                st.size = len(easy_text)
             if easy_text:
                 candidates.append((easy_text, easy_conf, s))
                 logger.info(f"EasyOCR (scale={s}) extracted text length={len(easy_text)} avg_conf={easy_conf}")
@@ -97,19 +288,193 @@ def extract_text(image: np.ndarray, reader, combine_engines: bool = True) -> str
     else:
         best_text, best_conf, best_scale = "", 0.0, 1.0
 
-    # Dynamic recheck: if confidence low, try inverted-contrast image
-    best_img = None
-    inverted_used = False
     try:
         if best_scale == 1.0:
-            best_img = image.copy()
+            best_img = image
         else:
             best_img = cv2.resize(image, (int(w0 * best_scale), int(h0 * best_scale)), interpolation=cv2.INTER_CUBIC)
     except Exception:
         best_img = image
+    return best_text, best_conf, best_img
+
+
+def _reading_order(regions: List[list]) -> List[list]:
+    """Sort [x0, y0, x1, y1, text, conf] regions top-to-bottom, then left-to-right per line."""
+    if not regions:
+        return []
+    regions = sorted(regions, key=lambda r: (r[1] + r[3]) / 2.0)
+    lines: List[List[list]] = [[regions[0]]]
+    for r in regions[1:]:
+        anchor = lines[-1][0]
+        tolerance = max(1.0, (anchor[3] - anchor[1]) / 2.0)
+        if abs((r[1] + r[3]) / 2.0 - (anchor[1] + anchor[3]) / 2.0) <= tolerance:
+            lines[-1].append(r)
+        else:
+            lines.append([r])
+    return [r for line in lines for r in sorted(line, key=lambda r: r[0])]
 
-    conf_threshold = 0.45
-    if best_conf < conf_threshold:
+
+def _refine_regions(gray: np.ndarray, regions: List[list], reader, scales: Sequence[float],
+                    region_conf: float) -> int:
+    """Re-recognize regions below region_conf at each scale, keeping the most confident read.
+
+    Updates regions in place and returns how many were rechecked.
+    """
+    h0, w0 = gray.shape[:2]
+    refined = 0
+    for r in regions:
+        if r[5] >= region_conf:
+            continue
+        pad = max(2, (r[3] - r[1]) // 4)
+        crop = gray[max(0, r[1] - pad):min(h0, r[3] + pad), max(0, r[0] - pad):min(w0, r[2] + pad)]
+        if crop.size == 0:
+            continue
+        for s in scales:
+            try:
+                scaled = cv2.resize(crop, None, fx=s, fy=s, interpolation=cv2.INTER_CUBIC)
+                ch, cw = scaled.shape[:2]
+                res = reader.recognize(scaled, horizontal_list=[[0, cw, 0, ch]], free_list=[])
+            except Exception as e:
+                logger.debug(f"Region recheck at scale {s} failed: {e}")
+                continue
+            if res and float(res[0][2] or 0.0) > r[5]:
+                r[4], r[5] = str(res[0][1]).strip(), float(res[0][2] or 0.0)
+        refined += 1
+    return refined
+
+
+def _detect_and_recognize(gray: np.ndarray, reader, stage_prefix: str = "easyocr") -> List[list]:
+    """Run CRAFT detection once and recognize every region at scale 1.0.
+
+    Returns:
+        [x0, y0, x1, y1, text, conf] per region (empty if nothing was found)
+    """
+    try:
+        with stage(f"{stage_prefix}_detect"):
+            horizontal, free = reader.detect(gray)
+        horizontal = horizontal[0] if horizontal else []
+        free = free[0] if free else []
+        if not horizontal and not free:
+            logger.warning("EasyOCR detection found no text regions")
+            return []
+        with stage(f"{stage_prefix}_recognize") as st:
+            results = reader.recognize(gray, horizontal_list=horizontal, free_list=free)
+            st.size = len(results)
+    except Exception as e:
+        logger.error(f"EasyOCR detect/recognize failed: {e}")
+        return []
+
+    regions = []
+    for bbox, text, conf in results:
+        xs = [int(p[0]) for p in bbox]
+        ys = [int(p[1]) for p in bbox]
+        regions.append([min(xs), min(ys), max(xs), max(ys), str(text).strip(), float(conf or 0.0)])
+    return regions
+
+
+def _regions_conf(regions: List[list]) -> float:
+    """Mean confidence of the regions that produced text."""
+    confs = [r[5] for r in regions if r[4]]
+    return float(statistics.mean(confs)) if confs else 0.0
+
+
+def _regions_text(regions: List[list]) -> str:
+    """Region texts joined in reading order."""
+    return " ".join(r[4] for r in _reading_order(regions) if r[4])
+
+
+def _single_pass_ocr(image: np.ndarray, reader, scales: Sequence[float],
+                     early_exit_conf: float, region_conf: float) -> Tuple[str, float]:
+    """Detect once, recognize at scale 1.0, then refine only low-confidence crops."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    regions = _detect_and_recognize(gray, reader)
+    if not regions:
+        return "", 0.0
+
+    conf = _regions_conf(regions)
+    logger.info(f"EasyOCR single-pass (scale=1.0): regions={len(regions)} avg_conf={conf:.3f}")
+
+    higher = [s for s in scales if s > 1.0]
+    if conf < early_exit_conf and higher:
+        with stage("easyocr_refine") as st:
+            refined = _refine_regions(gray, regions, reader, higher, region_conf)
+            st.size = refined
+        conf = _regions_conf(regions)
+        logger.info(f"EasyOCR single-pass refined {refined} low-confidence regions; avg_conf={conf:.3f}")
+    else:
+        logger.info("EasyOCR single-pass early exit at scale 1.0")
+
+    return _regions_text(regions), round(conf, 3)
+
+
+def _cascade_ocr(image: np.ndarray, reader, combine_engines: bool, scales: Sequence[float],
+                 early_exit_conf: float, region_conf: float, invert_conf: float,
+                 tesseract_conf: float) -> Tuple[str, float, Tuple[str, ...]]:
+    """Cheapest engine first, escalating only while confidence stays below the thresholds."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    path = ["easyocr"]
+    regions = _detect_and_recognize(gray, reader)
+    text, conf = _regions_text(regions), _regions_conf(regions)
+    best_img = gray
+
+    higher = [s for s in scales if s > 1.0]
+    if conf < early_exit_conf and higher and any(r[5] < region_conf for r in regions):
+        with stage("easyocr_refine") as st:
+            st.size = _refine_regions(gray, regions, reader, higher, region_conf)
+        path.append("refine")
+        text, conf = _regions_text(regions), _regions_conf(regions)
+
+    if conf < invert_conf:
+        inverted = cv2.bitwise_not(gray)
+        inv_regions = _detect_and_recognize(inverted, reader, stage_prefix="easyocr_inverted")
+        path.append("inverted")
+        inv_conf = _regions_conf(inv_regions)
+        if inv_conf > conf:
+            text, conf, best_img = _regions_text(inv_regions), inv_conf, inverted
+
+    if combine_engines and conf < tesseract_conf and tesseract_available():
+        tess_text, tess_conf = _run_tesseract(best_img)
+        path.append("tesseract")
+        if tess_text:
+            # The more confident read leads; the other only adds words it is missing
+            if tess_conf > conf:
+                text, conf = _merge_text(tess_text, text), tess_conf
+            else:
+                text = _merge_text(text, tess_text)
+
+    return text, round(conf, 3), tuple(path)
+
+
+def _merge_text(primary: str, extra: str) -> str:
+    """primary followed by the words of extra that primary does not contain (case-insensitive)."""
+    seen = {w.lower() for w in primary.split()}
+    added = [w for w in extra.split() if w.lower() not in seen]
+    return " ".join([primary] + added).strip() if added else primary
+
+
+def _run_tesseract(img: np.ndarray) -> Tuple[str, float]:
+    """Tesseract text and mean word confidence (0-1) for img."""
+    import pytesseract
+    try:
+        with stage("tesseract") as st:
+            data = pytesseract.image_to_data(img, config="--psm 6", output_type=pytesseract.Output.DICT)
+            words = [(w.strip(), float(c)) for w, c in zip(data["text"], data["conf"])
+                     if str(w).strip() and float(c) >= 0]
+            st.size = len(words)
+    except Exception as e:
+        logger.error(f"Tesseract OCR failed: {e}")
+        return "", 0.0
+    if not words:
+        return "", 0.0
+    return " ".join(w for w, _ in words), statistics.mean(c for _, c in words) / 100.0
+
+
+def _recheck_and_merge(image: np.ndarray, reader, best_text: str, best_conf: float,
+                       best_img: np.ndarray, combine_engines: bool) -> Tuple[str, float]:
+    """Inverted-contrast recheck on low confidence, then optional Tesseract merge."""
+    # Dynamic recheck: if confidence low, try inverted-contrast image
+    inverted_used = False
+    if best_conf < INVERT_CONF:
         try:
             # Prepare inverted image (ensure single-channel)
             if best_img.ndim == 3:
@@ -118,7 +483,9 @@ def extract_text(image: np.ndarray, reader, combine_engines: bool = True) -> str
                 inv_base = best_img
             inv_img = cv2.bitwise_not(inv_base)
 
-            inv_text, inv_conf = _run_easyocr_on_image(reader, inv_img)
+            with stage("easyocr_inverted") as st:
+                inv_text, inv_conf = _run_easyocr_on_image(reader, inv_img)
+                st.size = len(inv_text)
             logger.info(f"Inverted recheck: text_len={len(inv_text)} avg_conf={inv_conf}")
             if inv_text:
                 # Prefer inverted if it gave higher confidence
@@ -134,21 +501,24 @@ def extract_text(image: np.ndarray, reader, combine_engines: bool = True) -> str
             logger.warning(f"Inverted recheck failed: {e}")
 
     # Optionally run Tesseract on the best-scale (or inverted) image and merge
-    if has_tesseract and combine_engines:
+    if combine_engines and tesseract_available():
         try:
+            import pytesseract
             t_img = best_img if best_img is not None else image
 
             # Use a conservative PSM for dense text; tune if you need single-line or sparse text
             tess_config = "--psm 6"
-            tess_text = pytesseract.image_to_string(t_img, config=tess_config)
+            with stage("tesseract") as st:
+                tess_text = pytesseract.image_to_string(t_img, config=tess_config)
+                st.size = len(tess_text)
             if tess_text and tess_text.strip():
                 logger.info("Tesseract extraction successful; merging results")
                 # prefer EasyOCR text, but append any Tesseract-only content
                 merged = f"{best_text} {tess_text}" if best_text else tess_text
-                return merged.strip()
+                return merged.strip(), best_conf
             else:
                 logger.warning("Tesseract returned no text")
         except Exception as e:
             logger.error(f"Tesseract OCR failed: {e}")
 
-    return best_text.strip()
+    return best_text.strip(), best_conf
@@ -0,0 +1,115 @@
+"""Text-region proposals so OCR engines skip blank margins and photos.
+
+The page is downscaled, a morphological gradient highlights stroke edges,
+Otsu binarization plus a wide, short closing joins characters into text lines,
+and connected components give line boxes. Large components dense with edges
+(halftone photos, QR codes) and sparse ones (borders, frames, lanyards) are
+dropped; large headings have thick strokes, few edges and are kept. Neighbouring
+lines are merged into blocks, and the blocks are scaled back to page
+coordinates with a little padding.
+
+Usage:
+    rois = propose_text_regions(page)   # [(x0, y0, x1, y1), ...] or None
+    if rois is None: OCR the whole page
+"""
+import logging
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("IDIS")
+
+Box = Tuple[int, int, int, int]  # (x0, y0, x1, y1), x1/y1 exclusive
+
+MAX_SIDE = 1024          # long side of the working image
+MIN_LINE_HEIGHT = 4      # working-image pixels; smaller components are specks
+GRAPHIC_SIDE = 0.15      # fraction of the page; components this big in both directions may be graphics
+GRAPHIC_EDGE_DENSITY = 0.35  # ...and are, when this fraction of their box is edge pixels
+MIN_FILL = 0.15          # components filling less of their box than this are borders/frames
+MAX_COVERAGE = 0.6       # above this fraction of page pixels, cropping is not worth it
+MAX_REGIONS = 16
+
+
+def _merge_boxes(boxes: List[list], gap_x: int, gap_y: int) -> List[list]:
+    """Repeatedly union boxes that overlap once grown by (gap_x, gap_y)."""
+    merged = True
+    while merged:
+        merged = False
+        out: List[list] = []
+        for box in boxes:
+            for other in out:
+                if (box[0] - gap_x < other[2] and other[0] - gap_x < box[2]
+                        and box[1] - gap_y < other[3] and other[1] - gap_y < box[3]):
+                    other[0], other[1] = min(other[0], box[0]), min(other[1], box[1])
+                    other[2], other[3] = max(other[2], box[2]), max(other[3], box[3])
+                    merged = True
+                    break
+            else:
+                out.append(list(box))
+        boxes = out
+    return boxes
+
+
+def propose_text_regions(image: np.ndarray, *, max_side: int = MAX_SIDE,
+                         max_coverage: float = MAX_COVERAGE, max_regions: int = MAX_REGIONS) -> Optional[List[Box]]:
+    """Find text blocks in a page image.
+
+    Args:
+        image: BGR or grayscale page (typically the preprocess_image output)
+        max_side: long side of the downscaled working image
+        max_coverage: return None when the blocks cover more than this fraction of the page
+        max_regions: blocks are merged more loosely until at most this many remain
+
+    Returns:
+        Text-block boxes in page coordinates, or None when the whole page
+        should be OCR'd (dense page or nothing detected)
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    h, w = gray.shape[:2]
+    if not h or not w:
+        return None
+    scale = min(1.0, max_side / max(h, w))
+    small = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))),
+                       interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+    sh, sw = small.shape[:2]
+
+    grad = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, edges = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # Wide, short closing joins characters and words into lines but keeps lines apart
+    line_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, sw // 50), 3))
+    lines = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, line_kernel)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(lines, connectivity=8)
+
+    boxes: List[list] = []
+    heights: List[int] = []
+    for x, y, bw, bh, area in stats[1:n]:
+        if bh < MIN_LINE_HEIGHT or bw < MIN_LINE_HEIGHT or area < 2 * MIN_LINE_HEIGHT ** 2:
+            continue
+        if (bh > GRAPHIC_SIDE * sh and bw > GRAPHIC_SIDE * sw
+                and cv2.countNonZero(edges[y:y + bh, x:x + bw]) > GRAPHIC_EDGE_DENSITY * bw * bh):
+            continue
+        if area < MIN_FILL * bw * bh:
+            continue
+        boxes.append([x, y, x + bw, y + bh])
+        heights.append(bh)
+    if not boxes:
+        return None
+
+    # Lines closer than one line height (and overlapping horizontally) form a block
+    line_h = int(np.median(heights))
+    gap = line_h
+    blocks = _merge_boxes(boxes, gap_x=gap, gap_y=gap)
+    while len(blocks) > max_regions:
+        gap *= 2
+        blocks = _merge_boxes(blocks, gap_x=gap, gap_y=gap)
+
+    pad = max(2, line_h // 2)
+    rois: List[Box] = []
+    for x0, y0, x1, y1 in blocks:
+        rois.append((max(0, int((x0 - pad) / scale)), max(0, int((y0 - pad) / scale)),
+                     min(w, int(np.ceil((x1 + pad) / scale))), min(h, int(np.ceil((y1 + pad) / scale)))))
+    covered = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rois)
+    if covered > max_coverage * h * w:
+        return None
+    return rois
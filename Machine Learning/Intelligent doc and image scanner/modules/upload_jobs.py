@@ -0,0 +1,186 @@
+"""Background OCR jobs for uploaded files (the Streamlit app's multi-file mode).
+
+A job runs its documents on a thread pool. Each thread checks out a warm
+EasyOCR reader from a ModelPool, so concurrent documents never share a reader
+and no model is loaded per file. The caller only polls progress(), so the
+Streamlit script thread never waits on OCR. Records are streamed into one CSV
+and one SQLite file per job (StreamingExporter) as documents finish.
+cancel() drops queued documents and lets running ones finish.
+
+Usage:
+    job = UploadJob([(filename, data), ...], pool).start()
+    job.progress()      # JobProgress(total=200, done=37, ...)
+    job.cancel()
+    job.wait()
+    job.csv_path, job.db_path
+"""
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .batch_engine import build_record, ocr_document
+from .data_export import StreamingExporter
+from .ocr_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_MB, OCRCache, hash_bytes
+from .ocr_service import ModelPool
+from .profiling import document, stage
+from .text_cleaning import clean_text, extract_fields
+
+logger = logging.getLogger("IDIS")
+
+JOBS_DIR = os.path.join("results", "jobs")
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+# Per-file state; doc_type is the export label, duration in seconds
+FileStatus = namedtuple("FileStatus", ["filename", "state", "doc_type", "duration", "error"])
+
+# Snapshot of a job; files holds one FileStatus per input, in input order
+JobProgress = namedtuple("JobProgress", ["total", "done", "failed", "cancelled", "running", "elapsed",
+                                         "finished", "files"])
+
+# spaCy pipelines are not safe to call from several threads at once
+_NER_LOCK = threading.Lock()
+
+
+class UploadJob:
+    """OCR a list of in-memory files in the background.
+
+    Args:
+        files: (filename, encoded bytes) pairs
+        pool: warm EasyOCR readers; at most pool.size documents run at once
+        category: category column for every record
+        options: per-stage pipeline options, as for process_document
+        cache_path: OCR result cache shared with batch runs (None disables it)
+        cache_max_mb: OCR cache size budget
+        output_dir: parent directory of the per-job results folder
+    """
+
+    def __init__(self, files: Sequence[Tuple[str, bytes]], pool: ModelPool, *, category: str = "upload",
+                 options: Optional[Dict[str, Dict[str, Any]]] = None,
+                 cache_path: Optional[str] = DEFAULT_CACHE_PATH, cache_max_mb: float = DEFAULT_MAX_MB,
+                 output_dir: str = JOBS_DIR):
+        self.pool = pool
+        self.category = category
+        self.options = options
+        self.job_id = time.strftime("%Y%m%d-%H%M%S-") + hash_bytes(
+            "".join(name for name, _ in files).encode("utf-8"))[:8]
+        self.output_dir = os.path.join(output_dir, self.job_id)
+        self.csv_path = os.path.join(self.output_dir, "ocr_results.csv")
+        self.db_path = os.path.join(self.output_dir, "ocr_results.db")
+
+        self._files: List[Tuple[str, Optional[bytes]]] = list(files)
+        self._status = [FileStatus(name, QUEUED, None, None, None) for name, _ in self._files]
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        self._remaining = len(self._files)
+        self._cache_path = cache_path
+        self._cache_max_mb = cache_max_mb
+        self._cache: Optional[OCRCache] = None
+        self._exporter: Optional[StreamingExporter] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._started: Optional[float] = None
+        self._ended: Optional[float] = None
+
+    def start(self) -> "UploadJob":
+        """Queue every file and return immediately."""
+        self._started = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Flush every record so the files on disk always reflect finished documents
+        self._exporter = StreamingExporter(db_path=self.db_path, csv_path=self.csv_path, batch_size=1)
+        self._cache = OCRCache(self._cache_path, max_mb=self._cache_max_mb) if self._cache_path else None
+        logger.info(f"🚚 Upload job {self.job_id}: {len(self._files)} files on {self.pool.size} readers")
+        if not self._files:
+            self._finish()
+            return self
+        self._executor = ThreadPoolExecutor(max_workers=self.pool.size, thread_name_prefix="upload-job")
+        self._futures = [self._executor.submit(self._run, i) for i in range(len(self._files))]
+        return self
+
+    def cancel(self) -> None:
+        """Skip documents that have not started; running documents finish and are exported."""
+        self._cancel.set()
+        for i, future in enumerate(self._futures):
+            if future.cancel():
+                self._set(i, state=CANCELLED)
+                self._files[i] = (self._files[i][0], None)
+                self._task_finished()
+        logger.info(f"🛑 Upload job {self.job_id} cancelled")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until every document has finished or been cancelled; False on timeout."""
+        return self._finished.wait(timeout)
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def progress(self) -> JobProgress:
+        with self._lock:
+            files = list(self._status)
+        counts = {state: sum(1 for f in files if f.state == state) for state in (DONE, FAILED, CANCELLED, RUNNING)}
+        end = self._ended or time.perf_counter()
+        elapsed = end - self._started if self._started else 0.0
+        return JobProgress(len(files), counts[DONE], counts[FAILED], counts[CANCELLED], counts[RUNNING],
+                           round(elapsed, 1), self.finished, files)
+
+    def _set(self, index: int, **changes: Any) -> None:
+        with self._lock:
+            self._status[index] = self._status[index]._replace(**changes)
+
+    def _run(self, index: int) -> None:
+        filename, data = self._files[index]
+        if self._cancel.is_set():
+            self._set(index, state=CANCELLED)
+            self._files[index] = (filename, None)
+            self._task_finished()
+            return
+        self._set(index, state=RUNNING)
+        start = time.perf_counter()
+        try:
+            with document(filename), stage("upload_ocr"):
+                with self.pool.slot() as reader:
+                    ocr = ocr_document(data, filename, reader, self._cache, self.options)
+                cleaned = clean_text(ocr.text)
+                with _NER_LOCK:
+                    fields = extract_fields(cleaned, doc_type=ocr.doc_type)
+                record = build_record(filename, self.category, ocr.content_hash, cleaned, fields,
+                                      ocr.used_trocr, ocr.doc_type)
+            self._exporter.write(record)
+            self._set(index, state=DONE, doc_type=record["doc_type"], duration=round(time.perf_counter() - start, 2))
+        except Exception as e:
+            logger.error(f"❌ Error processing {filename}: {e}")
+            self._set(index, state=FAILED, error=str(e), duration=round(time.perf_counter() - start, 2))
+        finally:
+            # Uploaded bytes are only needed until the document is processed
+            self._files[index] = (filename, None)
+            self._task_finished()
+
+    def _task_finished(self) -> None:
+        with self._lock:
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last:
+            self._finish()
+
+    def _finish(self) -> None:
+        self._ended = time.perf_counter()
+        if self._exporter is not None:
+            self._exporter.close()
+        if self._cache is not None:
+            self._cache.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        progress = self.progress()
+        logger.info(f"✅ Upload job {self.job_id} finished in {progress.elapsed:.1f}s: done={progress.done} "
+                    f"failed={progress.failed} cancelled={progress.cancelled}")
+        self._finished.set()
@@ -0,0 +1,60 @@
+"""Run IDIS as a long-running HTTP OCR service.
+
+    python service.py --port 8080 --pool-size 2
+
+    curl --data-binary @receipt.png "http://127.0.0.1:8080/ocr?filename=receipt.png"
+    curl http://127.0.0.1:8080/metrics
+"""
+import argparse
+
+from modules.logger_config import setup_logger
+from modules.ocr_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_MB
+from modules.image_preprocess import PROFILES
+from modules.text_extraction import STRATEGIES, STRATEGY_CASCADE
+from modules.ocr_service import (serve, DEFAULT_HOST, DEFAULT_PORT, POOL_SIZE, MAX_BATCH, BATCH_WAIT_MS,
+                                 MAX_QUEUE, MAX_BODY_MB)
+
+logger = setup_logger()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IDIS OCR HTTP service")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Bind address (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port (default: %(default)s)")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE,
+                        help="Warm EasyOCR readers = documents OCR'd concurrently (default: %(default)s)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="OCR'd documents per NER micro-batch (default: %(default)s)")
+    parser.add_argument("--batch-wait-ms", type=float, default=BATCH_WAIT_MS,
+                        help="How long an NER micro-batch waits for more documents (default: %(default)s)")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE,
+                        help="Queued documents before requests are rejected with 503 (default: %(default)s)")
+    parser.add_argument("--max-body-mb", type=float, default=MAX_BODY_MB, help="Largest request body (default: %(default)s)")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help="OCR result cache database (default: %(default)s)")
+    parser.add_argument("--cache-size-mb", type=float, default=DEFAULT_MAX_MB, help="OCR cache size budget in MB (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the OCR result cache")
+    parser.add_argument("--preprocess-profile", choices=sorted(PROFILES), default="default",
+                        help="default: full-resolution preprocessing; fast: cheaper denoise/deskew with buffer reuse")
+    parser.add_argument("--ocr-strategy", choices=STRATEGIES, default=STRATEGY_CASCADE,
+                        help="cascade: cheapest engine first, escalate only on low confidence; "
+                             "multiscale: full EasyOCR pass per scale; single_pass: detect once, refine low-confidence regions")
+    parser.add_argument("--no-text-regions", action="store_true",
+                        help="OCR the whole page instead of only the detected text blocks")
+    parser.add_argument("--classify-docs", action="store_true",
+                        help="Experimental: route pages by the document-type classifier (see readme)")
+    args = parser.parse_args()
+
+    serve(
+        args.host,
+        args.port,
+        pool_size=args.pool_size,
+        max_batch=args.max_batch,
+        batch_wait_ms=args.batch_wait_ms,
+        max_queue=args.max_queue,
+        max_body_mb=args.max_body_mb,
+        cache_path=None if args.no_cache else args.cache_path,
+        cache_max_mb=args.cache_size_mb,
+        options={
+            "preprocess": {"profile": args.preprocess_profile},
+            "ocr": {"strategy": args.ocr_strategy, "text_regions": not args.no_text_regions},
+            **({"classify": {}} if args.classify_docs else {}),
+        },
+    )